@@ -0,0 +1,36 @@
+"""Fixed-dimension chunk vector with ANN index
+
+Revision ID: 3c7e2a9d41f0
+Revises: 8fe1174bfed9
+Create Date: 2026-10-18 10:12:40.218431
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c7e2a9d41f0'
+down_revision: Union[str, None] = '8fe1174bfed9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EMBEDDING_DIM = 1024
+
+
+def upgrade() -> None:
+    op.execute(f"ALTER TABLE chunks ALTER COLUMN vector TYPE vector({EMBEDDING_DIM})")
+    # CONCURRENTLY 不能在事务中执行
+    with op.get_context().autocommit_block():
+        op.execute("SET maintenance_work_mem = '1GB'")
+        # 索引名即 vector_index_name('chunks', 'vector', 'hnsw')，分区局部索引在其后加 _p{partition_id}
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chunks_vector_hnsw ON chunks "
+                   "USING hnsw (vector vector_cosine_ops) WITH (m = 16, ef_construction = 64)")
+        op.execute("RESET maintenance_work_mem")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_chunks_vector_hnsw")
+    op.execute("ALTER TABLE chunks ALTER COLUMN vector TYPE vector")
@@ -0,0 +1,37 @@
+"""Replace the unguarded chunk paragraph_number index
+
+Revision ID: 9a908bdc4a62
+Revises: c96561be8295
+Create Date: 2026-10-19 11:03:26.370952
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a908bdc4a62'
+down_revision: Union[str, None] = 'c96561be8295'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 与 e7b3c5a8d2f4 中的索引相同
+PARAGRAPH_NUMBER_INDEX = (
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chunks_document_paragraph_number ON chunks "
+    "(document_id, (CASE WHEN (doc_metadata ->> 'paragraph_number') ~ '^-?[0-9]{1,9}$' "
+    "THEN (doc_metadata ->> 'paragraph_number')::integer END))"
+)
+
+
+def upgrade() -> None:
+    # 修改前执行过 e7b3c5a8d2f4 的库上是直接转换为 integer 的 ix_chunks_document_paragraph，
+    # 段落号不是整数的 chunk 无法写入；换成带正则判断的索引。新库上两条语句都不做任何事
+    with op.get_context().autocommit_block():
+        op.execute(PARAGRAPH_NUMBER_INDEX)
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_chunks_document_paragraph")
+
+
+def downgrade() -> None:
+    # 不恢复会拒绝非整数段落号的旧索引，ix_chunks_document_paragraph_number 由 e7b3c5a8d2f4 的降级删除
+    pass
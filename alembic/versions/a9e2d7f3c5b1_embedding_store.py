@@ -0,0 +1,46 @@
+"""Cluster-shared embedding store backfilled from chunk vectors
+
+Revision ID: a9e2d7f3c5b1
+Revises: f4c8a1d6b3e9
+Create Date: 2026-10-18 21:36:52.118734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import VECTOR
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9e2d7f3c5b1'
+down_revision: Union[str, None] = 'f4c8a1d6b3e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EMBEDDING_DIM = 1024
+# 已入库 chunk 向量所用的 embedding 模型，与 EmbeddingInput.name 的默认值一致
+EMBEDDING_MODEL_NAME = 'BAAI/bge-m3'
+
+
+def upgrade() -> None:
+    op.create_table(
+        'embedding_store',
+        sa.Column('model_name', sa.String(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('vector', VECTOR(EMBEDDING_DIM), nullable=False),
+        sa.Column('create_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('model_name', 'content_hash'),
+    )
+    # 内容哈希与 app/serves/model_serves/embedding_cache.py 中的 content_hash 一致
+    op.execute(sa.text(
+        "INSERT INTO embedding_store (model_name, content_hash, vector, create_at) "
+        "SELECT DISTINCT ON (content_hash) :model_name, content_hash, vector, now() "
+        "FROM (SELECT encode(sha256(convert_to(page_content, 'UTF8')), 'hex') AS content_hash, vector "
+        "FROM chunks) AS chunk_hashes "
+        "ON CONFLICT DO NOTHING"
+    ).bindparams(model_name=EMBEDDING_MODEL_NAME))
+
+
+def downgrade() -> None:
+    op.drop_table('embedding_store')
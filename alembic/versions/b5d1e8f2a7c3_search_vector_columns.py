@@ -0,0 +1,76 @@
+"""Stored tsvector search columns with GIN indexes
+
+Revision ID: b5d1e8f2a7c3
+Revises: 3c7e2a9d41f0
+Create Date: 2026-10-18 15:40:12.503817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d1e8f2a7c3'
+down_revision: Union[str, None] = '3c7e2a9d41f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# 生成列表达式是创建时的快照，与当时模型中 search_vector_expression(__search_columns__) 的结果一致，
+# 不引用应用代码，之后修改可检索列不会改变已执行过的迁移
+SEARCH_VECTORS = {
+    'partitions': "setweight(to_tsvector('jiebacfg'::regconfig, coalesce(partition_name::text, '')), 'A')",
+    'users': ("setweight(to_tsvector('jiebacfg'::regconfig, coalesce(name::text, '')), 'A') || "
+              "setweight(to_tsvector('jiebacfg'::regconfig, coalesce(account::text, '')), 'A') || "
+              "setweight(to_tsvector('jiebacfg'::regconfig, coalesce(email::text, '')), 'B')"),
+    'files': "setweight(to_tsvector('jiebacfg'::regconfig, coalesce(file_name::text, '')), 'A')",
+    'documents': ("setweight(to_tsvector('jiebacfg'::regconfig, coalesce(title::text, '')), 'A') || "
+                  "setweight(to_tsvector('jiebacfg'::regconfig, coalesce(content::text, '')), 'B')"),
+    'chunks': "setweight(to_tsvector('jiebacfg'::regconfig, coalesce(page_content::text, '')), 'A')",
+    'response_records': ("setweight(to_tsvector('jiebacfg'::regconfig, coalesce(input::text, '')), 'A') || "
+                         "setweight(to_tsvector('jiebacfg'::regconfig, coalesce(response::text, '')), 'B')"),
+    'rag_caches': ("setweight(to_tsvector('jiebacfg'::regconfig, coalesce(query::text, '')), 'A') || "
+                   "setweight(to_tsvector('jiebacfg'::regconfig, coalesce(response::text, '')), 'B')"),
+}
+
+
+def _partition_text_indexes() -> list:
+    result = op.get_bind().execute(sa.text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = 'chunks' AND indexname LIKE 'ix_chunks_tsv_p%'"))
+    return [row[0] for row in result]
+
+
+def upgrade() -> None:
+    for table_name, expression in SEARCH_VECTORS.items():
+        op.add_column(table_name, sa.Column('search_vector', TSVECTOR, sa.Computed(expression, persisted=True)))
+
+    partition_text_indexes = _partition_text_indexes()
+    with op.get_context().autocommit_block():
+        for table_name in SEARCH_VECTORS:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table_name}_search_vector "
+                       f"ON {table_name} USING gin (search_vector)")
+        # 分区局部的 GIN 索引改建到 search_vector 上
+        for index_name in partition_text_indexes:
+            partition_id = int(index_name.rsplit('_p', 1)[1])
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON chunks "
+                       f"USING gin (search_vector) WHERE partition_id = {partition_id}")
+
+
+def downgrade() -> None:
+    partition_text_indexes = _partition_text_indexes()
+    with op.get_context().autocommit_block():
+        for index_name in partition_text_indexes:
+            partition_id = int(index_name.rsplit('_p', 1)[1])
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON chunks "
+                       f"USING gin (to_tsvector('jiebacfg'::regconfig, page_content)) "
+                       f"WHERE partition_id = {partition_id}")
+        for table_name in SEARCH_VECTORS:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS ix_{table_name}_search_vector")
+
+    for table_name in SEARCH_VECTORS:
+        op.drop_column(table_name, 'search_vector')
@@ -0,0 +1,156 @@
+"""Shard chunk BM25 stats rows and take their locks in key order
+
+Revision ID: c96561be8295
+Revises: a9e2d7f3c5b1
+Create Date: 2026-10-19 10:12:47.503816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c96561be8295'
+down_revision: Union[str, None] = 'a9e2d7f3c5b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# 与 d2a4f7c9e1b6 相同，SQL 是创建时的快照，不引用 app.db.bm25_stats；shard 数为 16
+BM25_STATS_FUNCTION = """
+CREATE OR REPLACE FUNCTION chunk_bm25_stats_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    stats_shard smallint := txid_current() % 16;
+    changes text;
+BEGIN
+    -- 只有 search_vector 或分区变化时才影响统计，只改 vector、doc_metadata 等列的更新直接返回
+    IF TG_OP = 'UPDATE' AND NOT EXISTS (
+        SELECT 1 FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE n.search_vector IS DISTINCT FROM o.search_vector OR n.partition_id IS DISTINCT FROM o.partition_id
+    ) THEN
+        RETURN NULL;
+    END IF;
+
+    -- 插入记 +1、删除记 -1，更新把新旧行合在一条语句里，未变化的行正负抵消
+    changes := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT partition_id, search_vector, 1 AS sign FROM new_rows'
+        WHEN 'DELETE' THEN 'SELECT partition_id, search_vector, -1 AS sign FROM old_rows'
+        ELSE 'SELECT partition_id, search_vector, 1 AS sign FROM new_rows '
+             || 'UNION ALL SELECT partition_id, search_vector, -1 FROM old_rows'
+    END;
+
+    -- 按主键顺序写入，并发事务以相同顺序获取行锁
+    EXECUTE format($sql$
+        WITH changes AS (%s)
+        INSERT INTO chunk_term_stats (partition_id, shard, lexeme, df)
+        SELECT coalesce(partition_id, 0), $1, lexeme, sum(sign)
+        FROM changes, unnest(tsvector_to_array(search_vector)) AS lexeme
+        GROUP BY 1, 3
+        HAVING sum(sign) <> 0
+        ORDER BY 1, 3
+        ON CONFLICT (partition_id, shard, lexeme) DO UPDATE SET df = chunk_term_stats.df + EXCLUDED.df
+    $sql$, changes) USING stats_shard;
+
+    EXECUTE format($sql$
+        WITH changes AS (%s)
+        INSERT INTO chunk_corpus_stats (partition_id, shard, doc_count, total_length)
+        SELECT coalesce(partition_id, 0), $1, sum(sign), sum(sign * length(search_vector))
+        FROM changes
+        GROUP BY 1
+        HAVING sum(sign) <> 0 OR sum(sign * length(search_vector)) <> 0
+        ORDER BY 1
+        ON CONFLICT (partition_id, shard) DO UPDATE
+        SET doc_count = chunk_corpus_stats.doc_count + EXCLUDED.doc_count,
+            total_length = chunk_corpus_stats.total_length + EXCLUDED.total_length
+    $sql$, changes) USING stats_shard;
+    RETURN NULL;
+END
+$$
+"""
+
+# d2a4f7c9e1b6 中的版本，降级时恢复
+PREVIOUS_BM25_STATS_FUNCTION = """
+CREATE OR REPLACE FUNCTION chunk_bm25_stats_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    -- 只有 search_vector 或分区变化时才影响统计，只改 vector、doc_metadata 等列的更新直接返回；
+    -- 同一语句中未变化的行先减后加，结果不变
+    IF TG_OP = 'UPDATE' AND NOT EXISTS (
+        SELECT 1 FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE n.search_vector IS DISTINCT FROM o.search_vector OR n.partition_id IS DISTINCT FROM o.partition_id
+    ) THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        WITH terms AS (
+            SELECT coalesce(partition_id, 0) AS partition_id, lexeme, count(*) AS df
+            FROM old_rows, unnest(tsvector_to_array(search_vector)) AS lexeme
+            GROUP BY 1, 2
+        )
+        UPDATE chunk_term_stats s SET df = s.df - terms.df
+        FROM terms
+        WHERE s.partition_id = terms.partition_id AND s.lexeme = terms.lexeme;
+
+        WITH docs AS (
+            SELECT coalesce(partition_id, 0) AS partition_id, count(*) AS doc_count,
+                   sum(length(search_vector)) AS total_length
+            FROM old_rows
+            GROUP BY 1
+        )
+        UPDATE chunk_corpus_stats c
+        SET doc_count = c.doc_count - docs.doc_count, total_length = c.total_length - docs.total_length
+        FROM docs
+        WHERE c.partition_id = docs.partition_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO chunk_term_stats (partition_id, lexeme, df)
+        SELECT coalesce(partition_id, 0), lexeme, count(*)
+        FROM new_rows, unnest(tsvector_to_array(search_vector)) AS lexeme
+        GROUP BY 1, 2
+        ON CONFLICT (partition_id, lexeme) DO UPDATE SET df = chunk_term_stats.df + EXCLUDED.df;
+
+        INSERT INTO chunk_corpus_stats (partition_id, doc_count, total_length)
+        SELECT coalesce(partition_id, 0), count(*), sum(length(search_vector))
+        FROM new_rows
+        GROUP BY 1
+        ON CONFLICT (partition_id) DO UPDATE
+        SET doc_count = chunk_corpus_stats.doc_count + EXCLUDED.doc_count,
+            total_length = chunk_corpus_stats.total_length + EXCLUDED.total_length;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+STATS_PRIMARY_KEYS = {
+    'chunk_term_stats': ['partition_id', 'shard', 'lexeme'],
+    'chunk_corpus_stats': ['partition_id', 'shard'],
+}
+
+
+def upgrade() -> None:
+    # 已有的统计全部记在 shard 0 下，各 shard 之和不变
+    for table, columns in STATS_PRIMARY_KEYS.items():
+        op.add_column(table, sa.Column('shard', sa.SmallInteger(), nullable=False, server_default='0'))
+        op.alter_column(table, 'shard', server_default=None)
+        op.drop_constraint(f'{table}_pkey', table, type_='primary')
+        op.create_primary_key(f'{table}_pkey', table, columns)
+    op.execute(BM25_STATS_FUNCTION)
+
+
+def downgrade() -> None:
+    op.execute(PREVIOUS_BM25_STATS_FUNCTION)
+    # 各 shard 的增量无法原样保留，清空后按 chunks 重建
+    op.execute("TRUNCATE chunk_term_stats, chunk_corpus_stats")
+    for table, columns in STATS_PRIMARY_KEYS.items():
+        op.drop_constraint(f'{table}_pkey', table, type_='primary')
+        op.drop_column(table, 'shard')
+        op.create_primary_key(f'{table}_pkey', table, [column for column in columns if column != 'shard'])
+    op.execute("INSERT INTO chunk_term_stats (partition_id, lexeme, df) "
+               "SELECT coalesce(partition_id, 0), lexeme, count(*) "
+               "FROM chunks, unnest(tsvector_to_array(search_vector)) AS lexeme GROUP BY 1, 2")
+    op.execute("INSERT INTO chunk_corpus_stats (partition_id, doc_count, total_length) "
+               "SELECT coalesce(partition_id, 0), count(*), sum(length(search_vector)) FROM chunks GROUP BY 1")
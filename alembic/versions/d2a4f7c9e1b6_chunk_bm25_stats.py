@@ -0,0 +1,128 @@
+"""BM25 term statistics for chunks maintained by triggers
+
+Revision ID: d2a4f7c9e1b6
+Revises: b5d1e8f2a7c3
+Create Date: 2026-10-18 17:05:36.218450
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a4f7c9e1b6'
+down_revision: Union[str, None] = 'b5d1e8f2a7c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# 迁移中的 SQL 是创建时的快照，不引用 app.db.bm25_stats，之后修改应用代码不会改变已执行过的迁移
+BM25_STATS_FUNCTION = """
+CREATE OR REPLACE FUNCTION chunk_bm25_stats_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    -- 只有 search_vector 或分区变化时才影响统计，只改 vector、doc_metadata 等列的更新直接返回；
+    -- 同一语句中未变化的行先减后加，结果不变
+    IF TG_OP = 'UPDATE' AND NOT EXISTS (
+        SELECT 1 FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE n.search_vector IS DISTINCT FROM o.search_vector OR n.partition_id IS DISTINCT FROM o.partition_id
+    ) THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        WITH terms AS (
+            SELECT coalesce(partition_id, 0) AS partition_id, lexeme, count(*) AS df
+            FROM old_rows, unnest(tsvector_to_array(search_vector)) AS lexeme
+            GROUP BY 1, 2
+        )
+        UPDATE chunk_term_stats s SET df = s.df - terms.df
+        FROM terms
+        WHERE s.partition_id = terms.partition_id AND s.lexeme = terms.lexeme;
+
+        WITH docs AS (
+            SELECT coalesce(partition_id, 0) AS partition_id, count(*) AS doc_count,
+                   sum(length(search_vector)) AS total_length
+            FROM old_rows
+            GROUP BY 1
+        )
+        UPDATE chunk_corpus_stats c
+        SET doc_count = c.doc_count - docs.doc_count, total_length = c.total_length - docs.total_length
+        FROM docs
+        WHERE c.partition_id = docs.partition_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO chunk_term_stats (partition_id, lexeme, df)
+        SELECT coalesce(partition_id, 0), lexeme, count(*)
+        FROM new_rows, unnest(tsvector_to_array(search_vector)) AS lexeme
+        GROUP BY 1, 2
+        ON CONFLICT (partition_id, lexeme) DO UPDATE SET df = chunk_term_stats.df + EXCLUDED.df;
+
+        INSERT INTO chunk_corpus_stats (partition_id, doc_count, total_length)
+        SELECT coalesce(partition_id, 0), count(*), sum(length(search_vector))
+        FROM new_rows
+        GROUP BY 1
+        ON CONFLICT (partition_id) DO UPDATE
+        SET doc_count = chunk_corpus_stats.doc_count + EXCLUDED.doc_count,
+            total_length = chunk_corpus_stats.total_length + EXCLUDED.total_length;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+# 带转换表的触发器只能对应一种事件，所以分别创建
+BM25_STATS_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS chunk_bm25_stats_insert ON chunks",
+    "CREATE TRIGGER chunk_bm25_stats_insert AFTER INSERT ON chunks "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION chunk_bm25_stats_apply()",
+    "DROP TRIGGER IF EXISTS chunk_bm25_stats_delete ON chunks",
+    "CREATE TRIGGER chunk_bm25_stats_delete AFTER DELETE ON chunks "
+    "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION chunk_bm25_stats_apply()",
+    "DROP TRIGGER IF EXISTS chunk_bm25_stats_update ON chunks",
+    "CREATE TRIGGER chunk_bm25_stats_update AFTER UPDATE ON chunks "
+    "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION chunk_bm25_stats_apply()",
+]
+
+BM25_STATS_REBUILD = [
+    "TRUNCATE chunk_term_stats, chunk_corpus_stats",
+    "INSERT INTO chunk_term_stats (partition_id, lexeme, df) "
+    "SELECT coalesce(partition_id, 0), lexeme, count(*) "
+    "FROM chunks, unnest(tsvector_to_array(search_vector)) AS lexeme GROUP BY 1, 2",
+    "INSERT INTO chunk_corpus_stats (partition_id, doc_count, total_length) "
+    "SELECT coalesce(partition_id, 0), count(*), sum(length(search_vector)) FROM chunks GROUP BY 1",
+]
+
+
+def upgrade() -> None:
+    op.create_table(
+        'chunk_term_stats',
+        sa.Column('partition_id', sa.Integer(), nullable=False),
+        sa.Column('lexeme', sa.Text(), nullable=False),
+        sa.Column('df', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('partition_id', 'lexeme'),
+    )
+    op.create_table(
+        'chunk_corpus_stats',
+        sa.Column('partition_id', sa.Integer(), nullable=False),
+        sa.Column('doc_count', sa.BigInteger(), nullable=False),
+        sa.Column('total_length', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('partition_id'),
+    )
+    op.execute(BM25_STATS_FUNCTION)
+    for statement in BM25_STATS_TRIGGERS:
+        op.execute(statement)
+    # 与创建触发器在同一事务内回填，期间写入的 chunk 会等待，统计不会遗漏或重复
+    for statement in BM25_STATS_REBUILD:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    for trigger in ('chunk_bm25_stats_insert', 'chunk_bm25_stats_delete', 'chunk_bm25_stats_update'):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON chunks")
+    op.execute("DROP FUNCTION IF EXISTS chunk_bm25_stats_apply()")
+    op.drop_table('chunk_corpus_stats')
+    op.drop_table('chunk_term_stats')
@@ -0,0 +1,36 @@
+"""Chunk (document_id, paragraph_number) index for context windows
+
+Revision ID: e7b3c5a8d2f4
+Revises: d2a4f7c9e1b6
+Create Date: 2026-10-18 19:22:08.640513
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b3c5a8d2f4'
+down_revision: Union[str, None] = 'd2a4f7c9e1b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# 段落号不是整数时表达式为 NULL，已有数据中的 "3a"、1.5 等值不会让建索引失败
+PARAGRAPH_NUMBER_INDEX = (
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chunks_document_paragraph_number ON chunks "
+    "(document_id, (CASE WHEN (doc_metadata ->> 'paragraph_number') ~ '^-?[0-9]{1,9}$' "
+    "THEN (doc_metadata ->> 'paragraph_number')::integer END))"
+)
+
+
+def upgrade() -> None:
+    # CONCURRENTLY 不能在事务中执行
+    with op.get_context().autocommit_block():
+        op.execute(PARAGRAPH_NUMBER_INDEX)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_chunks_document_paragraph_number")
@@ -0,0 +1,38 @@
+"""Document centroid vector with ANN index
+
+Revision ID: f4c8a1d6b3e9
+Revises: e7b3c5a8d2f4
+Create Date: 2026-10-18 20:41:17.503962
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4c8a1d6b3e9'
+down_revision: Union[str, None] = 'e7b3c5a8d2f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EMBEDDING_DIM = 1024
+
+
+def upgrade() -> None:
+    op.execute(f"ALTER TABLE documents ADD COLUMN IF NOT EXISTS vector vector({EMBEDDING_DIM})")
+    # 已入库的文档按现有 chunk 回填质心
+    op.execute("UPDATE documents SET vector = centroids.vector "
+               "FROM (SELECT document_id, avg(vector) AS vector FROM chunks "
+               "WHERE document_id IS NOT NULL GROUP BY document_id) AS centroids "
+               "WHERE documents.id = centroids.document_id")
+    # CONCURRENTLY 不能在事务中执行
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_vector_hnsw ON documents "
+                   "USING hnsw (vector vector_cosine_ops) WITH (m = 16, ef_construction = 64)")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_vector_hnsw")
+    op.execute("ALTER TABLE documents DROP COLUMN IF EXISTS vector")
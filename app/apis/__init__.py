@@ -8,6 +8,7 @@ from app.apis.api_router import (admin_router,
                                  chunk_router,
                                  conversation_router,
                                  image_router,
+                                 vector_index_router,
 
                                  )
 
@@ -7,16 +7,19 @@ from app.apis.routers.chunk_crud_router import ChunkRouter
 from app.apis.routers.file_crud_router import FileCRUDRouter
 from app.apis.routers.image_crud_router import ImageCRUDRouter
 from app.apis.routers.user_cu_router import UserCURouter
+from app.apis.routers.vector_index_router import VectorIndexRouter
 from app.crud.admin_operation import AdminOperation
 from app.crud.base_operation import BaseOperation
 from app.crud.chunk_operation import ChunkOperation
 from app.crud.file_operation import FileOperator
 from app.crud.filter_utils.filters import FilterHandler
 from app.crud.image_operation import ImageOperation
+from app.crud.partition_operation import PartitionOperation
 from app.crud.user_operation import UserOperation
+from app.crud.vector_index_operation import VectorIndexOperation
 from app.db import db_models
 from app.schemes.models import cache_models, user_models, chat_models, document_models, partition_models, chunk_models, \
-    file_models
+    file_models, index_models
 from config import ServeConfig
 
 # Admin Router
@@ -68,7 +71,7 @@ ImageCRUDRouter(
 
 # Partition Router
 partition_router = APIRouter(prefix="/partition", tags=["分区管理"])
-partition_operator = BaseOperation(
+partition_operator = PartitionOperation(
     filter_handler=FilterHandler(
         db_model=db_models.Partition
     )
@@ -118,6 +121,19 @@ router = ChunkRouter(
     search_response_model=chunk_models.SearchChunkResponse,
     vector_search_model=chunk_models.ChunkSearch,
     hybrid_search_model=chunk_models.HybridSearchModel,
+    batch_keyword_search_model=chunk_models.ChunkBatchKeywordSearch,
+    batch_vector_search_model=chunk_models.ChunkBatchSearch,
+    batch_hybrid_search_model=chunk_models.HybridBatchSearchModel,
+)
+
+# Vector Index Router
+vector_index_router = APIRouter(prefix="/xiaoke_admin/vector_index", tags=["向量索引管理"])
+vector_index_operator = VectorIndexOperation(db_model=db_models.Chunk)
+VectorIndexRouter(
+    router=vector_index_router,
+    operator=vector_index_operator,
+    create_model=index_models.VectorIndexCreate,
+    response_model=index_models.ResponseVectorIndex,
 )
 
 # RAGCache Router
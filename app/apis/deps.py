@@ -3,7 +3,8 @@ from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from config import ServeConfig
 
-engine = create_async_engine(ServeConfig.DATABASE_URL, echo=False)
+engine = create_async_engine(ServeConfig.DATABASE_URL, echo=False, pool_size=ServeConfig.db_pool_size,
+                             max_overflow=ServeConfig.db_max_overflow)
 async_session = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 
 
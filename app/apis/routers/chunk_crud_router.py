@@ -1,5 +1,5 @@
 from typing import Type, List, Optional, Dict, Callable
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -22,10 +22,16 @@ class ChunkRouter(BaseCRUDRouter):
             search_response_model: Optional[Type[BaseModel]] = None,
             vector_search_model: Optional[Type[BaseModel]] = None,
             hybrid_search_model: Optional[Type[BaseModel]] = None,
+            batch_keyword_search_model: Optional[Type[BaseModel]] = None,
+            batch_vector_search_model: Optional[Type[BaseModel]] = None,
+            batch_hybrid_search_model: Optional[Type[BaseModel]] = None,
             include_routes: Optional[Dict[str, bool]] = None,
     ):
         self.vector_search_model = vector_search_model
         self.hybrid_search_model = hybrid_search_model
+        self.batch_keyword_search_model = batch_keyword_search_model
+        self.batch_vector_search_model = batch_vector_search_model
+        self.batch_hybrid_search_model = batch_hybrid_search_model
         super().__init__(
             router=router,
             operator=operator,
@@ -41,6 +47,12 @@ class ChunkRouter(BaseCRUDRouter):
         super().setup_routes()
         self._default_vector_search_route()
         self._default_hybrid_search_route()
+        if self.batch_keyword_search_model:
+            self._default_batch_search_route()
+        if self.batch_vector_search_model:
+            self._default_batch_vector_search_route()
+        if self.batch_hybrid_search_model:
+            self._default_batch_hybrid_search_route()
 
     def _default_vector_search_route(self):
         @self.router.post("/vector_search/", response_model=List[self.search_response_model])
@@ -57,9 +69,49 @@ class ChunkRouter(BaseCRUDRouter):
         @self.router.post("/hybrid_search/", response_model=List[self.search_response_model])
         async def hybrid_search(
                 model: self.hybrid_search_model,
+                response: Response,
                 db: AsyncSession = Depends(get_db)
         ):
-            return await self.operator.hybrid_search(
+            timings = {}
+            results = await self.operator.hybrid_search(
+                db=db,
+                model=model,
+                timings=timings
+            )
+            # 各阶段耗时通过 Server-Timing 头返回，不改变响应体结构
+            response.headers["Server-Timing"] = ", ".join(
+                f"{name};dur={duration:.1f}" for name, duration in timings.items())
+            return results
+
+    def _default_batch_search_route(self):
+        @self.router.post("/batch_search/", response_model=List[List[self.search_response_model]])
+        async def batch_search(
+                model: self.batch_keyword_search_model,
+                db: AsyncSession = Depends(get_db)
+        ):
+            return await self.operator.batch_search(
+                db=db,
+                model=model
+            )
+
+    def _default_batch_vector_search_route(self):
+        @self.router.post("/batch_vector_search/", response_model=List[List[self.search_response_model]])
+        async def batch_vector_search(
+                model: self.batch_vector_search_model,
+                db: AsyncSession = Depends(get_db)
+        ):
+            return await self.operator.batch_vector_search(
+                db=db,
+                model=model
+            )
+
+    def _default_batch_hybrid_search_route(self):
+        @self.router.post("/batch_hybrid_search/", response_model=List[List[self.search_response_model]])
+        async def batch_hybrid_search(
+                model: self.batch_hybrid_search_model,
+                db: AsyncSession = Depends(get_db)
+        ):
+            return await self.operator.batch_hybrid_search(
                 db=db,
                 model=model
             )
@@ -0,0 +1,74 @@
+from typing import List, Optional, Type
+
+from fastapi import APIRouter, Depends
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.apis.deps import get_db
+from app.crud.vector_index_operation import VectorIndexOperation
+from app.schemes.models.index_models import ResponseLocalVectorIndex
+
+
+class VectorIndexRouter:
+    def __init__(
+            self,
+            router: APIRouter,
+            operator: VectorIndexOperation,
+            create_model: Optional[Type[BaseModel]] = None,
+            response_model: Optional[Type[BaseModel]] = None,
+    ):
+        self.router = router
+        self.operator = operator
+        self.create_model = create_model
+        self.response_model = response_model
+        self.setup_routes()
+
+    def setup_routes(self):
+        self.router.get("/list_indexes/", response_model=List[self.response_model])(self._default_list_indexes())
+        self.router.post("/create_index/", response_model=List[self.response_model])(self._default_create_index())
+        self.router.delete("/drop_index/{index_name}/", response_model=List[self.response_model])(
+            self._default_drop_index())
+        self.router.post("/create_partition_indexes/{partition_id}/", response_model=List[self.response_model])(
+            self._default_create_partition_indexes())
+        self.router.delete("/drop_partition_indexes/{partition_id}/", response_model=List[self.response_model])(
+            self._default_drop_partition_indexes())
+        self.router.post("/sync_local_index/{partition_id}/", response_model=ResponseLocalVectorIndex)(
+            self._default_sync_local_index())
+
+    def _default_list_indexes(self):
+        async def list_indexes(db: AsyncSession = Depends(get_db)):
+            return await self.operator.list_indexes(db=db)
+
+        return list_indexes
+
+    def _default_create_index(self):
+        async def create_index(model: self.create_model, db: AsyncSession = Depends(get_db)):
+            return await self.operator.create_index(db=db, model=model)
+
+        return create_index
+
+    def _default_drop_index(self):
+        async def drop_index(index_name: str, concurrently: bool = True, db: AsyncSession = Depends(get_db)):
+            return await self.operator.drop_index(db=db, index_name=index_name, concurrently=concurrently)
+
+        return drop_index
+
+    def _default_create_partition_indexes(self):
+        async def create_partition_indexes(partition_id: int, db: AsyncSession = Depends(get_db)):
+            await self.operator.create_partition_indexes(db=db, partition_id=partition_id)
+            return await self.operator.list_indexes(db=db)
+
+        return create_partition_indexes
+
+    def _default_drop_partition_indexes(self):
+        async def drop_partition_indexes(partition_id: int, db: AsyncSession = Depends(get_db)):
+            await self.operator.drop_partition_indexes(db=db, partition_id=partition_id)
+            return await self.operator.list_indexes(db=db)
+
+        return drop_partition_indexes
+
+    def _default_sync_local_index(self):
+        async def sync_local_index(partition_id: int, db: AsyncSession = Depends(get_db)):
+            return await self.operator.sync_local_index(db=db, partition_id=partition_id)
+
+        return sync_local_index
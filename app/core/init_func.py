@@ -5,10 +5,14 @@ from sqlalchemy import create_engine, text, Connection
 from sqlalchemy.future import select
 from sqlalchemy.orm import Session
 
+from app.apis.deps import async_session
 from app.crud.file_utils.minio_service import MinIOFileService, init_minio_client
+from app.crud.index_utils.vector_index import (has_vector_index, build_create_vector_index_sql,
+                                               build_vector_index_params)
 from app.db import db_models
 from app.serves.model_serves.chat_model import ChatModel
 from app.serves.model_serves.client_manager import ClientManager
+from app.serves.model_serves.embedding_cache import EmbeddingCache, DiskCacheStore, PgEmbeddingStore
 from app.serves.model_serves.embedding_model import EmbeddingModel
 from app.serves.model_serves.rerank_model import RerankModel
 from config import ServeConfig
@@ -155,17 +159,49 @@ def init_db(reset_db: bool = False):
         raise
 
 
+def check_vector_indexes():
+    """
+    迁移只建立全精度 HNSW 索引。VECTOR_INDEX_METHOD / VECTOR_STORAGE_MODE 配置了其他索引（如 halfvec / binary 量化）时，
+    对应的索引需通过 /xiaoke_admin/vector_index 创建，缺少时量化检索的候选子查询会顺序扫描整张表，这里在启动时给出警告。
+    """
+    method = ServeConfig.vector_index_method
+    quantization = ServeConfig.vector_storage_mode if ServeConfig.vector_storage_mode != "full" else None
+    params = build_vector_index_params(method, m=ServeConfig.hnsw_m, ef_construction=ServeConfig.hnsw_ef_construction,
+                                       lists=ServeConfig.ivfflat_lists)
+    try:
+        with no_async_engine.connect() as conn:
+            for table_name in (db_models.Chunk.__tablename__, db_models.Document.__tablename__):
+                index_defs = conn.execute(text("SELECT indexdef FROM pg_indexes WHERE tablename = :table_name"),
+                                          {"table_name": table_name}).scalars().all()
+                if not has_vector_index(index_defs, method, quantization):
+                    ddl = build_create_vector_index_sql(table_name, "vector", method, params, concurrently=True,
+                                                        quantization=quantization, dim=ServeConfig.embedding_dim)
+                    logging.warning(f"No {method} vector index for storage mode {ServeConfig.vector_storage_mode} "
+                                    f"on {table_name}, vector search will scan the whole table. "
+                                    f"Create it through /xiaoke_admin/vector_index or run: {ddl}")
+    except Exception as e:
+        logging.warning(f"Could not check vector indexes: {e}")
+
+
 def init_rag():
     """初始化RAG模型的客户端管理器"""
     try:
-        embedding_cache = Cache("./embedding_cache")
+        if ServeConfig.embedding_cache_backend == "postgres":
+            embedding_store = PgEmbeddingStore(async_session, db_models.EmbeddingRecord)
+        else:
+            embedding_store = DiskCacheStore(Cache("./embedding_cache"))
+        embedding_cache = EmbeddingCache(store=embedding_store, memory_bytes=ServeConfig.embedding_cache_memory_bytes)
         embedding_client = ClientManager(api_configs=ServeConfig.embedding_api_configs)
         chat_client = ClientManager(api_configs=ServeConfig.llm_api_configs)
         rerank_client = ClientManager(api_configs=ServeConfig.rerank_api_configs)
 
-        embedding_model = EmbeddingModel(client_manager=embedding_client, cache=embedding_cache)
+        embedding_model = EmbeddingModel(client_manager=embedding_client, cache=embedding_cache,
+                                         batch_wait=ServeConfig.embedding_batch_wait_ms / 1000,
+                                         batch_max_items=ServeConfig.embedding_batch_max_items,
+                                         batch_max_tokens=ServeConfig.embedding_batch_max_tokens)
         chat_model = ChatModel(client_manager=chat_client)
-        rerank_model = RerankModel(client_manager=rerank_client)
+        rerank_model = RerankModel(client_manager=rerank_client,
+                                   cache=DiskCacheStore(Cache("./rerank_cache"), expire=ServeConfig.rerank_cache_ttl))
 
         set_embedding_model(embedding_model)
         set_chat_model(chat_model)
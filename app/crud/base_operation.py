@@ -163,7 +163,8 @@ class BaseOperation:
         logging.info(f"Updated item with ID {existing_item.id}")
         return existing_item
 
-    async def delete_item(self, *, db: AsyncSession, _id: int):
+    async def delete_item(self, *, db: AsyncSession, _id: int, commit: bool = True):
+        """commit 为 False 时只 flush，由调用方在同一事务中完成其余操作后提交。"""
         if not _id:
             logging.error("ID is required for deleting an item")
             raise HTTPException(status_code=400, detail="ID is required for deleting an item.")
@@ -186,10 +187,10 @@ class BaseOperation:
                     if fk.column.table == self.db_model.__table__:
                         setattr(item, fk.parent.name, None)
                 db.add(item)
-            await db.commit()
+            await (db.commit() if commit else db.flush())
 
         await db.delete(existing_item)
-        await db.commit()
+        await (db.commit() if commit else db.flush())
         logging.info(f"Deleted item with ID {_id}")
         return existing_item
 
@@ -1,10 +1,17 @@
 from typing import List
+from fastapi import HTTPException
 from pydantic import BaseModel
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.crud.base_operation import BaseOperation
-from app.crud.search_utils import vector_search, hybrid_search
+from app.crud.search_utils import (vector_search, hybrid_search, batch_search, batch_vector_search,
+                                   batch_hybrid_search)
+from app.crud.search_utils.coarse_to_fine import refresh_document_vectors
+from app.crud.search_utils.local_vector_index import get_local_vector_index_registry
+from app.serves.model_serves.tokenizer import get_token_counter
 from app.serves.model_serves.types import EmbeddingInput
+from config import ServeConfig
 from model_constant import get_embedding_model
 from app.crud.filter_utils.filters import FilterHandler
 
@@ -22,9 +29,51 @@ class ChunkOperation(BaseOperation):
             embedding_output = await rag_embedding.embedding(model_input=model_input)
             model.vector = embedding_output.output[0]
 
+    @staticmethod
+    async def process_vectors_field(model: BaseModel):
+        """批量检索的查询向量一次 embedding 请求全部算完。"""
+        if model.vectors is None and model.page_contents:
+            model_input = EmbeddingInput(input_content=model.page_contents)
+            rag_embedding = get_embedding_model()
+            embedding_output = await rag_embedding.embedding(model_input=model_input)
+            model.vectors = embedding_output.output
+        if len(model.vectors or []) != len(model.page_contents):
+            raise HTTPException(status_code=400, detail="vectors must match page_contents one to one.")
+
+    @staticmethod
+    def mark_local_index_stale(partition_ids) -> None:
+        """写入 chunk 后进程内索引不再与数据库一致，检索退回 pgvector，直到下一次同步。"""
+        get_local_vector_index_registry().mark_stale(partition_ids)
+
+    @staticmethod
+    async def refresh_document_centroids(db: AsyncSession, document_ids) -> None:
+        """chunk 向量或所属文档变化后重新计算受影响文档的质心，供由粗到细检索使用。"""
+        await refresh_document_vectors(db, [document_id for document_id in set(document_ids)
+                                            if document_id is not None])
+
     async def create_item(self, *, db: AsyncSession, model: BaseModel):
         await self.process_vector_field(model)
-        return await super().create_item(db=db, model=model)
+        db_item = await super().create_item(db=db, model=model)
+        self.mark_local_index_stale([db_item.partition_id])
+        await self.refresh_document_centroids(db, [db_item.document_id])
+        return db_item
+
+    async def update_item(self, *, db: AsyncSession, model: BaseModel):
+        old_item = (await db.execute(select(self.db_model.partition_id, self.db_model.document_id)
+                                     .where(self.db_model.id == model.id))).one_or_none()
+        db_item = await super().update_item(db=db, model=model)
+        old_partition_id, old_document_id = old_item if old_item is not None else (None, None)
+        self.mark_local_index_stale([old_partition_id, db_item.partition_id])
+        if model.model_fields_set & {"vector", "document_id"}:
+            await self.refresh_document_centroids(db, [old_document_id, db_item.document_id])
+        return db_item
+
+    async def delete_item(self, *, db: AsyncSession, _id: int, commit: bool = True):
+        db_item = await super().delete_item(db=db, _id=_id, commit=commit)
+        self.mark_local_index_stale([db_item.partition_id])
+        if commit:
+            await self.refresh_document_centroids(db, [db_item.document_id])
+        return db_item
 
     async def filter_and_create_items(self, *, db: AsyncSession, models: List[BaseModel]):
         filtered_models = []
@@ -38,16 +87,27 @@ class ChunkOperation(BaseOperation):
                 seen_contents.add(model.page_content)
                 page_contents.append(model.page_content)
 
+        rag_embedding = get_embedding_model()
+
+        # 先整批查一次共享的 embedding 存储，已有向量的内容（包括其他节点或之前导入过的）不再请求接口
+        cached_vectors = await rag_embedding.cached_embeddings(EmbeddingInput(input_content=page_contents))
+        for model, vector in zip(filtered_models, cached_vectors):
+            if vector is not None:
+                model.vector = vector
+        pending = [(model, content) for model, content, vector in zip(filtered_models, page_contents, cached_vectors)
+                   if vector is None]
+
         total_length = 0
         current_chunk = []
         current_chunk_models = []
         chunks = []
         chunked_models = []
 
-        # 根据文本长度和批次大小拆分批次
-        for model, content in zip(filtered_models, page_contents):
-            content_length = len(content)
-            if total_length + content_length > 50000 or len(current_chunk) >= 64:
+        # 根据 token 数和批次大小拆分批次，切分时已算好的 token_count 直接复用
+        token_counter = get_token_counter()
+        for model, content in pending:
+            content_length = (model.doc_metadata or {}).get('token_count') or token_counter.count(content)
+            if total_length + content_length > ServeConfig.embedding_batch_max_tokens or len(current_chunk) >= 64:
                 chunks.append(current_chunk)
                 chunked_models.append(current_chunk_models)
                 current_chunk = [content]
@@ -62,24 +122,34 @@ class ChunkOperation(BaseOperation):
             chunks.append(current_chunk)
             chunked_models.append(current_chunk_models)
 
-        rag_embedding = get_embedding_model()
-
-        # 处理每个批次
-        for chunk, models_chunk in zip(chunks, chunked_models):
-            model_input = EmbeddingInput(input_content=chunk)
-            embedding_output = await rag_embedding.embedding(model_input=model_input)
-            vectors = embedding_output.output
-
+        # 各批次分散到所有 API key 并发请求，结果按批次顺序写回
+        embedding_outputs = await rag_embedding.embed_batches(
+            chunks, concurrency_per_key=ServeConfig.embedding_concurrency_per_key)
+        for models_chunk, embedding_output in zip(chunked_models, embedding_outputs):
             # 更新模型向量
-            for model, vector in zip(models_chunk, vectors):
+            for model, vector in zip(models_chunk, embedding_output.output):
                 model.vector = vector
 
         await super().create_items(db=db, models=filtered_models)
+        self.mark_local_index_stale([model.partition_id for model in filtered_models])
 
     async def vector_search(self, *, db: AsyncSession, model: BaseModel) -> List:
         await self.process_vector_field(model)
         return await vector_search(db, model, self.filter_handler)
 
-    async def hybrid_search(self, *, db: AsyncSession, model: BaseModel) -> List:
-        await self.process_vector_field(model)
-        return await hybrid_search(db, model, self.filter_handler)
+    async def hybrid_search(self, *, db: AsyncSession, model: BaseModel, timings: dict | None = None) -> List:
+        return await hybrid_search(db, model, self.filter_handler, embed_query=self.process_vector_field,
+                                   timings=timings)
+
+    async def batch_search(self, *, db: AsyncSession, model: BaseModel) -> List[list]:
+        return await batch_search(db, model, self.filter_handler)
+
+    async def batch_vector_search(self, *, db: AsyncSession, model: BaseModel) -> List[list]:
+        await self.process_vectors_field(model)
+        return await batch_vector_search(db, model, self.filter_handler)
+
+    async def batch_hybrid_search(self, *, db: AsyncSession, model: BaseModel) -> List[list]:
+        if len(model.keywords_list) != len(model.page_contents):
+            raise HTTPException(status_code=400, detail="keywords_list must match page_contents one to one.")
+        await self.process_vectors_field(model)
+        return await batch_hybrid_search(db, model, self.filter_handler)
@@ -13,6 +13,8 @@ from app.crud.chunk_operation import ChunkOperation
 from app.crud.file_utils.utils import sanitize_filename, generate_hash
 from app.crud.filter_utils.filters import FilterHandler
 from app.crud.image_operation import ImageOperation
+from app.crud.search_utils.coarse_to_fine import refresh_document_vectors
+from app.crud.search_utils.local_vector_index import get_local_vector_index_registry
 from app.db.db_models import Chunk, Document, Image
 from app.schemes.models.chunk_models import ChunkCreate
 from app.schemes.models.data_precess_models import DataPrecess
@@ -20,6 +22,7 @@ from app.schemes.models.document_models import DocumentCreate
 from app.schemes.models.file_models import FileCreate
 from app.serves.file_processing.file_convert import FileConvert
 from app.serves.file_processing.split import nested_split_markdown
+from app.serves.model_serves.tokenizer import chunk_length_function
 from tests.config import ServeConfig
 from utils.find_root_dir import get_project_root
 
@@ -84,6 +87,7 @@ class FileOperator(BaseFile):
                     "chunk_overlap": model.chunk_overlap
                 },
                 remove_image_tag=remove_image_tag, uri2remote=True,
+                length_function=chunk_length_function(),
                 image_operator=ImageOperation(
                     filter_handler=FilterHandler(db_model=Image),
                     bucket_name=ServeConfig.minio_public_images_bucket_name,
@@ -108,6 +112,9 @@ class FileOperator(BaseFile):
             await chunk_operator.filter_and_create_items(db=db, models=chunk_models)
             logger.info(f"Chunks saved for file {file.filename}")
 
+            await refresh_document_vectors(db, [doc_data.id])
+            logger.info(f"Document vector computed for file {file.filename}")
+
         except (Exception, SQLAlchemyError) as e:
             logger.error(f"Error processing file {file.filename}: {e}")
             await db.rollback()
@@ -119,6 +126,7 @@ class FileOperator(BaseFile):
         try:
             tasks = [self.process_single_file(db, model, file, remove_image_tag) for file in files]
             await asyncio.gather(*tasks)
+            await get_local_vector_index_registry().sync(db, Chunk, model.partition_id)
             logger.info(f"Data processing completed for partition {model.partition_id}")
         except (Exception, SQLAlchemyError) as e:
             logger.error(f"Error processing data for partition {model.partition_id}: {e}")
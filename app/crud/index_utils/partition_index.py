@@ -0,0 +1,48 @@
+from typing import List, Optional
+
+from app.crud.index_utils.text_index import SEARCH_VECTOR_COLUMN
+from app.crud.index_utils.vector_index import (VECTOR_INDEX_METHODS, VECTOR_QUANTIZATIONS, check_identifier,
+                                               vector_index_name, build_create_vector_index_sql,
+                                               build_drop_index_sql)
+
+
+def partition_vector_index_name(table_name: str, partition_id: int, method: str,
+                                quantization: Optional[str] = None) -> str:
+    """与全表索引同名再加 _p{partition_id}，索引名能看出方法和量化方式，与迁移和模型声明的命名一致。"""
+    return f"{vector_index_name(table_name, 'vector', method, quantization)}_p{int(partition_id)}"
+
+
+def partition_text_index_name(table_name: str, partition_id: int) -> str:
+    return f"ix_{table_name}_tsv_p{int(partition_id)}"
+
+
+def partition_index_names(table_name: str, partition_id: int) -> List[str]:
+    """分区的全部局部索引名。创建后可能修改过索引方法或量化配置，删除时覆盖所有组合。"""
+    vector_index_names = [partition_vector_index_name(table_name, partition_id, method, quantization)
+                          for method in VECTOR_INDEX_METHODS for quantization in (None, *VECTOR_QUANTIZATIONS)]
+    return vector_index_names + [partition_text_index_name(table_name, partition_id)]
+
+
+def build_create_partition_indexes_sql(table_name: str, partition_id: int, method: str, params: dict,
+                                       text_column: str = SEARCH_VECTOR_COLUMN, concurrently: bool = False,
+                                       quantization: Optional[str] = None, dim: Optional[int] = None) -> List[str]:
+    """生成分区局部的 ANN 索引和 GIN 索引，查询带 partition_id = N 时只会扫描该分区自己的索引。
+
+    GIN 索引建在生成列 search_vector 上，与 search() 使用的检索向量一致。
+    """
+    partition_id = int(partition_id)
+    where_clause = f" WHERE partition_id = {partition_id}"
+    text_index_name = partition_text_index_name(table_name, partition_id)
+    vector_ddl = build_create_vector_index_sql(table_name, "vector", method, params,
+                                               index_name=partition_vector_index_name(table_name, partition_id,
+                                                                                      method, quantization), concurrently=concurrently,
+                                               quantization=quantization, dim=dim) + where_clause
+    text_ddl = (f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {text_index_name} "
+                f"ON {check_identifier(table_name)} USING gin "
+                f"({check_identifier(text_column)}){where_clause}")
+    return [vector_ddl, text_ddl]
+
+
+def build_drop_partition_indexes_sql(table_name: str, partition_id: int, concurrently: bool = False) -> List[str]:
+    return [build_drop_index_sql(index_name, concurrently=concurrently)
+            for index_name in partition_index_names(table_name, partition_id)]
@@ -0,0 +1,24 @@
+from typing import Dict
+
+from app.crud.index_utils.vector_index import check_identifier
+
+SEARCH_VECTOR_COLUMN = "search_vector"
+TSVECTOR_WEIGHTS = ("A", "B", "C", "D")
+
+
+def search_vector_expression(search_columns: Dict[str, str]) -> str:
+    """
+    生成列 search_vector 的表达式：每个可检索列按权重 setweight 后拼接。
+    只用 to_tsvector(regconfig, text) 这类 IMMUTABLE 函数，才能作为 STORED 生成列。
+    """
+    parts = []
+    for column_name, weight in search_columns.items():
+        if weight not in TSVECTOR_WEIGHTS:
+            raise ValueError(f"无效的权重: {weight}，可选: {', '.join(TSVECTOR_WEIGHTS)}")
+        parts.append(f"setweight(to_tsvector('jiebacfg'::regconfig, "
+                     f"coalesce({check_identifier(column_name)}::text, '')), '{weight}')")
+    return " || ".join(parts)
+
+
+def search_vector_index_name(table_name: str) -> str:
+    return f"ix_{table_name}_{SEARCH_VECTOR_COLUMN}"
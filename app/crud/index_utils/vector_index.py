@@ -0,0 +1,84 @@
+import re
+from typing import Dict, List, Optional
+
+VECTOR_INDEX_METHODS = ("hnsw", "ivfflat")
+VECTOR_QUANTIZATIONS = ("halfvec", "binary")
+_IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]{0,62}$")
+_MEMORY_SIZE_PATTERN = re.compile(r"^\d+\s*(kB|MB|GB)$")
+
+
+def check_identifier(name: str) -> str:
+    """只允许普通的 SQL 标识符，避免拼接 DDL 时被注入。"""
+    if not _IDENTIFIER_PATTERN.match(name):
+        raise ValueError(f"无效的标识符: {name}")
+    return name
+
+
+def check_memory_size(size: str) -> str:
+    if not _MEMORY_SIZE_PATTERN.match(size):
+        raise ValueError(f"无效的内存大小: {size}，示例: 512MB, 2GB")
+    return size
+
+
+def vector_index_name(table_name: str, column_name: str, method: str, quantization: Optional[str] = None) -> str:
+    index_name = f"ix_{table_name}_{column_name}_{method}"
+    return f"{index_name}_{quantization}" if quantization else index_name
+
+
+def vector_index_opclass(quantization: Optional[str] = None) -> str:
+    if quantization is None:
+        return "vector_cosine_ops"
+    if quantization == "halfvec":
+        return "halfvec_cosine_ops"
+    if quantization == "binary":
+        return "bit_hamming_ops"
+    raise ValueError(f"不支持的量化方式: {quantization}，可选: {', '.join(VECTOR_QUANTIZATIONS)}")
+
+
+def vector_index_element(column_name: str, quantization: Optional[str] = None, dim: Optional[int] = None) -> str:
+    """索引的列表达式和操作符类。量化存储时只索引紧凑表示，表里仍保留全精度向量用于重排打分。"""
+    column_name = check_identifier(column_name)
+    opclass = vector_index_opclass(quantization)
+    if quantization is None:
+        return f"{column_name} {opclass}"
+    if quantization == "halfvec":
+        return f"({column_name}::halfvec({int(dim)})) {opclass}"
+    return f"(binary_quantize({column_name})::bit({int(dim)})) {opclass}"
+
+
+def has_vector_index(index_defs: List[str], method: str, quantization: Optional[str] = None) -> bool:
+    """pg_indexes.indexdef 中是否有可用于全表检索的该类索引；带 WHERE 的分区局部索引不算。"""
+    opclass = vector_index_opclass(quantization)
+    return any(f"USING {method} " in index_def and opclass in index_def and " WHERE " not in index_def
+               for index_def in index_defs)
+
+
+def build_vector_index_params(method: str, m: Optional[int] = None, ef_construction: Optional[int] = None,
+                              lists: Optional[int] = None) -> Dict[str, int]:
+    if method == "hnsw":
+        params = {"m": m, "ef_construction": ef_construction}
+    elif method == "ivfflat":
+        params = {"lists": lists}
+    else:
+        raise ValueError(f"不支持的索引类型: {method}，可选: {', '.join(VECTOR_INDEX_METHODS)}")
+    return {key: int(value) for key, value in params.items() if value is not None}
+
+
+def build_create_vector_index_sql(table_name: str, column_name: str, method: str, params: Dict[str, int],
+                                  index_name: Optional[str] = None, concurrently: bool = False,
+                                  quantization: Optional[str] = None, dim: Optional[int] = None) -> str:
+    """生成 CREATE INDEX 语句，例如:
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chunks_vector_hnsw ON chunks
+    USING hnsw (vector vector_cosine_ops) WITH (m = 16, ef_construction = 64)
+    """
+    index_name = index_name or vector_index_name(table_name, column_name, method, quantization)
+    with_clause = ""
+    if params:
+        with_clause = " WITH ({})".format(", ".join(f"{key} = {value}" for key, value in params.items()))
+    return (f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {check_identifier(index_name)} "
+            f"ON {check_identifier(table_name)} USING {method} "
+            f"({vector_index_element(column_name, quantization, dim)}){with_clause}")
+
+
+def build_drop_index_sql(index_name: str, concurrently: bool = False) -> str:
+    return f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {check_identifier(index_name)}"
@@ -0,0 +1,42 @@
+import logging
+
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.base_operation import BaseOperation
+from app.crud.filter_utils.filters import FilterHandler
+from app.crud.search_utils.local_vector_index import get_local_vector_index_registry
+from app.crud.vector_index_operation import VectorIndexOperation
+from app.db.db_models import Chunk
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionOperation(BaseOperation):
+    """分区的增删同时维护 chunks 上该分区的局部 ANN / GIN 索引。"""
+
+    def __init__(self, filter_handler: FilterHandler):
+        super().__init__(filter_handler)
+        self.unique_keys = self.db_model.get_unique_columns()
+        self.index_operation = VectorIndexOperation(db_model=Chunk)
+
+    async def create_item(self, *, db: AsyncSession, model: BaseModel):
+        db_item = await super().create_item(db=db, model=model)
+        await self.index_operation.create_partition_indexes(db=db, partition_id=db_item.id)
+        logger.info(f"Created partition indexes for partition {db_item.id}")
+        return db_item
+
+    async def delete_item(self, *, db: AsyncSession, _id: int):
+        # 分区删除成功后在同一事务中删除局部索引并一起提交，任一步失败都整体回滚，分区和索引保持一致
+        try:
+            db_item = await super().delete_item(db=db, _id=_id, commit=False)
+            await self.index_operation.drop_partition_indexes(db=db, partition_id=_id, concurrently=False,
+                                                              commit=False)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        # 分区内的 chunk 已脱离该分区，进程内索引中的 id 不能再返回
+        get_local_vector_index_registry().mark_stale([_id])
+        logger.info(f"Deleted partition {_id} and dropped its partition indexes")
+        return db_item
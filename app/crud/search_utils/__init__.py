@@ -1,3 +1,3 @@
-from app.crud.search_utils.search import search
-from app.crud.search_utils.hybrid_search import hybrid_search
-from app.crud.search_utils.vector_search import vector_search
+from app.crud.search_utils.search import search, batch_search
+from app.crud.search_utils.hybrid_search import hybrid_search, batch_hybrid_search
+from app.crud.search_utils.vector_search import vector_search, batch_vector_search
@@ -0,0 +1,48 @@
+from sqlalchemy import func, select, cast, Float, true, and_
+
+from app.db.db_models import ChunkTermStat, ChunkCorpusStat
+from config import ServeConfig
+
+
+def build_bm25_score(search_vector, query_vector, partition_id: int | None = None):
+    """
+    BM25 得分的相关子查询，对每个命中行只展开其 search_vector 中与查询词相交的词项。
+
+    idf 和平均长度来自触发器维护的统计表（对各 shard 求和）：指定分区时使用该分区的统计，否则汇总全部分区。
+    tf 取词项在 tsvector 中的位置数，文档长度取 length(search_vector)，与统计表的口径一致。
+    """
+    k1 = ServeConfig.bm25_k1
+    b = ServeConfig.bm25_b
+
+    doc_count = func.coalesce(func.sum(ChunkCorpusStat.doc_count), 0)
+    total_length = func.coalesce(func.sum(ChunkCorpusStat.total_length), 0)
+    corpus = select(doc_count.label("doc_count"),
+                    func.greatest(cast(total_length, Float) / func.greatest(doc_count, 1), 1.0,
+                                  type_=Float).label("avg_length"))
+    if partition_id is not None:
+        corpus = corpus.where(ChunkCorpusStat.partition_id == partition_id)
+    corpus = corpus.cte("bm25_corpus")
+
+    query_terms = func.unnest(func.tsvector_to_array(query_vector)).table_valued("lexeme").render_derived(
+        name="query_terms")
+    join_condition = ChunkTermStat.lexeme == query_terms.c.lexeme
+    if partition_id is not None:
+        join_condition = and_(join_condition, ChunkTermStat.partition_id == partition_id)
+    df = func.coalesce(func.sum(ChunkTermStat.df), 0)
+    idf = func.ln(1 + cast(func.greatest(corpus.c.doc_count - df, 0) + 0.5, Float) / (df + 0.5))
+    terms = (select(query_terms.c.lexeme, idf.label("idf"), corpus.c.avg_length)
+             .select_from(query_terms)
+             .outerjoin(ChunkTermStat, join_condition)
+             .join(corpus, true())
+             .group_by(query_terms.c.lexeme, corpus.c.doc_count, corpus.c.avg_length)
+             .cte("bm25_terms"))
+
+    doc_terms = func.unnest(search_vector).table_valued("lexeme", "positions", "weights").render_derived(
+        name="doc_terms")
+    tf = cast(func.coalesce(func.array_length(doc_terms.c.positions, 1), 1), Float)
+    doc_length = func.length(search_vector)
+    term_score = terms.c.idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_length / terms.c.avg_length))
+    return (select(func.coalesce(func.sum(term_score), 0.0))
+            .select_from(doc_terms)
+            .join(terms, terms.c.lexeme == doc_terms.c.lexeme)
+            .scalar_subquery())
@@ -0,0 +1,32 @@
+from typing import List
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.search_utils.execute_query_utils import execute_query
+from app.crud.search_utils.partition_utils import build_partition_condition
+from app.crud.search_utils.vector_search_utils import build_vector_search_query
+from app.db.db_models import Chunk, Document
+
+
+async def refresh_document_vectors(db: AsyncSession, document_ids: List[int]) -> None:
+    """
+    文档向量取其全部 chunk 向量的均值（质心），在数据库中直接聚合，不把 chunk 向量取回应用。
+    余弦距离与向量长度无关，质心不需要再归一化。
+    """
+    if not document_ids:
+        return
+    centroid = (select(func.avg(Chunk.vector))
+                .where(Chunk.document_id == Document.id)
+                .scalar_subquery())
+    await db.execute(update(Document).where(Document.id.in_(document_ids)).values(vector=centroid))
+    await db.commit()
+
+
+async def search_top_documents(db: AsyncSession, query_vector, limit: int, partition_id: int | None = None,
+                               quantization: str | None = None, oversampling: int = 1) -> List[int]:
+    """粗排：在文档向量上检索与查询最接近的 limit 个文档，返回文档 id。"""
+    filter_conditions = [Document.vector.isnot(None), build_partition_condition(Document, partition_id)]
+    query = build_vector_search_query(Document, query_vector, filter_conditions, 0, limit,
+                                      quantization=quantization, oversampling=oversampling, return_fields=["id"])
+    return [row.id for row in await execute_query(db, query)]
@@ -0,0 +1,118 @@
+import re
+from typing import List
+
+from sqlalchemy import func, select, cast, and_, case, Integer, literal_column
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.search_utils.execute_query_utils import execute_query
+from app.crud.search_utils.mmr import row_to_namespace
+
+# 邻接段落检索会用到的列，指定 return_fields 时总是一并取回
+CONTEXT_REQUIRED_FIELDS = ["id", "page_content", "doc_metadata", "document_id"]
+
+# 只有整数形式的段落号参与窗口扩展，与 ix_chunks_document_paragraph_number 索引中的正则一致
+PARAGRAPH_NUMBER_PATTERN = "^-?[0-9]{1,9}$"
+
+
+def paragraph_number_expression(db_model):
+    """
+    与 ix_chunks_document_paragraph_number 索引一致的段落号表达式，键和正则以常量渲染才能匹配索引。
+    doc_metadata 是任意字典，段落号不是整数（如 "3a"、1.5）时为 NULL，而不是让转换报错。
+    """
+    value = db_model.doc_metadata.op('->>')(literal_column("'paragraph_number'"))
+    return case((value.op('~')(literal_column(f"'{PARAGRAPH_NUMBER_PATTERN}'")), cast(value, Integer)))
+
+
+def parse_paragraph_number(value) -> int | None:
+    """Python 端与 paragraph_number_expression 相同的解析规则。"""
+    if value is None or not re.fullmatch(PARAGRAPH_NUMBER_PATTERN[1:-1], str(value)):
+        return None
+    return int(value)
+
+
+def merge_context_windows(results: list, context_window: int) -> list:
+    """
+    每个命中扩展为同一文档内 [段落号 - N, 段落号 + N] 的窗口，同一文档中重叠或相邻的窗口合并，
+    合并后的窗口按其中最靠前的命中排序。没有整数段落号的命中原样保留。
+    返回 (排序位置, 命中行, 窗口) 列表，窗口为 (document_id, 起始段落, 结束段落) 或 None。
+    """
+    intervals = {}
+    entries = []
+    for position, row in enumerate(results):
+        paragraph_number = parse_paragraph_number((getattr(row, "doc_metadata", None) or {}).get("paragraph_number"))
+        document_id = getattr(row, "document_id", None)
+        if paragraph_number is None or document_id is None:
+            entries.append((position, row, None))
+            continue
+        intervals.setdefault(document_id, []).append(
+            (paragraph_number - context_window, paragraph_number + context_window, position, row))
+
+    for document_id, document_intervals in intervals.items():
+        document_intervals.sort(key=lambda interval: interval[0])
+        merged = []
+        for start, end, position, row in document_intervals:
+            if merged and start <= merged[-1][1] + 1:
+                last = merged[-1]
+                last[1] = max(last[1], end)
+                if position < last[2]:
+                    last[2], last[3] = position, row
+            else:
+                merged.append([start, end, position, row])
+        entries.extend((position, row, (document_id, start, end)) for start, end, position, row in merged)
+
+    entries.sort(key=lambda entry: entry[0])
+    return entries
+
+
+async def expand_context_windows(db: AsyncSession, db_model, results_list: List[list], context_window: int,
+                                 return_fields: List[str] | None = None) -> List[list]:
+    """
+    把每组检索结果中的命中扩展为前后 context_window 个段落，所有组的所有窗口在一条 SQL 中取回。
+    每个 chunk 在一组结果中只出现一次，窗口内按段落号排列；命中行保留原有 rank_score，邻接段落为空。
+    窗口没有取回任何行时（如查询出错）保留原来的命中，不让它从结果中消失。
+    """
+    entries_list = [merge_context_windows(results, context_window) for results in results_list]
+    windows = [window for entries in entries_list for _, _, window in entries if window is not None]
+    if not windows:
+        return results_list
+
+    fields = list(dict.fromkeys(CONTEXT_REQUIRED_FIELDS + (return_fields or [])))
+    columns_to_select = db_model.get_search_projection(fields)
+    paragraph_number = paragraph_number_expression(db_model)
+    window_table = func.unnest(
+        cast(list(range(1, len(windows) + 1)), ARRAY(Integer)),
+        cast([window[0] for window in windows], ARRAY(Integer)),
+        cast([window[1] for window in windows], ARRAY(Integer)),
+        cast([window[2] for window in windows], ARRAY(Integer)),
+    ).table_valued("window_id", "document_id", "start_paragraph", "end_paragraph").render_derived(name="windows")
+    query = (select(window_table.c.window_id, *columns_to_select)
+             .join(window_table, and_(db_model.document_id == window_table.c.document_id,
+                                      paragraph_number.between(window_table.c.start_paragraph,
+                                                               window_table.c.end_paragraph)))
+             .order_by(window_table.c.window_id, paragraph_number))
+
+    window_rows = [[] for _ in windows]
+    for row in await execute_query(db, query):
+        window_rows[row.window_id - 1].append(row)
+
+    expanded_list = []
+    window_index = 0
+    for results, entries in zip(results_list, entries_list):
+        hit_scores = {row.id: getattr(row, "rank_score", None) for row in results}
+        expanded = []
+        for _, hit, window in entries:
+            if window is None:
+                expanded.append(row_to_namespace(hit))
+                continue
+            rows = window_rows[window_index]
+            window_index += 1
+            if not rows:
+                expanded.append(row_to_namespace(hit))
+                continue
+            expanded.extend(row_to_namespace(row, {"window_id"}, rank_score=hit_scores.get(row.id))
+                            for row in rows)
+        for position, row in enumerate(expanded, start=1):
+            row.rank_position = position
+        expanded_list.append(expanded)
+    return expanded_list
@@ -9,4 +9,12 @@ async def execute_query(db: AsyncSession, query):
         return rows
     except SQLAlchemyError as e:
         print(f"Database error: {e}")
-        return []
\ No newline at end of file
+        return []
+
+
+def group_rows_by_query(rows, query_count: int) -> list:
+    """批量检索的结果按 query_index（从 1 开始）拆回每个查询各自的列表。"""
+    grouped = [[] for _ in range(query_count)]
+    for row in rows:
+        grouped[row.query_index - 1].append(row)
+    return grouped
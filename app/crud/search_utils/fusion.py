@@ -0,0 +1,62 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+FUSION_METHODS = ("rrf", "minmax", "zscore", "dbsf")
+
+
+def normalize_scores(scores: np.ndarray, method: str) -> np.ndarray:
+    """
+    把单路检索的原始得分映射到可相加的尺度：
+    minmax 缩放到 [0, 1]；zscore 标准化为均值 0、方差 1；
+    dbsf 以均值 ± 3 倍标准差为上下界截断后缩放到 [0, 1]，对离群得分更稳。
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(scores) == 0:
+        return scores
+    if method == "minmax":
+        low, high = scores.min(), scores.max()
+    elif method == "zscore":
+        std = scores.std()
+        return (scores - scores.mean()) / std if std > 0 else np.zeros_like(scores)
+    elif method == "dbsf":
+        mean, std = scores.mean(), scores.std()
+        low, high = mean - 3 * std, mean + 3 * std
+        scores = np.clip(scores, low, high)
+    else:
+        raise ValueError(f"不支持的融合方式: {method}")
+    return (scores - low) / (high - low) if high > low else np.ones_like(scores)
+
+
+def fuse_ranked_lists(ids: Sequence[np.ndarray], scores: Sequence[np.ndarray], weights: Sequence[float],
+                      method: str = "rrf", k: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    融合多路按名次排好序的检索结果，返回按融合得分降序的 (ids, scores)。
+
+    每一路给出 id 数组和对应的原始得分数组（名次即数组下标 + 1）。rrf 只用名次，其余方式用归一化后的得分；
+    权重先归一化，未出现在某一路中的 id 在该路的贡献为 0。
+    合并用 np.unique + np.bincount 完成，没有逐条的 Python 循环。
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    weights = weights / weights.sum() if weights.sum() > 0 else np.full(len(weights), 1 / max(len(weights), 1))
+
+    all_ids: List[np.ndarray] = []
+    contributions: List[np.ndarray] = []
+    for branch_ids, branch_scores, weight in zip(ids, scores, weights):
+        branch_ids = np.asarray(branch_ids, dtype=np.int64)
+        if len(branch_ids) == 0:
+            continue
+        if method == "rrf":
+            contribution = weight / (k + np.arange(1, len(branch_ids) + 1, dtype=np.float64))
+        else:
+            contribution = weight * normalize_scores(branch_scores, method)
+        all_ids.append(branch_ids)
+        contributions.append(contribution)
+
+    if not all_ids:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    unique_ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+    fused = np.bincount(inverse, weights=np.concatenate(contributions), minlength=len(unique_ids))
+    order = np.argsort(-fused, kind="stable")
+    return unique_ids[order], fused[order]
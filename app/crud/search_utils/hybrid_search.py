@@ -1,62 +1,103 @@
-from typing import TypeVar
+import asyncio
+import logging
+import time
+from typing import TypeVar, Callable, Awaitable
 
+import aiohttp
 import numpy as np
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.crud.filter_utils.filters import FilterHandler
-from app.crud.search_utils.search import search
-from app.crud.search_utils.vector_search import vector_search
-from model_constant import get_rerank_model
+from app.crud.search_utils.context_window import expand_context_windows
+from app.crud.search_utils.execute_query_utils import execute_query
+from app.crud.search_utils.fusion import fuse_ranked_lists
+from app.crud.search_utils.hybrid_search_utils import build_hybrid_search_query
+from app.crud.search_utils.mmr import mmr_rerank, row_to_namespace
+from app.crud.search_utils.search import search, batch_search, sanitize_keywords, default_search_columns
+from app.crud.search_utils.vector_search import vector_search, batch_vector_search, resolve_quantization
+from app.crud.search_utils.vector_search_planner import plan_vector_search, apply_vector_search_plan
+from config import ServeConfig
+from model_constant import get_rerank_model, get_local_rerank_model
+
+logger = logging.getLogger(__name__)
 
 T = TypeVar('T', bound=BaseModel)
 
+# 融合、重排和按段落排序会用到的列，指定 return_fields 时总是一并取回
+HYBRID_REQUIRED_FIELDS = ["id", "page_content", "doc_metadata", "document_id"]
+
+# 并发执行两路检索时关键词分支另占一个连接池连接，同时借出的连接数不超过 HYBRID_BRANCH_CONNECTIONS，
+# 避免每个请求都持有一个连接再等第二个，把连接池耗尽
+branch_connections = asyncio.Semaphore(ServeConfig.hybrid_branch_connections)
+
+
+def prepare_branch_model(model: BaseModel, fused_in_sql: bool = False) -> BaseModel:
+    """
+    各检索分支使用的参数：补齐融合需要的列；
+    多样化时分支多取 fetch_k 个候选并带上向量，MMR 在融合之后统一做一次；
+    指定 candidate_k 时每一路从头取 candidate_k 个候选，融合后再按 offset / limit 截取。
+    """
+    update = {}
+    if getattr(model, "return_fields", None):
+        update["return_fields"] = list(dict.fromkeys(HYBRID_REQUIRED_FIELDS + model.return_fields))
+    if getattr(model, "diversify", False):
+        return_fields = HYBRID_REQUIRED_FIELDS + (model.return_fields or []) + ["vector"]
+        update["return_fields"] = list(dict.fromkeys(return_fields))
+        update["limit"] = max(model.fetch_k or model.limit * 4, model.limit)
+        update["diversify"] = False
+    if getattr(model, "rerank", False):
+        # 重排得分缓存按 update_at 判断 chunk 是否变化；本地重排直接使用 chunk 已存的向量
+        extra_fields = ["update_at"] + (["vector"] if rerank_backend(model) == "local" else [])
+        return_fields = HYBRID_REQUIRED_FIELDS + (model.return_fields or []) + extra_fields
+        update["return_fields"] = list(dict.fromkeys(update.get("return_fields", []) + return_fields))
+    if getattr(model, "candidate_k", None) and not fused_in_sql:
+        update["limit"] = max(update.get("limit", 0), model.candidate_k, (model.offset or 0) + model.limit)
+        update["offset"] = 0
+    return model.model_copy(update=update) if update else model
+
+
+def slice_fused_results(model: BaseModel, results: list) -> list:
+    """各分支按 candidate_k 过取时，融合后截取本页；多样化时交给 MMR 选取。"""
+    if not getattr(model, "candidate_k", None) or getattr(model, "diversify", False):
+        return results
+    offset = model.offset or 0
+    return results[offset:offset + model.limit]
+
+
+async def finalize_hybrid_results(model: BaseModel, results: list, query_vector) -> list:
+    requested_fields = set(model.return_fields or HYBRID_REQUIRED_FIELDS)
+    if getattr(model, "diversify", False) and query_vector is not None:
+        results = mmr_rerank(results, query_vector, model.limit, model.mmr_lambda, model.offset or 0,
+                             keep_vector="vector" in requested_fields)
+    # 为多样化、重排补取而未请求的列不返回
+    helper_fields = {"vector", "update_at"} - requested_fields
+    if results and any(hasattr(results[0], field) for field in helper_fields):
+        results = [row_to_namespace(row, helper_fields) for row in results]
+    fused = model.rerank or (model.use_vector_search and model.use_keyword_search)
+    if fused and model.paragraph_number_ranking:
+        results = await rank_by_paragraph_number(results, model.filter_count)
+    return results
+
 
 async def sort_hybrid_results(
         model: BaseModel,
         vector_results: list,
         keyword_results: list
 ) -> list:
-    k = model.k
-    vector_weight = model.vector_weight
-    keyword_weight = model.keyword_weight
-
-    total_weight = vector_weight + keyword_weight
-    vector_weight /= total_weight
-    keyword_weight /= total_weight
-
-    combined_results = {}
-
-    for rank, result in enumerate(vector_results, start=1):
-        combined_results[result.id] = {
-            'result': result,
-            'vector_rank': rank,
-            'keyword_rank': None
-        }
-
-    for rank, result in enumerate(keyword_results, start=1):
-        if result.id in combined_results:
-            combined_results[result.id]['keyword_rank'] = rank
-        else:
-            combined_results[result.id] = {
-                'result': result,
-                'vector_rank': None,
-                'keyword_rank': rank
-            }
-
-    vector_ranks = [item['vector_rank'] if item['vector_rank'] is not None else float('inf') for item in
-                    combined_results.values()]
-    keyword_ranks = [item['keyword_rank'] if item['keyword_rank'] is not None else float('inf') for item in
-                     combined_results.values()]
-    scores = [vector_weight / (k + vector_rank) + keyword_weight / (k + keyword_rank) for vector_rank, keyword_rank in
-              zip(vector_ranks, keyword_ranks)]
-
-    for i, item in enumerate(combined_results.values()):
-        item['score'] = scores[i]
-
-    sorted_results = sorted(combined_results.values(), key=lambda x: x['score'], reverse=True)
+    """按 fusion_method 融合两路结果，rank_score / rank_position 改写为融合后的得分和名次。"""
+    branches = [(vector_results, model.vector_weight), (keyword_results, model.keyword_weight)]
+    ids = [np.fromiter((row.id for row in rows), dtype=np.int64, count=len(rows)) for rows, _ in branches]
+    scores = [np.fromiter((getattr(row, "rank_score", None) or 0.0 for row in rows), dtype=np.float64,
+                          count=len(rows)) for rows, _ in branches]
+    fused_ids, fused_scores = fuse_ranked_lists(ids, scores, [weight for _, weight in branches],
+                                                method=getattr(model, "fusion_method", None) or "rrf", k=model.k)
 
-    return [item['result'] for item in sorted_results]
+    # 两路都命中时沿用向量检索返回的行
+    rows_by_id = {row.id: row for row in keyword_results}
+    rows_by_id.update({row.id: row for row in vector_results})
+    return [row_to_namespace(rows_by_id[_id], rank_score=score, rank_position=position)
+            for position, (_id, score) in enumerate(zip(fused_ids.tolist(), fused_scores.tolist()), start=1)]
 
 
 async def sort_rerank_results(
@@ -66,60 +107,219 @@ async def sort_rerank_results(
         chunk_size: int = 832,
         chunk_overlap: int = 32
 ) -> list:
-    # 获取 vector_results 和 keyword_results 的并集，并去除重复的部分
-    combined_results = {}
-    combined_results.update({result.id: result for result in vector_results})
-    combined_results.update({result.id: result for result in keyword_results})
+    """
+    先用融合名次对两路候选去重排序，截取前 rerank_pool_size 个送去重排，
+    重排结果按下标映射回候选行，rank_score 为重排得分，rerank_top_n 限制返回数量。
+    """
+    candidates = await sort_hybrid_results(model, vector_results, keyword_results)
+    pool_size = getattr(model, "rerank_pool_size", None) or ServeConfig.rerank_pool_size
+    candidates = candidates[:pool_size]
+
+    documents = [candidate.page_content for candidate in candidates]
+    document_vectors = [getattr(candidate, "vector", None) for candidate in candidates]
+    document_keys = [f"{candidate.id}:{getattr(candidate, 'update_at', None)}" for candidate in candidates]
+    scores = await rerank_candidates(model, documents, document_vectors, document_keys, chunk_size, chunk_overlap)
+
+    # 未拿到重排得分的候选（分片超时）保持融合顺序和融合得分，排在重排结果之后
+    scored_indices = {index for index, _ in scores}
+    order = [index for index, _ in scores] + [index for index in range(len(candidates))
+                                             if index not in scored_indices]
+    top_n = getattr(model, "rerank_top_n", None)
+    order = order[:top_n] if top_n is not None else order
+    scores = dict(scores)
+    for position, index in enumerate(order, start=1):
+        candidates[index].rank_score = scores.get(index, candidates[index].rank_score)
+        candidates[index].rank_position = position
+    return [candidates[index] for index in order]
 
-    filtered_results = list(combined_results.values())
 
-    query = model.page_content
-    documents = [result.page_content for result in filtered_results]
+def rerank_backend(model: BaseModel) -> str:
+    return getattr(model, "rerank_backend", None) or ServeConfig.rerank_backend
+
+
+async def rerank_candidates(model: BaseModel, documents: list, document_vectors: list, document_keys: list,
+                            chunk_size: int, chunk_overlap: int) -> list:
+    """remote 后端限流或请求失败时退回本地重排，两者的返回格式一致。"""
+    kwargs = dict(query=model.page_content, documents=documents, max_chunks_per_doc=chunk_size,
+                  overlap_tokens=chunk_overlap, top_n=getattr(model, "rerank_top_n", None),
+                  query_vector=model.vector, document_vectors=document_vectors)
     rerank_model = get_rerank_model()
-    sorted_documents = await rerank_model.get_sorted_documents(query=query, documents=documents,
-                                                               chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if rerank_backend(model) == "remote" and rerank_model is not None:
+        if not rerank_model.is_rate_limited():
+            try:
+                return await rerank_model.rerank_scores(**kwargs, document_keys=document_keys)
+            except (aiohttp.ClientError, asyncio.TimeoutError, KeyError) as e:
+                logger.warning(f"Remote rerank failed, falling back to local rerank: {e!r}")
+        else:
+            logger.info("Remote rerank is rate limited, using local rerank")
+    return await get_local_rerank_model().rerank_scores(**kwargs)
+
+
+async def expand_hybrid_context(db: AsyncSession, filter_handler: FilterHandler, model: BaseModel,
+                                results_list: list) -> list:
+    """context_window 大于 0 时，把命中扩展为前后若干段落，所有查询的窗口一条 SQL 取回。"""
+    context_window = getattr(model, "context_window", 0)
+    if not context_window:
+        return results_list
+    return await expand_context_windows(db, filter_handler.db_model, results_list, context_window,
+                                        return_fields=model.return_fields)
+
+
+def use_sql_execution(model: BaseModel) -> bool:
+    """两路都开启、不重排且不由粗到细时，才能在 SQL 中完成 RRF 融合。"""
+    execution = getattr(model, "execution", None) or ServeConfig.hybrid_execution
+    fusion_method = getattr(model, "fusion_method", None) or "rrf"
+    return execution == "sql" and model.use_vector_search and model.use_keyword_search and not model.rerank \
+        and fusion_method == "rrf" and not getattr(model, "coarse_documents", None)
+
+
+async def sql_hybrid_search(db: AsyncSession, model: BaseModel, filter_handler: FilterHandler) -> list:
+    keywords = sanitize_keywords(model.keywords)
+    search_columns = model.search_columns or default_search_columns(filter_handler)
+    if not keywords or not search_columns:
+        return await vector_search(db, model, filter_handler)
+
+    offset = model.offset or 0
+    limit = model.limit or 20
+    quantization = resolve_quantization(model.quantization)
+    oversampling = model.oversampling or ServeConfig.vector_oversampling
+    filters = getattr(model, "filters", None) or {}
+    candidate_k = max(model.candidate_k or 0, offset + limit)
 
-    sorted_results = [next(result for result in filtered_results if result.page_content == doc) for doc in
-                      sorted_documents]
+    filter_clause = filter_handler.create_filter_clause(filters)
+    top_k = candidate_k * (max(oversampling, 1) if quantization else 1)
+    plan = await plan_vector_search(db, filter_handler.db_model, [filter_clause] if filters else [], model.mode,
+                                    top_k, ef_search=model.ef_search, probes=model.probes)
+    await apply_vector_search_plan(db, plan)
 
-    return sorted_results
+    query = build_hybrid_search_query(filter_handler.db_model, model.vector, ' & '.join(keywords), search_columns,
+                                      filters, filter_handler, offset, limit, k=model.k,
+                                      vector_weight=model.vector_weight, keyword_weight=model.keyword_weight,
+                                      candidate_k=candidate_k, partition_id=model.partition_id,
+                                      quantization=quantization, oversampling=oversampling,
+                                      exact=plan.mode == "exact", search_plan=f"hybrid_sql {plan.label}",
+                                      ranking=model.ranking or "ts_rank", query_text=' '.join(keywords),
+                                      return_fields=model.return_fields)
+    return await execute_query(db, query)
+
+
+async def timed(timings: dict | None, name: str, awaitable):
+    """等待 awaitable，并把耗时（毫秒）记到 timings[name]。"""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        if timings is not None:
+            timings[name] = (time.perf_counter() - start) * 1000
 
 
 async def hybrid_search(
         db: AsyncSession,
         model: BaseModel,
         filter_handler: FilterHandler,
+        embed_query: Callable[[BaseModel], Awaitable] | None = None,
+        timings: dict | None = None,
 ) -> list:
-    use_vector_search = model.use_vector_search
-    use_keyword_search = model.use_keyword_search
+    """
+    embed_query: model.vector 为空时计算查询向量，两路都开启时与关键词检索并发执行
+    timings: 传入时记录 embedding、vector、keyword 各阶段的耗时（毫秒）
+    """
+    concurrent = model.use_vector_search and model.use_keyword_search and not use_sql_execution(model)
+    if concurrent and branch_connections.locked():
+        # 没有空余名额时不等待，两路检索在当前连接上依次执行
+        logger.debug("No spare connection for the keyword branch, running hybrid branches sequentially")
+        concurrent = False
+    if model.vector is None and embed_query is not None and not concurrent:
+        await timed(timings, "embedding", embed_query(model))
+
+    if use_sql_execution(model):
+        results = await timed(timings, "hybrid_sql", sql_hybrid_search(
+            db, prepare_branch_model(model, fused_in_sql=True), filter_handler))
+        results = await finalize_hybrid_results(model, results, model.vector)
+        return (await expand_hybrid_context(db, filter_handler, model, [results]))[0]
+
     vector_results = []
     keyword_results = []
-    chunk_sizes = []
-    chunk_overlaps = []
-    if use_vector_search:
-        vector_results = await vector_search(db, model, filter_handler)
-        for result in vector_results:
-            chunk_sizes.append(result.doc_metadata['chunk_size'])
-            chunk_overlaps.append(result.doc_metadata['chunk_overlap'])
-
-    if use_keyword_search:
-        keyword_results = await search(db, model, filter_handler)
-        for result in keyword_results:
-            chunk_sizes.append(result.doc_metadata['chunk_size'])
-            chunk_overlaps.append(result.doc_metadata['chunk_overlap'])
-    max_chunk_size = max(chunk_sizes)
-    min_chunk_overlap = min(chunk_overlaps)
+    if concurrent:
+        vector_results, keyword_results = await asyncio.gather(
+            run_vector_branch(db, model, filter_handler, embed_query, timings),
+            run_keyword_branch(db, model, filter_handler, timings))
+    else:
+        if model.use_vector_search:
+            vector_results = await timed(timings, "vector", vector_search(db, prepare_branch_model(model),
+                                                                          filter_handler))
+        if model.use_keyword_search:
+            keyword_results = await timed(timings, "keyword", search(db, prepare_branch_model(model),
+                                                                     filter_handler))
+
+    results = await fuse_hybrid_results(prepare_branch_model(model), vector_results, keyword_results)
+    results = await finalize_hybrid_results(model, slice_fused_results(model, results), model.vector)
+    return (await expand_hybrid_context(db, filter_handler, model, [results]))[0]
+
+
+async def run_vector_branch(db: AsyncSession, model: BaseModel, filter_handler: FilterHandler,
+                            embed_query: Callable[[BaseModel], Awaitable] | None, timings: dict | None) -> list:
+    if model.vector is None and embed_query is not None:
+        await timed(timings, "embedding", embed_query(model))
+    return await timed(timings, "vector", vector_search(db, prepare_branch_model(model), filter_handler))
+
+
+async def run_keyword_branch(db: AsyncSession, model: BaseModel, filter_handler: FilterHandler,
+                             timings: dict | None) -> list:
+    # 同一个 AsyncSession 不能并发执行语句，关键词检索从连接池另取一个连接
+    async with branch_connections, AsyncSession(bind=db.bind) as keyword_db:
+        return await timed(timings, "keyword", search(keyword_db, prepare_branch_model(model), filter_handler))
+
+
+async def batch_hybrid_search(
+        db: AsyncSession,
+        model: BaseModel,
+        filter_handler: FilterHandler,
+) -> list:
+    """
+    向量检索和关键词检索各用一条批量 SQL，再按查询分别融合。
+    execution 为 sql 时每个查询的两路检索和融合是一条语句，无法再合并为 LATERAL，逐条执行单条混合检索。
+    """
+    query_count = len(model.page_contents)
+    query_vectors = model.vectors or [None] * query_count
+    if use_sql_execution(model):
+        return [await hybrid_search(db, model.model_copy(update={"page_content": page_content, "keywords": keywords,
+                                                                 "vector": query_vector}), filter_handler)
+                for page_content, keywords, query_vector in zip(model.page_contents, model.keywords_list,
+                                                                query_vectors)]
+
+    branch_model = prepare_branch_model(model)
+    vector_results_list = [[] for _ in range(query_count)]
+    keyword_results_list = [[] for _ in range(query_count)]
+    if model.use_vector_search:
+        vector_results_list = await batch_vector_search(db, branch_model, filter_handler)
+
+    if model.use_keyword_search:
+        keyword_results_list = await batch_search(db, branch_model, filter_handler)
+
+    results = []
+    for page_content, keywords, query_vector, vector_results, keyword_results in zip(
+            model.page_contents, model.keywords_list, query_vectors, vector_results_list, keyword_results_list):
+        query_model = branch_model.model_copy(update={"page_content": page_content, "keywords": keywords,
+                                                      "vector": query_vector})
+        fused_results = await fuse_hybrid_results(query_model, vector_results, keyword_results)
+        results.append(await finalize_hybrid_results(model, slice_fused_results(model, fused_results),
+                                                     query_vector))
+    return await expand_hybrid_context(db, filter_handler, model, results)
+
+
+async def fuse_hybrid_results(model: BaseModel, vector_results: list, keyword_results: list) -> list:
+    use_vector_search = model.use_vector_search
+    use_keyword_search = model.use_keyword_search
     if model.rerank:
-        rerank_results = await sort_rerank_results(model, vector_results, keyword_results, max_chunk_size,
-                                                   min_chunk_overlap)
-        if model.paragraph_number_ranking:
-            rerank_results = await rank_by_paragraph_number(rerank_results, model.filter_count)
-        return rerank_results
+        if not vector_results and not keyword_results:
+            return []
+        chunk_sizes = [result.doc_metadata['chunk_size'] for result in vector_results + keyword_results]
+        chunk_overlaps = [result.doc_metadata['chunk_overlap'] for result in vector_results + keyword_results]
+        return await sort_rerank_results(model, vector_results, keyword_results, max(chunk_sizes),
+                                         min(chunk_overlaps))
     elif use_vector_search and use_keyword_search:
-        hybrid_results = await sort_hybrid_results(model, vector_results, keyword_results)
-        if model.paragraph_number_ranking:
-            hybrid_results = await rank_by_paragraph_number(hybrid_results, model.filter_count)
-        return hybrid_results
+        return await sort_hybrid_results(model, vector_results, keyword_results)
     elif use_vector_search:
         return vector_results
     elif use_keyword_search:
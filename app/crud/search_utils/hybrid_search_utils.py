@@ -0,0 +1,57 @@
+from typing import List
+
+from sqlalchemy import func, select, Float, cast, literal
+
+from app.crud.filter_utils.filters import FilterHandler
+from app.crud.search_utils.partition_utils import build_partition_condition
+from app.crud.search_utils.search_utils import build_search_query
+from app.crud.search_utils.vector_search_utils import build_vector_search_query
+
+
+def build_hybrid_search_query(db_model, query_vector, query_condition: str, search_columns: List[str],
+                              filters: dict, filter_handler: FilterHandler, offset: int, limit: int,
+                              k: int = 1, vector_weight: float = 1.0, keyword_weight: float = 1.0,
+                              candidate_k: int | None = None, partition_id: int | None = None,
+                              quantization: str | None = None, oversampling: int = 1, exact: bool = False,
+                              search_plan: str | None = None, ranking: str = "ts_rank", query_text: str = "",
+                              return_fields: List[str] | None = None):
+    """
+    向量检索和关键词检索各作为一个只取 id 和名次的 CTE，FULL OUTER JOIN 后在 SQL 中计算加权 RRF，
+    只对融合后的前 limit 行回表取内容，一次往返，两路都命中的行也只传一次。
+    """
+    candidate_k = candidate_k or offset + limit
+    primary_key = list(db_model.__table__.primary_key.columns)[0]
+
+    filter_conditions = [filter_handler.create_filter_clause(filters),
+                         build_partition_condition(db_model, partition_id)]
+    vector_hits = build_vector_search_query(db_model, query_vector, filter_conditions, 0, candidate_k,
+                                            quantization=quantization, oversampling=oversampling, exact=exact,
+                                            return_fields=[primary_key.name]).cte("vector_hits")
+
+    keyword_hits = build_search_query(db_model, search_columns, query_condition, filters, True, filter_handler,
+                                      partition_id=partition_id, return_fields=[primary_key.name],
+                                      ranking=ranking, query_text=query_text).limit(candidate_k).cte("keyword_hits")
+
+    total_weight = vector_weight + keyword_weight
+    vector_weight /= total_weight
+    keyword_weight /= total_weight
+
+    vector_id = vector_hits.c[primary_key.name]
+    keyword_id = keyword_hits.c[primary_key.name]
+    # 只出现在一路中的行，另一路的贡献按 0 计，与 Python 融合中名次取无穷大一致
+    rrf_score = (func.coalesce(vector_weight / cast(k + vector_hits.c.rank_position, Float), 0.0) +
+                 func.coalesce(keyword_weight / cast(k + keyword_hits.c.rank_position, Float), 0.0)).label('rank_score')
+    fused_id = func.coalesce(vector_id, keyword_id).label('fused_id')
+    fused = (select(fused_id, rrf_score)
+             .select_from(vector_hits.join(keyword_hits, vector_id == keyword_id, full=True))
+             .order_by(rrf_score.desc(), fused_id)
+             .offset(offset).limit(limit)
+             .subquery("fused"))
+
+    columns_to_select = db_model.get_search_projection(return_fields)
+    rank_position = (func.row_number().over(order_by=(fused.c.rank_score.desc(), fused.c.fused_id))
+                     + offset).label('rank_position')
+    extra_columns = [literal(search_plan).label('search_plan')] if search_plan else []
+    return (select(*columns_to_select, fused.c.rank_score, rank_position, *extra_columns)
+            .join(fused, fused.c.fused_id == primary_key)
+            .order_by(fused.c.rank_score.desc(), fused.c.fused_id))
@@ -0,0 +1,318 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import ServeConfig
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def _train_ivf(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """球面 k-means，返回聚类中心和每个向量所属的列表。"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)].copy()
+    assignments = np.zeros(len(vectors), dtype=np.int32)
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = np.bincount(assignments, minlength=nlist) == 0
+        sums[empty] = centroids[empty]
+        centroids = _normalize(sums)
+    return centroids, assignments
+
+
+@dataclass(frozen=True)
+class LocalIndexSnapshot:
+    """一个版本目录中的全部数组，整体替换，检索过程中不会读到两个版本混在一起的数据。"""
+    ids: np.ndarray
+    vectors: np.ndarray
+    centroids: Optional[np.ndarray]
+    list_offsets: Optional[np.ndarray]
+    watermark: Optional[str]
+    version: str
+
+
+class LocalVectorIndex:
+    """单个分区在进程内的向量索引镜像。
+
+    向量以归一化后的 float32 矩阵保存在 .npy 文件中，通过 mmap 只读加载，
+    多个 uvicorn worker 共享同一份页缓存。每次同步写入新的版本目录，再原子替换 meta.json，
+    其他 worker 在下一次检索时发现版本变化后重新映射。同步时保留上一个版本目录，
+    刚读到旧 meta.json 的 worker 仍能加载到完整的旧版本。
+    chunk 写入后在分区目录下留一个 stale 标记文件，同一台机器上的所有 worker 都能看到，
+    标记存在期间检索退回 pgvector，直到下一次同步完成。
+    """
+
+    def __init__(self, index_dir: str, partition_id: int, nlist: int = 0, nprobe: int = 8):
+        self.partition_id = partition_id
+        self.root_dir = os.path.join(index_dir, f"partition_{partition_id}")
+        self.meta_path = os.path.join(self.root_dir, "meta.json")
+        self.stale_path = os.path.join(self.root_dir, "stale")
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.snapshot: Optional[LocalIndexSnapshot] = None
+        self._meta_mtime = None
+        self._lock = asyncio.Lock()
+        self._reload_lock = threading.Lock()
+
+    @property
+    def ids(self) -> Optional[np.ndarray]:
+        return self.snapshot.ids if self.snapshot is not None else None
+
+    @property
+    def vectors(self) -> Optional[np.ndarray]:
+        return self.snapshot.vectors if self.snapshot is not None else None
+
+    @property
+    def watermark(self) -> Optional[str]:
+        return self.snapshot.watermark if self.snapshot is not None else None
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.snapshot.version if self.snapshot is not None else None
+
+    async def ready(self) -> bool:
+        """检查 stale 标记并按需重新加载，文件读取和 np.load 放到线程池中，不阻塞事件循环。"""
+        return await asyncio.to_thread(self._check_ready)
+
+    def _check_ready(self) -> bool:
+        if self.is_stale:
+            return False
+        self.maybe_reload()
+        snapshot = self.snapshot
+        return snapshot is not None and len(snapshot.ids) > 0
+
+    @property
+    def is_stale(self) -> bool:
+        return os.path.exists(self.stale_path)
+
+    def mark_stale(self):
+        os.makedirs(self.root_dir, exist_ok=True)
+        with open(self.stale_path, "w", encoding="utf-8") as f:
+            f.write(str(time.time_ns()))
+
+    def _stale_token(self) -> Optional[str]:
+        try:
+            with open(self.stale_path, "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def maybe_reload(self):
+        with self._reload_lock:
+            try:
+                mtime = os.stat(self.meta_path).st_mtime_ns
+            except FileNotFoundError:
+                return
+            if mtime != self._meta_mtime and self.load():
+                self._meta_mtime = mtime
+
+    def load(self) -> bool:
+        """
+        加载 meta.json 指向的版本，成功后整体替换 snapshot。读取期间版本目录被其他 worker 的同步删除时重试一次，
+        仍失败则保留当前 snapshot 并返回 False，下一次检索再尝试。
+        """
+        for attempt in range(2):
+            try:
+                snapshot = self._read_snapshot()
+            except FileNotFoundError:
+                if attempt == 0:
+                    continue
+                logger.warning(f"Local vector index for partition {self.partition_id} changed while loading, "
+                               f"keeping version {self.version}")
+                return False
+            self.snapshot = snapshot
+            logger.info(f"Loaded local vector index for partition {self.partition_id}: "
+                        f"{len(snapshot.ids)} vectors, version {snapshot.version}")
+            return True
+        return False
+
+    def _read_snapshot(self) -> LocalIndexSnapshot:
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        version_dir = os.path.join(self.root_dir, meta["version"])
+        centroids = list_offsets = None
+        if meta.get("nlist"):
+            centroids = np.load(os.path.join(version_dir, "centroids.npy"))
+            list_offsets = np.load(os.path.join(version_dir, "list_offsets.npy"))
+        return LocalIndexSnapshot(ids=np.load(os.path.join(version_dir, "ids.npy"), mmap_mode="r"),
+                                  vectors=np.load(os.path.join(version_dir, "vectors.npy"), mmap_mode="r"),
+                                  centroids=centroids, list_offsets=list_offsets,
+                                  watermark=meta.get("watermark"), version=meta["version"])
+
+    def search(self, query_vector: List[float], limit: int, offset: int = 0,
+               threshold: float | None = None, nprobe: int | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        """返回按余弦相似度降序的 (ids, scores)。"""
+        snapshot = self.snapshot
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        top_k = offset + limit
+
+        if snapshot.centroids is not None:
+            nprobe = min(nprobe or self.nprobe, len(snapshot.centroids))
+            probe_lists = np.argpartition(-(snapshot.centroids @ query), nprobe - 1)[:nprobe]
+            rows = np.concatenate([np.arange(snapshot.list_offsets[i], snapshot.list_offsets[i + 1])
+                                   for i in probe_lists])
+            scores = snapshot.vectors[rows] @ query
+        else:
+            rows = None
+            scores = snapshot.vectors @ query
+
+        top_k = min(top_k, len(scores))
+        if top_k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")][offset:]
+        if threshold is not None:
+            candidates = candidates[scores[candidates] >= threshold]
+
+        positions = rows[candidates] if rows is not None else candidates
+        return np.asarray(snapshot.ids[positions]), np.asarray(scores[candidates])
+
+    async def sync(self, db: AsyncSession, db_model) -> int:
+        """按 update_at 水位增量同步新增、更新和删除的 chunk，返回同步后的向量数量。"""
+        async with self._lock:
+            # 同步期间又有写入时标记会被改写，同步完成后保留标记，等下一次同步
+            stale_token = self._stale_token()
+            await asyncio.to_thread(self.maybe_reload)
+            snapshot = self.snapshot
+            partition_column = db_model.partition_id
+            watermark = datetime.fromisoformat(snapshot.watermark) if snapshot and snapshot.watermark else None
+
+            changed_query = select(db_model.id, db_model.vector, db_model.update_at).where(
+                partition_column == self.partition_id)
+            if watermark is not None:
+                changed_query = changed_query.where(db_model.update_at >= watermark)
+            changed_rows = (await db.execute(changed_query.order_by(db_model.update_at))).all()
+            alive_ids = np.asarray((await db.execute(
+                select(db_model.id).where(partition_column == self.partition_id))).scalars().all(), dtype=np.int64)
+
+            changed_ids = np.asarray([row.id for row in changed_rows], dtype=np.int64)
+            if snapshot is not None and len(snapshot.ids):
+                keep = np.isin(snapshot.ids, alive_ids) & ~np.isin(snapshot.ids, changed_ids)
+                old_ids, old_vectors = np.asarray(snapshot.ids)[keep], np.asarray(snapshot.vectors)[keep]
+            else:
+                old_ids = np.empty(0, dtype=np.int64)
+                old_vectors = None
+
+            if changed_rows:
+                changed_vectors = _normalize(np.asarray([row.vector for row in changed_rows], dtype=np.float32))
+                vectors = changed_vectors if old_vectors is None or not len(old_vectors) \
+                    else np.vstack([old_vectors, changed_vectors])
+                ids = np.concatenate([old_ids, changed_ids])
+                new_watermark = changed_rows[-1].update_at.isoformat()
+            else:
+                if old_vectors is None:
+                    logger.info(f"No chunks to index for partition {self.partition_id}")
+                    self._clear_stale(stale_token)
+                    return 0
+                ids, vectors = old_ids, old_vectors
+                new_watermark = snapshot.watermark
+
+            await asyncio.to_thread(self._write, ids, vectors, new_watermark)
+            self._clear_stale(stale_token)
+            await asyncio.to_thread(self.maybe_reload)
+            logger.info(f"Synced local vector index for partition {self.partition_id}: "
+                        f"{len(changed_rows)} changed, {len(ids)} total")
+            return len(ids)
+
+    def _clear_stale(self, stale_token: Optional[str]):
+        if stale_token is not None and self._stale_token() == stale_token:
+            os.remove(self.stale_path)
+
+    def _write(self, ids: np.ndarray, vectors: np.ndarray, watermark: Optional[str]):
+        version = f"v{time.time_ns()}"
+        version_dir = os.path.join(self.root_dir, version)
+        os.makedirs(version_dir, exist_ok=True)
+
+        nlist = self.nlist if self.nlist and len(ids) >= self.nlist * 39 else 0
+        if nlist:
+            centroids, assignments = _train_ivf(vectors, nlist)
+            order = np.argsort(assignments, kind="stable")
+            ids, vectors = ids[order], vectors[order]
+            list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=nlist))])
+            np.save(os.path.join(version_dir, "centroids.npy"), centroids)
+            np.save(os.path.join(version_dir, "list_offsets.npy"), list_offsets)
+
+        np.save(os.path.join(version_dir, "ids.npy"), ids.astype(np.int64, copy=False))
+        np.save(os.path.join(version_dir, "vectors.npy"), vectors.astype(np.float32, copy=False))
+
+        previous_version = None
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                previous_version = json.load(f)["version"]
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+
+        tmp_meta_path = self.meta_path + ".tmp"
+        with open(tmp_meta_path, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "watermark": watermark, "nlist": nlist, "count": int(len(ids))}, f)
+        os.replace(tmp_meta_path, self.meta_path)
+
+        # 保留被替换的上一个版本，供刚读到旧 meta.json 的 worker 加载；
+        # 更早的版本文件删除后，已经 mmap 的 worker 仍可继续读取，直到重新加载
+        for name in os.listdir(self.root_dir):
+            if name.startswith("v") and name not in (version, previous_version):
+                shutil.rmtree(os.path.join(self.root_dir, name), ignore_errors=True)
+
+
+class LocalVectorIndexRegistry:
+    """只为配置的热点分区维护进程内索引。"""
+
+    def __init__(self, index_dir: str, partition_ids: List[int], nlist: int = 0, nprobe: int = 8):
+        self.index_dir = index_dir
+        self.indexes: Dict[int, LocalVectorIndex] = {
+            partition_id: LocalVectorIndex(index_dir, partition_id, nlist=nlist, nprobe=nprobe)
+            for partition_id in partition_ids
+        }
+
+    async def get(self, partition_id: int | None) -> Optional[LocalVectorIndex]:
+        index = self.indexes.get(partition_id)
+        if index is not None and await index.ready():
+            return index
+        return None
+
+    def mark_stale(self, partition_ids) -> None:
+        """chunk 新增、更新或删除后调用，未配置进程内索引的分区忽略。"""
+        for partition_id in set(partition_ids):
+            index = self.indexes.get(partition_id)
+            if index is not None:
+                index.mark_stale()
+
+    async def sync(self, db: AsyncSession, db_model, partition_id: int) -> int:
+        index = self.indexes.get(partition_id)
+        if index is None:
+            return 0
+        return await index.sync(db, db_model)
+
+
+local_vector_index_registry: LocalVectorIndexRegistry | None = None
+
+
+def get_local_vector_index_registry() -> LocalVectorIndexRegistry:
+    global local_vector_index_registry
+    if local_vector_index_registry is None:
+        local_vector_index_registry = LocalVectorIndexRegistry(
+            index_dir=ServeConfig.local_vector_index_dir,
+            partition_ids=ServeConfig.local_vector_index_partitions,
+            nlist=ServeConfig.local_vector_index_nlist,
+            nprobe=ServeConfig.local_vector_index_nprobe,
+        )
+    return local_vector_index_registry
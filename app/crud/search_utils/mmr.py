@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+from typing import List
+
+import numpy as np
+
+
+def maximal_marginal_relevance(query_vector, candidate_vectors, lambda_mult: float = 0.5, k: int = 20) -> List[int]:
+    """
+    最大边际相关性（MMR）选择，返回选中候选的下标。
+
+    相似度矩阵一次算出，每轮只用向量化的 np.maximum 更新“与已选集合的最大相似度”，
+    避免逐对的 Python 循环。lambda_mult 越大越偏向相关性，越小越偏向多样性。
+    """
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    if candidates.ndim != 2 or len(candidates) == 0 or k <= 0:
+        return []
+    query = np.asarray(query_vector, dtype=np.float32)
+
+    norms = np.linalg.norm(candidates, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    candidates = candidates / norms
+    query = query / (np.linalg.norm(query) or 1.0)
+
+    query_similarity = candidates @ query
+    similarity_matrix = candidates @ candidates.T
+
+    k = min(k, len(candidates))
+    selected = [int(np.argmax(query_similarity))]
+    max_similarity = similarity_matrix[selected[0]].copy()
+    available = np.ones(len(candidates), dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < k:
+        scores = lambda_mult * query_similarity - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity_matrix[best], out=max_similarity)
+
+    return selected
+
+
+def row_to_namespace(row, exclude: set = frozenset(), **updates) -> SimpleNamespace:
+    """把查询结果行转成可修改的对象，FastAPI 按属性序列化时与 Row 一致。"""
+    mapping = row._mapping if hasattr(row, "_mapping") else vars(row)
+    values = {key: value for key, value in mapping.items() if key not in exclude}
+    values.update(updates)
+    return SimpleNamespace(**values)
+
+
+def mmr_rerank(rows: list, query_vector, limit: int, lambda_mult: float = 0.5, offset: int = 0,
+               keep_vector: bool = False) -> list:
+    """对带 vector 列的候选行做 MMR，重写 rank_position，默认去掉 vector 列再返回。"""
+    rows = [row for row in rows if getattr(row, "vector", None) is not None]
+    if not rows:
+        return []
+    selected = maximal_marginal_relevance(query_vector, [row.vector for row in rows], lambda_mult, limit)
+    exclude = set() if keep_vector else {"vector"}
+    return [row_to_namespace(rows[index], exclude, rank_position=position)
+            for position, index in enumerate(selected, start=offset + 1)]
@@ -0,0 +1,8 @@
+from sqlalchemy import bindparam, Integer
+
+
+def build_partition_condition(db_model, partition_id: int | None):
+    """分区过滤条件。partition_id 以字面量渲染，规划器才能匹配 WHERE partition_id = N 的分区局部索引。"""
+    if partition_id is None:
+        return None
+    return db_model.partition_id == bindparam(None, partition_id, type_=Integer, literal_execute=True)
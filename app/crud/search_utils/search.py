@@ -4,13 +4,22 @@ from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import DeclarativeBase
 
-from app.crud.search_utils.execute_query_utils import execute_query
+from app.crud.search_utils.execute_query_utils import execute_query, group_rows_by_query
 from app.crud.filter_utils.filters import FilterHandler
-from app.crud.search_utils.search_utils import build_search_query
+from app.crud.search_utils.search_utils import build_search_query, build_batch_search_query
 
 T = TypeVar('T', bound=BaseModel)
 
 
+def default_search_columns(filter_handler: FilterHandler) -> List[str]:
+    """未指定检索列时优先使用模型声明的可检索列，避免把所有列拼接后逐行分词。"""
+    declared_columns = getattr(filter_handler.db_model, "__search_columns__", None)
+    if declared_columns:
+        return list(declared_columns)
+    return [col.name for col in filter_handler.db_model.__table__.columns if
+            col.name not in filter_handler.disallowed_fields and col.name != "search_vector"]
+
+
 def sanitize_keywords(keywords: List[str]) -> List[str]:
     return [keyword.strip() for keyword in keywords if keyword.strip()]
 
@@ -25,14 +34,16 @@ async def search(db: AsyncSession, model: BaseModel, filter_handler: FilterHandl
     sort_by_rank = model_dict.pop("sort_by_rank", True)
     offset = model_dict.pop("offset", 0)
     limit = model_dict.pop("limit", 20)
+    partition_id = model_dict.pop("partition_id", None)
+    return_fields = model_dict.pop("return_fields", None)
+    ranking = model_dict.pop("ranking", None) or "ts_rank"
 
     sanitized_keywords = sanitize_keywords(keywords)
     if not sanitized_keywords:
         return []
 
     if not search_columns:
-        search_columns = [col.name for col in filter_handler.db_model.__table__.columns if
-                          col.name not in filter_handler.disallowed_fields]
+        search_columns = default_search_columns(filter_handler)
 
     if not search_columns:
         return []
@@ -40,7 +51,58 @@ async def search(db: AsyncSession, model: BaseModel, filter_handler: FilterHandl
     query_condition = ' & '.join(sanitized_keywords)
 
     query = build_search_query(filter_handler.db_model, search_columns, query_condition, filters, sort_by_rank,
-                               filter_handler)
+                               filter_handler, partition_id=partition_id, return_fields=return_fields,
+                               ranking=ranking, query_text=' '.join(sanitized_keywords))
     query = query.offset(offset).limit(limit)
 
     return await execute_query(db, query)
+
+
+async def batch_search(db: AsyncSession, model: BaseModel, filter_handler: FilterHandler) -> List[list]:
+    model_dict = model.model_dump(exclude_unset=True)
+    filters = model_dict.pop("filters", {})
+    keywords_list = model_dict.pop("keywords_list", [])
+    search_columns = model_dict.pop("search_columns", [])
+    sort_by_rank = model_dict.pop("sort_by_rank", True)
+    offset = model_dict.pop("offset", 0)
+    limit = model_dict.pop("limit", 20)
+    partition_id = model_dict.pop("partition_id", None)
+    return_fields = model_dict.pop("return_fields", None)
+    ranking = model_dict.pop("ranking", None) or "ts_rank"
+
+    results = [[] for _ in keywords_list]
+
+    if not search_columns:
+        search_columns = default_search_columns(filter_handler)
+
+    # 关键词为空的查询不进 SQL，结果保持为空列表
+    query_positions = []
+    query_conditions = []
+    query_texts = []
+    for position, keywords in enumerate(keywords_list):
+        sanitized_keywords = sanitize_keywords(keywords)
+        if sanitized_keywords:
+            query_positions.append(position)
+            query_conditions.append(' & '.join(sanitized_keywords))
+            query_texts.append(' '.join(sanitized_keywords))
+
+    if not search_columns or not query_conditions:
+        return results
+
+    if sort_by_rank and ranking == "bm25":
+        # BM25 的词项 idf 按查询在 CTE 中计算一次，不能引用 LATERAL 外层的查询，逐条执行
+        for position, query_condition, query_text in zip(query_positions, query_conditions, query_texts):
+            query = build_search_query(filter_handler.db_model, search_columns, query_condition, filters,
+                                       sort_by_rank, filter_handler, partition_id=partition_id,
+                                       return_fields=return_fields, ranking=ranking, query_text=query_text)
+            results[position] = await execute_query(db, query.offset(offset).limit(limit))
+        return results
+
+    query = build_batch_search_query(filter_handler.db_model, search_columns, query_conditions, filters,
+                                     sort_by_rank, filter_handler, offset, limit, partition_id=partition_id,
+                                     return_fields=return_fields)
+    grouped = group_rows_by_query(await execute_query(db, query), len(query_conditions))
+    for position, rows in zip(query_positions, grouped):
+        results[position] = rows
+
+    return results
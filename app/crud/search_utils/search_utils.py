@@ -1,27 +1,104 @@
 from typing import List
 
-from sqlalchemy import func, select
+from sqlalchemy import func, select, literal_column, String, Text, cast, true
+from sqlalchemy.dialects.postgresql import ARRAY
 
 from app.crud.filter_utils.filters import FilterHandler
+from app.crud.search_utils.bm25 import build_bm25_score
+from app.crud.search_utils.partition_utils import build_partition_condition
+
+# 分词配置以常量渲染，避免作为绑定参数时索引表达式无法匹配
+JIEBA_CONFIG = literal_column("'jiebacfg'::regconfig")
+
+
+def uses_stored_search_vector(db_model, search_columns: List[str]) -> bool:
+    declared_columns = getattr(db_model, "__search_columns__", None)
+    return bool(declared_columns) and set(search_columns) == set(declared_columns)
+
+
+def build_search_vector(db_model, search_columns: List[str]):
+    # 检索列与模型声明的一致时直接用带 GIN 索引的生成列，不再逐行分词
+    if uses_stored_search_vector(db_model, search_columns):
+        return db_model.search_vector
+
+    columns = [getattr(db_model, col) for col in search_columns]
+    # 单个文本列时直接 to_tsvector，表达式与 GIN 索引一致才能走索引
+    if len(columns) == 1 and isinstance(columns[0].type, (String, Text)):
+        return func.to_tsvector(JIEBA_CONFIG, columns[0])
+    return func.to_tsvector(JIEBA_CONFIG, func.concat_ws(' ', *columns))
 
 
 def build_search_query(db_model, search_columns: List[str], query_condition: str, filters: dict,
-                       sort_by_rank: bool, filter_handler: FilterHandler):
-    search_vector = func.to_tsvector('jiebacfg',
-                                     func.concat_ws(' ', *[getattr(db_model, col) for col in search_columns]))
-    search_query = func.to_tsquery('jiebacfg', query_condition)
+                       sort_by_rank: bool, filter_handler: FilterHandler, partition_id: int | None = None,
+                       return_fields: List[str] | None = None, ranking: str = "ts_rank", query_text: str = ""):
+    search_vector = build_search_vector(db_model, search_columns)
+    search_query = func.to_tsquery(JIEBA_CONFIG, query_condition)
     search_condition = search_vector.op('@@')(search_query)
+    columns_to_select = db_model.get_search_projection(return_fields)
+
+    # BM25 依赖按 search_vector 维护的词项统计，检索列与声明不一致时退回 ts_rank
+    use_bm25 = ranking == "bm25" and getattr(db_model, "__bm25_stats__", False) and \
+        uses_stored_search_vector(db_model, search_columns)
+
+    if sort_by_rank:
+        if use_bm25:
+            query_vector = func.to_tsvector(JIEBA_CONFIG, query_text)
+            rank_score = build_bm25_score(search_vector, query_vector, partition_id).label('rank_score')
+        else:
+            rank_score = func.ts_rank(search_vector, search_query).label('rank_score')
+        rank_position = func.row_number().over(order_by=rank_score.desc()).label('rank_position')
+        query = select(*columns_to_select, rank_position, rank_score).order_by(rank_score.desc())
+    else:
+        query = select(*columns_to_select)
 
-    query = select(db_model).where(search_condition)
+    query = query.where(search_condition)
 
     filter_clause = filter_handler.create_filter_clause(filters)
     query = query.where(filter_clause)
 
+    partition_condition = build_partition_condition(db_model, partition_id)
+    if partition_condition is not None:
+        query = query.where(partition_condition)
+
+    if sort_by_rank and use_bm25:
+        # 得分是相关子查询，先在内层算一次，外层再排序编号，避免 row_number 中重复计算
+        scored = query.with_only_columns(*columns_to_select, rank_score).order_by(None).subquery("scored")
+        rank_position = func.row_number().over(order_by=scored.c.rank_score.desc()).label('rank_position')
+        query = select(*[scored.c[col.name] for col in columns_to_select], rank_position,
+                       scored.c.rank_score).order_by(scored.c.rank_score.desc())
+
+    return query
+
+
+def build_batch_search_query(db_model, search_columns: List[str], query_conditions: List[str], filters: dict,
+                             sort_by_rank: bool, filter_handler: FilterHandler, offset: int, limit: int,
+                             partition_id: int | None = None, return_fields: List[str] | None = None):
+    """多组关键词一条 SQL：unnest 展开 tsquery 文本，每组 LATERAL 一次全文检索。"""
+    queries = func.unnest(cast(query_conditions, ARRAY(Text))).table_valued(
+        "query_condition", with_ordinality="query_index").render_derived(name="queries")
+
+    search_vector = build_search_vector(db_model, search_columns)
+    search_query = func.to_tsquery(JIEBA_CONFIG, queries.c.query_condition)
+    rank_score = func.ts_rank(search_vector, search_query)
+    columns_to_select = db_model.get_search_projection(return_fields)
+
+    hits = select(*columns_to_select, rank_score.label('rank_score')).where(
+        search_vector.op('@@')(search_query))
+    hits = hits.where(filter_handler.create_filter_clause(filters))
+    partition_condition = build_partition_condition(db_model, partition_id)
+    if partition_condition is not None:
+        hits = hits.where(partition_condition)
     if sort_by_rank:
-        rank_score = func.ts_rank(search_vector, search_query).label('rank_score')
-        rank_position = func.row_number().over(order_by=rank_score.desc()).label('rank_position')
-        query = query.add_columns(*db_model.__table__.columns, rank_position, rank_score).order_by(rank_score.desc())
-    else:
-        query = query.add_columns(*db_model.__table__.columns)
+        hits = hits.order_by(rank_score.desc())
+    hits = hits.offset(offset).limit(limit).lateral("hits")
 
-    return query
\ No newline at end of file
+    order_by = hits.c.rank_score.desc() if sort_by_rank else None
+    rank_position = (func.row_number().over(partition_by=queries.c.query_index, order_by=order_by)
+                     + offset).label('rank_position')
+    query = (select(queries.c.query_index, *[hits.c[col.name] for col in columns_to_select],
+                    hits.c.rank_score, rank_position)
+             .select_from(queries)
+             .join(hits, true()))
+    if sort_by_rank:
+        return query.order_by(queries.c.query_index, hits.c.rank_score.desc())
+    return query.order_by(queries.c.query_index)
@@ -1,11 +1,27 @@
+import asyncio
 from typing import List, Type
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import DeclarativeBase
 
-from app.crud.search_utils.execute_query_utils import execute_query
+from app.crud.search_utils.coarse_to_fine import search_top_documents
+from app.crud.search_utils.execute_query_utils import execute_query, group_rows_by_query
+from app.crud.search_utils.local_vector_index import get_local_vector_index_registry
+from app.crud.search_utils.mmr import mmr_rerank
+from app.crud.search_utils.partition_utils import build_partition_condition
 from app.crud.filter_utils.filters import FilterHandler
-from app.crud.search_utils.vector_search_utils import build_vector_search_query
+from app.crud.search_utils.vector_search_planner import (plan_vector_search, apply_vector_search_plan,
+                                                          VectorSearchPlan)
+from app.crud.search_utils.vector_search_utils import (build_vector_search_query, build_hydrate_query,
+                                                        build_batch_vector_search_query, build_batch_hydrate_query)
+from app.db.db_models import Document
+from config import ServeConfig
+
+
+def resolve_quantization(quantization: str | None) -> str | None:
+    """请求未指定时使用 VECTOR_STORAGE_MODE，full 表示直接走全精度索引。"""
+    quantization = quantization or ServeConfig.vector_storage_mode
+    return None if quantization == "full" else quantization
 
 
 async def vector_search(db: AsyncSession,
@@ -18,9 +34,122 @@ async def vector_search(db: AsyncSession,
     limit = model_dict.pop('limit', 20)
     filters = model_dict.pop('filters', {})
     threshold = model_dict.pop('threshold', None)
+    quantization = resolve_quantization(model_dict.pop('quantization', None))
+    oversampling = model_dict.pop('oversampling', None) or ServeConfig.vector_oversampling
+    partition_id = model_dict.pop('partition_id', None)
+    mode = model_dict.pop('mode', None)
+    ef_search = model_dict.pop('ef_search', None)
+    probes = model_dict.pop('probes', None)
+    return_fields = model_dict.pop('return_fields', None)
+    diversify = model_dict.pop('diversify', False)
+    mmr_lambda = model_dict.pop('mmr_lambda', 0.5)
+    fetch_k = model_dict.pop('fetch_k', None)
+    coarse_documents = model_dict.pop('coarse_documents', None)
+
+    # 多样化时先多取 fetch_k 个候选并带上向量，再用 MMR 选出 limit 个
+    search_limit, search_fields = limit, return_fields
+    if diversify:
+        search_limit = max(fetch_k or limit * 4, limit)
+        search_fields = mmr_fields(filter_handler.db_model, return_fields)
+
+    # 由粗到细：先在文档向量上取前 coarse_documents 个文档，再只在这些文档的 chunk 中检索
+    document_condition = None
+    if coarse_documents and filter_handler.db_model.__tablename__ == 'chunks':
+        document_ids = await search_top_documents(db, query_vector, coarse_documents, partition_id,
+                                                  quantization=quantization, oversampling=oversampling)
+        if not document_ids:
+            return []
+        document_condition = filter_handler.db_model.document_id.in_(document_ids)
+
+    # 热点分区且没有额外过滤条件时，直接在进程内索引上检索，只回库取一次内容
+    local_index = await get_local_vector_index_registry().get(partition_id) \
+        if filter_handler.db_model.__tablename__ == 'chunks' and not filters and document_condition is None else None
+    if local_index is not None:
+        ids, scores = await asyncio.to_thread(local_index.search, query_vector, search_limit, offset, threshold)
+        if len(ids) == 0:
+            return []
+        query = build_hydrate_query(filter_handler.db_model, ids.tolist(), scores.tolist(), offset,
+                                    search_plan="local", return_fields=search_fields)
+    else:
+        filter_clause = filter_handler.create_filter_clause(filters)
+        filter_conditions = [filter_clause, build_partition_condition(filter_handler.db_model, partition_id),
+                             document_condition]
+
+        # 分区条件由分区局部索引覆盖，只按用户过滤条件和粗排选出的文档估计选择度，
+        # 候选文档很少时规划器会改为在这些文档的 chunk 上精确扫描
+        top_k = (offset + search_limit) * (max(oversampling, 1) if quantization else 1)
+        selectivity_conditions = ([filter_clause] if filters else []) + \
+            ([document_condition] if document_condition is not None else [])
+        plan = await plan_vector_search(db, filter_handler.db_model, selectivity_conditions, mode,
+                                        top_k, ef_search=ef_search, probes=probes)
+        await apply_vector_search_plan(db, plan)
+        query = build_vector_search_query(filter_handler.db_model, query_vector, filter_conditions, offset,
+                                          search_limit, threshold, quantization=quantization,
+                                          oversampling=oversampling, exact=plan.mode == "exact",
+                                          search_plan=plan.label, return_fields=search_fields)
+
+    results = await execute_query(db, query)
+    if diversify:
+        return mmr_rerank(results, query_vector, limit, mmr_lambda, offset,
+                          keep_vector=bool(return_fields and 'vector' in return_fields))
+    return results
+
+
+def mmr_fields(db_model, return_fields: List[str] | None) -> List[str]:
+    fields = return_fields or [col.name for col in db_model.get_search_projection()]
+    return list(dict.fromkeys(fields + ['vector']))
+
+
+async def batch_vector_search(db: AsyncSession,
+                              model: BaseModel,
+                              filter_handler: FilterHandler) -> List[list]:
+    """
+    所有查询共用过滤条件，检索方式只规划一次；量化、mode / ef_search / probes、coarse_documents 与单条检索含义一致。
+    热点分区且没有过滤条件时在进程内索引上逐条检索，再一条 SQL 取回所有查询的内容。
+    """
+    model_dict = model.model_dump(exclude_unset=True)
+    query_vectors = model_dict.pop('vectors')
+    offset = model_dict.pop('offset', 0)
+    limit = model_dict.pop('limit', 20)
+    filters = model_dict.pop('filters', {})
+    partition_id = model_dict.pop('partition_id', None)
+    return_fields = model_dict.pop('return_fields', None)
+    quantization = resolve_quantization(model_dict.pop('quantization', None))
+    oversampling = model_dict.pop('oversampling', None) or ServeConfig.vector_oversampling
+    mode = model_dict.pop('mode', None)
+    ef_search = model_dict.pop('ef_search', None)
+    probes = model_dict.pop('probes', None)
+    coarse_documents = model_dict.pop('coarse_documents', None)
+
+    if not query_vectors:
+        return []
 
-    filter_conditions = [filter_handler.create_filter_clause(filters)]
-    query = build_vector_search_query(filter_handler.db_model, query_vector, filter_conditions, offset, limit,
-                                      threshold)
+    db_model = filter_handler.db_model
+    coarse_documents = coarse_documents if db_model.__tablename__ == 'chunks' else None
+    local_index = await get_local_vector_index_registry().get(partition_id) \
+        if db_model.__tablename__ == 'chunks' and not filters and not coarse_documents else None
+    if local_index is not None:
+        hits_list = await asyncio.gather(*[asyncio.to_thread(local_index.search, query_vector, limit, offset)
+                                           for query_vector in query_vectors])
+        hits_list = [(ids.tolist(), scores.tolist()) for ids, scores in hits_list]
+        query = build_batch_hydrate_query(db_model, hits_list, offset, search_plan="local",
+                                          return_fields=return_fields)
+    else:
+        filter_clause = filter_handler.create_filter_clause(filters)
+        filter_conditions = [filter_clause, build_partition_condition(db_model, partition_id)]
+        top_k = (offset + limit) * (max(oversampling, 1) if quantization else 1)
+        # 由粗到细时各查询的候选文档不同，无法提前估计选择度；候选文档很少，直接在它们的 chunk 上精确扫描
+        if coarse_documents:
+            plan = VectorSearchPlan(mode="exact")
+        else:
+            plan = await plan_vector_search(db, db_model, [filter_clause] if filters else [], mode,
+                                            top_k, ef_search=ef_search, probes=probes)
+        await apply_vector_search_plan(db, plan)
+        document_conditions = [Document.vector.isnot(None), build_partition_condition(Document, partition_id)]
+        query = build_batch_vector_search_query(db_model, query_vectors, filter_conditions, offset, limit,
+                                                quantization=quantization, oversampling=oversampling,
+                                                exact=plan.mode == "exact", search_plan=plan.label,
+                                                document_model=Document, document_conditions=document_conditions,
+                                                coarse_documents=coarse_documents, return_fields=return_fields)
 
-    return await execute_query(db, query)
+    return group_rows_by_query(await execute_query(db, query), len(query_vectors))
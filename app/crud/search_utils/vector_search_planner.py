@@ -0,0 +1,144 @@
+import json
+import logging
+import math
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import select, and_, text, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from config import ServeConfig
+
+logger = logging.getLogger(__name__)
+
+# pgvector 允许的 hnsw.ef_search 上限
+MAX_EF_SEARCH = 1000
+RELTUPLES_TTL = 300
+
+_reltuples_cache: dict = {}
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+@dataclass
+class VectorSearchPlan:
+    mode: str
+    ef_search: int | None = None
+    probes: int | None = None
+    iterative_scan: str | None = None
+    estimated_rows: int | None = None
+
+    @property
+    def label(self) -> str:
+        parts = [self.mode]
+        if self.ef_search is not None:
+            parts.append(f"ef_search={self.ef_search}")
+        if self.probes is not None:
+            parts.append(f"probes={self.probes}")
+        if self.estimated_rows is not None:
+            parts.append(f"rows≈{self.estimated_rows}")
+        return " ".join(parts)
+
+
+async def estimate_table_rows(db: AsyncSession, table_name: str) -> float:
+    """pg_class.reltuples 的缓存值，未 ANALYZE 时为 -1。"""
+    cached = _reltuples_cache.get(table_name)
+    if cached and time.time() - cached[1] < RELTUPLES_TTL:
+        return cached[0]
+    result = await db.execute(text("SELECT reltuples FROM pg_class WHERE oid = CAST(:table_name AS regclass)"),
+                              {"table_name": table_name})
+    reltuples = float(result.scalar() or -1)
+    _reltuples_cache[table_name] = (reltuples, time.time())
+    return reltuples
+
+
+async def estimate_filtered_rows(db: AsyncSession, db_model, filter_conditions: list) -> int:
+    """用规划器对过滤条件的行数估计，只规划不执行。"""
+    query = select(literal_column("1")).select_from(db_model).where(and_(*filter_conditions))
+    result = await db.execute(Explain(query))
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def plan_vector_search(db: AsyncSession, db_model, filter_conditions: list, mode: str | None,
+                             top_k: int, ef_search: int | None = None, probes: int | None = None) -> VectorSearchPlan:
+    """
+    auto 模式下按过滤后的估计行数选择检索方式：
+    行数不超过 VECTOR_EXACT_SCAN_ROWS 时精确扫描；选择度低于 VECTOR_ITERATIVE_SELECTIVITY 时 ANN 迭代扫描；
+    其余情况 ANN，并按选择度放大 ef_search / probes，保证后过滤后仍有足够的行。
+    """
+    mode = mode or "auto"
+    filter_conditions = [condition for condition in filter_conditions if condition is not None]
+
+    estimated_rows = None
+    selectivity = 1.0
+    needs_estimate = mode == "auto" or (mode == "ann" and ef_search is None and probes is None)
+    if filter_conditions and needs_estimate:
+        estimated_rows = await estimate_filtered_rows(db, db_model, filter_conditions)
+        total_rows = await estimate_table_rows(db, db_model.__tablename__)
+        if total_rows > 0:
+            selectivity = min(max(estimated_rows / total_rows, 1e-6), 1.0)
+
+    if mode == "auto":
+        if estimated_rows is not None and estimated_rows <= ServeConfig.vector_exact_scan_rows:
+            mode = "exact"
+        elif selectivity < ServeConfig.vector_iterative_selectivity and ServeConfig.vector_iterative_scan != "off":
+            mode = "iterative"
+        else:
+            mode = "ann"
+
+    if mode == "exact":
+        return VectorSearchPlan(mode=mode, estimated_rows=estimated_rows)
+
+    if ef_search is None:
+        ef_search = max(ServeConfig.hnsw_ef_search, top_k)
+        if mode == "ann":
+            ef_search = math.ceil(ef_search / selectivity)
+    if probes is None:
+        probes = ServeConfig.ivfflat_probes
+        if mode == "ann":
+            probes = math.ceil(probes / selectivity)
+
+    iterative_scan = ServeConfig.vector_iterative_scan if mode == "iterative" else None
+    return VectorSearchPlan(mode=mode, ef_search=min(ef_search, MAX_EF_SEARCH),
+                            probes=min(probes, ServeConfig.ivfflat_lists), iterative_scan=iterative_scan,
+                            estimated_rows=estimated_rows)
+
+
+async def apply_vector_search_plan(db: AsyncSession, plan: VectorSearchPlan):
+    """
+    set_config(..., true) 等价于 SET LOCAL，在当前事务结束前一直有效。同一会话中可能先后执行多次检索
+    （批量混合检索、RAG 子查询等），所以每次都下发计划控制的全部参数，包括默认值和关闭迭代扫描，
+    不让后一次检索沿用前一次放大的 ef_search / probes。
+    VECTOR_ITERATIVE_SCAN=off 表示 pgvector 不支持迭代扫描（0.8 以前），此时不设置 iterative_scan 参数。
+    """
+    settings = {
+        "hnsw.ef_search": plan.ef_search if plan.ef_search is not None else ServeConfig.hnsw_ef_search,
+        "ivfflat.probes": plan.probes if plan.probes is not None else ServeConfig.ivfflat_probes,
+    }
+    if ServeConfig.vector_iterative_scan != "off":
+        settings["hnsw.iterative_scan"] = plan.iterative_scan or "off"
+        settings["ivfflat.iterative_scan"] = "relaxed_order" if plan.iterative_scan else "off"
+    logger.debug(f"Vector search plan: {plan.label}")
+
+    params = {}
+    calls = []
+    for i, (name, value) in enumerate(settings.items()):
+        calls.append(f"set_config(:name_{i}, :value_{i}, true)")
+        params[f"name_{i}"] = name
+        params[f"value_{i}"] = str(value)
+    await db.execute(text(f"SELECT {', '.join(calls)}"), params)
@@ -1,21 +1,162 @@
-from sqlalchemy import func, select, and_, Float
+from typing import List
+
+from pgvector.sqlalchemy import VECTOR, HALFVEC, BIT
+from sqlalchemy import func, select, and_, cast, literal, Float, Integer, Text, true
+from sqlalchemy.dialects.postgresql import ARRAY
+
+
+def build_quantized_distance(vector_column, query_vector, quantization: str, dim: int | None = None):
+    """
+    与量化索引表达式一致的距离，保证 ORDER BY 能命中 halfvec / bit 索引。
+    query_vector 为浮点数列表；批量检索时为已转换为 vector 的列表达式，此时需给出 dim。
+    """
+    if dim is None:
+        dim = len(query_vector)
+        query_literal = cast(query_vector, VECTOR(dim))
+    else:
+        query_literal = query_vector
+    if quantization == "halfvec":
+        return cast(vector_column, HALFVEC(dim)).op('<=>', return_type=Float)(cast(query_literal, HALFVEC(dim)))
+    if quantization == "binary":
+        return cast(func.binary_quantize(vector_column), BIT(dim)).op('<~>', return_type=Float)(
+            cast(func.binary_quantize(query_literal), BIT(dim)))
+    raise ValueError(f"不支持的量化方式: {quantization}")
 
 
 def build_vector_search_query(db_model, query_vector,
                               filter_conditions: list, offset: int,
-                              limit: int, threshold: float = None):
-    columns_to_select = [col for col in db_model.__table__.columns if col.name != 'vector']
-    query = select(db_model).add_columns(*columns_to_select)
+                              limit: int, threshold: float = None,
+                              quantization: str | None = None, oversampling: int = 1,
+                              exact: bool = False, search_plan: str | None = None,
+                              return_fields: List[str] | None = None):
+    columns_to_select = db_model.get_search_projection(return_fields)
+    distance = db_model.vector.op('<=>', return_type=Float)(query_vector)
+    # 精确扫描时按索引无法匹配的表达式排序，规划器只能顺序扫描过滤后的行
+    order_distance = distance + 0 if exact else distance
 
+    # 直接 ORDER BY vector <=> :q LIMIT k，规划器才能走 HNSW / IVFFlat 索引
+    query = select(*columns_to_select, distance.label('distance'))
+
+    filter_conditions = [condition for condition in filter_conditions if condition is not None]
     if filter_conditions:
         query = query.where(and_(*filter_conditions))
 
-    similarity_score = (1 - db_model.vector.op('<=>', return_type=Float)(query_vector)).label('rank_score')
-    rank_position = func.row_number().over(order_by=similarity_score.desc()).label('rank_position')
-
-    query = query.add_columns(similarity_score, rank_position).order_by(rank_position).offset(offset).limit(limit)
+    if quantization and not exact:
+        # 先在量化索引上多取 oversampling 倍候选，再用全精度向量重新打分
+        primary_key = list(db_model.__table__.primary_key.columns)[0]
+        coarse_distance = build_quantized_distance(db_model.vector, query_vector, quantization)
+        coarse_query = select(primary_key.label('candidate_id'))
+        if filter_conditions:
+            coarse_query = coarse_query.where(and_(*filter_conditions))
+        coarse_candidates = coarse_query.order_by(coarse_distance).limit(
+            (offset + limit) * max(oversampling, 1)).subquery()
+        query = query.join(coarse_candidates, coarse_candidates.c.candidate_id == primary_key)
 
     if threshold is not None:
-        query = query.where(similarity_score >= threshold)
+        query = query.where(distance <= 1 - threshold)
+
+    candidates = query.order_by(order_distance).offset(offset).limit(limit).subquery()
+
+    # 排名在取回的 k 行上计算，不再对全表开窗
+    similarity_score = (1 - candidates.c.distance).label('rank_score')
+    rank_position = (func.row_number().over(order_by=candidates.c.distance) + offset).label('rank_position')
+
+    extra_columns = [literal(search_plan).label('search_plan')] if search_plan else []
+    return select(*[candidates.c[col.name] for col in columns_to_select],
+                  similarity_score, rank_position, *extra_columns).order_by(candidates.c.distance)
+
+
+def build_hydrate_query(db_model, ids: list, scores: list, offset: int = 0, search_plan: str | None = None,
+                        return_fields: List[str] | None = None):
+    """按进程内索引返回的 (id, score) 一次性取回 chunk 行，保持索引给出的顺序。"""
+    columns_to_select = db_model.get_search_projection(return_fields)
+    primary_key = list(db_model.__table__.primary_key.columns)[0]
+    hits = func.unnest(cast(ids, ARRAY(Integer)), cast(scores, ARRAY(Float))).table_valued(
+        "hit_id", "rank_score", with_ordinality="ordinality").render_derived()
+
+    return (select(*columns_to_select, hits.c.rank_score.label('rank_score'),
+                   (hits.c.ordinality + offset).label('rank_position'),
+                   *([literal(search_plan).label('search_plan')] if search_plan else []))
+            .join(hits, hits.c.hit_id == primary_key)
+            .order_by(hits.c.ordinality))
+
+
+def build_batch_hydrate_query(db_model, hits_list: List[tuple], offset: int = 0, search_plan: str | None = None,
+                              return_fields: List[str] | None = None):
+    """批量检索在进程内索引上完成时，所有查询的 (ids, scores) 一条 SQL 取回，按查询和索引给出的顺序排列。"""
+    columns_to_select = db_model.get_search_projection(return_fields)
+    primary_key = list(db_model.__table__.primary_key.columns)[0]
+    query_indexes, ids, scores = [], [], []
+    for query_index, (hit_ids, hit_scores) in enumerate(hits_list, start=1):
+        query_indexes.extend([query_index] * len(hit_ids))
+        ids.extend(hit_ids)
+        scores.extend(hit_scores)
+    hits = func.unnest(cast(query_indexes, ARRAY(Integer)), cast(ids, ARRAY(Integer)),
+                       cast(scores, ARRAY(Float))).table_valued(
+        "query_index", "hit_id", "rank_score", with_ordinality="ordinality").render_derived()
+
+    rank_position = (func.row_number().over(partition_by=hits.c.query_index, order_by=hits.c.ordinality)
+                     + offset).label('rank_position')
+    return (select(hits.c.query_index, *columns_to_select, hits.c.rank_score.label('rank_score'), rank_position,
+                   *([literal(search_plan).label('search_plan')] if search_plan else []))
+            .join(hits, hits.c.hit_id == primary_key)
+            .order_by(hits.c.ordinality))
+
+
+def build_batch_vector_search_query(db_model, query_vectors: List[List[float]],
+                                    filter_conditions: list, offset: int, limit: int,
+                                    quantization: str | None = None, oversampling: int = 1,
+                                    exact: bool = False, search_plan: str | None = None,
+                                    document_model=None, document_conditions: list | None = None,
+                                    coarse_documents: int | None = None,
+                                    return_fields: List[str] | None = None):
+    """
+    多个查询向量一条 SQL：unnest 展开查询，再对每个查询 LATERAL 一次索引扫描。
+    量化、精确扫描与单条检索的 build_vector_search_query 一致；
+    coarse_documents 时在 LATERAL 中先按文档向量取前 coarse_documents 个文档，再只在这些文档的 chunk 中检索。
+    """
+    dim = len(query_vectors[0])
+    columns_to_select = db_model.get_search_projection(return_fields)
+    # 以文本数组传参再逐个转换为 vector，不依赖驱动对 vector[] 的编码
+    queries = func.unnest(cast(['[' + ','.join(map(str, vector)) + ']' for vector in query_vectors],
+                               ARRAY(Text))).table_valued(
+        "query_vector", with_ordinality="query_index").render_derived(name="queries")
+    query_vector = cast(queries.c.query_vector, VECTOR(dim))
+
+    distance = db_model.vector.op('<=>', return_type=Float)(query_vector)
+    order_distance = distance + 0 if exact else distance
+
+    filter_conditions = [condition for condition in filter_conditions if condition is not None]
+    if coarse_documents:
+        document_distance = document_model.vector.op('<=>', return_type=Float)(query_vector)
+        top_documents = select(document_model.id)
+        document_conditions = [condition for condition in document_conditions or [] if condition is not None]
+        if document_conditions:
+            top_documents = top_documents.where(and_(*document_conditions))
+        top_documents = top_documents.correlate_except(document_model).order_by(document_distance).limit(
+            coarse_documents)
+        filter_conditions.append(db_model.document_id.in_(top_documents.scalar_subquery()))
+
+    hits = select(*columns_to_select, distance.label('distance'))
+    if filter_conditions:
+        hits = hits.where(and_(*filter_conditions))
+    if quantization and not exact:
+        # 先在量化索引上多取 oversampling 倍候选，再用全精度向量重新打分
+        primary_key = list(db_model.__table__.primary_key.columns)[0]
+        coarse_distance = build_quantized_distance(db_model.vector, query_vector, quantization, dim=dim)
+        coarse_query = select(primary_key)
+        if filter_conditions:
+            coarse_query = coarse_query.where(and_(*filter_conditions))
+        coarse_candidates = coarse_query.correlate_except(db_model).order_by(coarse_distance).limit(
+            (offset + limit) * max(oversampling, 1)).scalar_subquery()
+        hits = hits.where(primary_key.in_(coarse_candidates))
+    hits = hits.order_by(order_distance).offset(offset).limit(limit).lateral("hits")
 
-    return query
+    rank_position = (func.row_number().over(partition_by=queries.c.query_index, order_by=hits.c.distance)
+                     + offset).label('rank_position')
+    extra_columns = [literal(search_plan).label('search_plan')] if search_plan else []
+    return (select(queries.c.query_index, *[hits.c[col.name] for col in columns_to_select],
+                   (1 - hits.c.distance).label('rank_score'), rank_position, *extra_columns)
+            .select_from(queries)
+            .join(hits, true())
+            .order_by(queries.c.query_index, hits.c.distance))
@@ -0,0 +1,120 @@
+import logging
+from typing import List, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.index_utils.partition_index import (build_create_partition_indexes_sql,
+                                                  build_drop_partition_indexes_sql)
+from app.crud.index_utils.vector_index import (build_vector_index_params, build_create_vector_index_sql,
+                                               build_drop_index_sql, check_memory_size)
+from app.crud.search_utils.local_vector_index import get_local_vector_index_registry
+from config import ServeConfig
+
+logger = logging.getLogger(__name__)
+
+
+class VectorIndexOperation:
+    """管理向量列上的 ANN 索引（HNSW / IVFFlat）。"""
+
+    def __init__(self, db_model: Type["DBaseModel"], column_name: str = "vector"):
+        self.db_model = db_model
+        self.table_name = db_model.__tablename__
+        self.column_name = column_name
+        self.dim = getattr(db_model.__table__.columns[column_name].type, "dim", None)
+
+    async def list_indexes(self, *, db: AsyncSession) -> List[dict]:
+        query = text("""
+            SELECT i.indexname AS index_name,
+                   i.indexdef AS index_def,
+                   pg_relation_size(c.oid) AS size_bytes
+            FROM pg_indexes i
+            JOIN pg_class c ON c.relname = i.indexname
+            WHERE i.tablename = :table_name
+              AND (i.indexdef ILIKE '%USING hnsw%' OR i.indexdef ILIKE '%USING ivfflat%')
+            ORDER BY i.indexname
+        """)
+        result = await db.execute(query, {"table_name": self.table_name})
+        return [dict(row._mapping) for row in result.all()]
+
+    async def create_index(self, *, db: AsyncSession, model: BaseModel) -> List[dict]:
+        try:
+            params = build_vector_index_params(model.method, m=model.m, ef_construction=model.ef_construction,
+                                               lists=model.lists)
+            ddl = build_create_vector_index_sql(self.table_name, self.column_name, model.method, params,
+                                                index_name=model.index_name, concurrently=model.concurrently,
+                                                quantization=model.quantization, dim=self.dim)
+            maintenance_work_mem = check_memory_size(model.maintenance_work_mem) \
+                if model.maintenance_work_mem else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        logger.info(f"Creating vector index: {ddl}")
+        await self._execute_ddl(db, ddl, concurrently=model.concurrently,
+                                maintenance_work_mem=maintenance_work_mem)
+        return await self.list_indexes(db=db)
+
+    async def drop_index(self, *, db: AsyncSession, index_name: str, concurrently: bool = True) -> List[dict]:
+        existing_names = {index["index_name"] for index in await self.list_indexes(db=db)}
+        if index_name not in existing_names:
+            raise HTTPException(status_code=404,
+                                detail=f"Vector index {index_name} does not exist on {self.table_name}.")
+
+        ddl = build_drop_index_sql(index_name, concurrently=concurrently)
+        logger.info(f"Dropping vector index: {ddl}")
+        await self._execute_ddl(db, ddl, concurrently=concurrently)
+        return await self.list_indexes(db=db)
+
+    async def create_partition_indexes(self, *, db: AsyncSession, partition_id: int, concurrently: bool = True):
+        method = ServeConfig.vector_index_method
+        params = build_vector_index_params(method, m=ServeConfig.hnsw_m,
+                                           ef_construction=ServeConfig.hnsw_ef_construction,
+                                           lists=ServeConfig.ivfflat_lists)
+        quantization = ServeConfig.vector_storage_mode if ServeConfig.vector_storage_mode != "full" else None
+        for ddl in build_create_partition_indexes_sql(self.table_name, partition_id, method, params,
+                                                      concurrently=concurrently,
+                                                      quantization=quantization, dim=self.dim):
+            logger.info(f"Creating partition index: {ddl}")
+            await self._execute_ddl(db, ddl, concurrently=concurrently)
+
+    async def drop_partition_indexes(self, *, db: AsyncSession, partition_id: int, concurrently: bool = True,
+                                     commit: bool = True):
+        """commit 为 False 时（只能非 CONCURRENTLY）在调用方的事务中删除，由调用方提交。"""
+        for ddl in build_drop_partition_indexes_sql(self.table_name, partition_id, concurrently=concurrently):
+            logger.info(f"Dropping partition index: {ddl}")
+            await self._execute_ddl(db, ddl, concurrently=concurrently, commit=commit)
+
+    async def sync_local_index(self, *, db: AsyncSession, partition_id: int) -> dict:
+        registry = get_local_vector_index_registry()
+        if partition_id not in registry.indexes:
+            raise HTTPException(status_code=400,
+                                detail=f"Partition {partition_id} is not configured in LOCAL_VECTOR_INDEX_PARTITIONS.")
+        count = await registry.sync(db, self.db_model, partition_id)
+        index = registry.indexes[partition_id]
+        return {"partition_id": partition_id, "count": count, "version": index.version, "watermark": index.watermark}
+
+    @staticmethod
+    async def _execute_ddl(db: AsyncSession, ddl: str, concurrently: bool = False,
+                           maintenance_work_mem: str | None = None, commit: bool = True):
+        if not concurrently:
+            if maintenance_work_mem:
+                await db.execute(text(f"SET LOCAL maintenance_work_mem = '{maintenance_work_mem}'"))
+            await db.execute(text(ddl))
+            if commit:
+                await db.commit()
+            return
+
+        # CONCURRENTLY 不能在事务中执行，这里单独开一个自动提交的连接；
+        # 先结束当前会话的事务，否则构建索引会一直等待这个会话持有的快照
+        await db.commit()
+        async with db.bind.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            if maintenance_work_mem:
+                await conn.execute(text(f"SET maintenance_work_mem = '{maintenance_work_mem}'"))
+            try:
+                await conn.execute(text(ddl))
+            finally:
+                if maintenance_work_mem:
+                    await conn.execute(text("RESET maintenance_work_mem"))
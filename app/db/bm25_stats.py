@@ -0,0 +1,89 @@
+"""
+BM25 所需的词项统计：每个分区的 df（包含该词的 chunk 数）以及 chunk 数和总长度。
+
+统计由 chunks 上的语句级触发器增量维护，通过转换表（transition table）一次处理整批插入/删除，
+批量入库时每条语句只更新一次统计，避免逐行触发在同一统计行上排队。
+文档长度取 length(search_vector)，即不同词项数。未分区的 chunk 记在 partition_id = 0 下。
+
+两张统计表都按 shard 分成 BM25_STATS_SHARDS 份，每个事务只写 txid % BM25_STATS_SHARDS 对应的行，
+查询时对各 shard 求和。并发入库同一分区的事务大多落在不同的行上，不必等待前一个事务提交；
+同一 shard 内的词项按 (partition_id, lexeme) 顺序加锁，不会互相死锁。
+删除在本事务的 shard 中记负数增量，单个 shard 的值可以为负，只有总和有意义；值为 0 的行保留不删。
+"""
+
+BM25_STATS_SHARDS = 16
+
+BM25_STATS_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION chunk_bm25_stats_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    stats_shard smallint := txid_current() % {BM25_STATS_SHARDS};
+    changes text;
+BEGIN
+    -- 只有 search_vector 或分区变化时才影响统计，只改 vector、doc_metadata 等列的更新直接返回
+    IF TG_OP = 'UPDATE' AND NOT EXISTS (
+        SELECT 1 FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE n.search_vector IS DISTINCT FROM o.search_vector OR n.partition_id IS DISTINCT FROM o.partition_id
+    ) THEN
+        RETURN NULL;
+    END IF;
+
+    -- 插入记 +1、删除记 -1，更新把新旧行合在一条语句里，未变化的行正负抵消
+    changes := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT partition_id, search_vector, 1 AS sign FROM new_rows'
+        WHEN 'DELETE' THEN 'SELECT partition_id, search_vector, -1 AS sign FROM old_rows'
+        ELSE 'SELECT partition_id, search_vector, 1 AS sign FROM new_rows '
+             || 'UNION ALL SELECT partition_id, search_vector, -1 FROM old_rows'
+    END;
+
+    -- 按主键顺序写入，并发事务以相同顺序获取行锁
+    EXECUTE format($sql$
+        WITH changes AS (%s)
+        INSERT INTO chunk_term_stats (partition_id, shard, lexeme, df)
+        SELECT coalesce(partition_id, 0), $1, lexeme, sum(sign)
+        FROM changes, unnest(tsvector_to_array(search_vector)) AS lexeme
+        GROUP BY 1, 3
+        HAVING sum(sign) <> 0
+        ORDER BY 1, 3
+        ON CONFLICT (partition_id, shard, lexeme) DO UPDATE SET df = chunk_term_stats.df + EXCLUDED.df
+    $sql$, changes) USING stats_shard;
+
+    EXECUTE format($sql$
+        WITH changes AS (%s)
+        INSERT INTO chunk_corpus_stats (partition_id, shard, doc_count, total_length)
+        SELECT coalesce(partition_id, 0), $1, sum(sign), sum(sign * length(search_vector))
+        FROM changes
+        GROUP BY 1
+        HAVING sum(sign) <> 0 OR sum(sign * length(search_vector)) <> 0
+        ORDER BY 1
+        ON CONFLICT (partition_id, shard) DO UPDATE
+        SET doc_count = chunk_corpus_stats.doc_count + EXCLUDED.doc_count,
+            total_length = chunk_corpus_stats.total_length + EXCLUDED.total_length
+    $sql$, changes) USING stats_shard;
+    RETURN NULL;
+END
+$$
+"""
+
+# 带转换表的触发器只能对应一种事件，所以分别创建；也不能用 UPDATE OF 列表，内容是否变化在函数中比较
+BM25_STATS_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS chunk_bm25_stats_insert ON chunks",
+    "CREATE TRIGGER chunk_bm25_stats_insert AFTER INSERT ON chunks "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION chunk_bm25_stats_apply()",
+    "DROP TRIGGER IF EXISTS chunk_bm25_stats_delete ON chunks",
+    "CREATE TRIGGER chunk_bm25_stats_delete AFTER DELETE ON chunks "
+    "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION chunk_bm25_stats_apply()",
+    "DROP TRIGGER IF EXISTS chunk_bm25_stats_update ON chunks",
+    "CREATE TRIGGER chunk_bm25_stats_update AFTER UPDATE ON chunks "
+    "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION chunk_bm25_stats_apply()",
+]
+
+# 全量重建，用于已有数据的回填或统计漂移后的校正
+BM25_STATS_REBUILD = [
+    "TRUNCATE chunk_term_stats, chunk_corpus_stats",
+    "INSERT INTO chunk_term_stats (partition_id, shard, lexeme, df) "
+    "SELECT coalesce(partition_id, 0), 0, lexeme, count(*) "
+    "FROM chunks, unnest(tsvector_to_array(search_vector)) AS lexeme GROUP BY 1, 3",
+    "INSERT INTO chunk_corpus_stats (partition_id, shard, doc_count, total_length) "
+    "SELECT coalesce(partition_id, 0), 0, count(*), sum(length(search_vector)) FROM chunks GROUP BY 1",
+]
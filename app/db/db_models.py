@@ -1,18 +1,47 @@
 import json
 from datetime import timedelta
-from typing import Set
+from typing import Set, List
 from fastapi import HTTPException
 from pgvector.sqlalchemy import VECTOR
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, UniqueConstraint, select
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, UniqueConstraint, select, Index, \
+    text, Computed, BigInteger, SmallInteger, DDL, event
 from sqlalchemy import JSON
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.orm import class_mapper
+from config import ServeConfig
 from db_config import Base
+from app.db.bm25_stats import BM25_STATS_FUNCTION, BM25_STATS_TRIGGERS
+from app.crud.index_utils.text_index import search_vector_expression, search_vector_index_name
+from app.crud.index_utils.vector_index import vector_index_name, vector_index_element
 from app.db.utils import get_current_time
 
 
+def create_vector_index(table_name: str, column_name: str = "vector") -> Index:
+    """声明迁移中建立的 ANN 索引：全精度向量上的 HNSW（余弦距离，m = 16，ef_construction = 64）。
+
+    这里固定为与 alembic 迁移一致的定义，不随 VECTOR_INDEX_METHOD / VECTOR_STORAGE_MODE 变化，
+    否则按配置 create_all 建出的库与迁移出的库不一致。IVFFlat 和量化索引通过 /xiaoke_admin/vector_index 创建，
+    启动时 check_vector_indexes 会检查配置的索引是否存在。
+    """
+    return Index(
+        vector_index_name(table_name, column_name, "hnsw"),
+        text(vector_index_element(column_name)),
+        postgresql_using="hnsw",
+        postgresql_with={"m": 16, "ef_construction": 64},
+    )
+
+
+def create_search_vector(search_columns: dict):
+    """按可检索列和权重声明 STORED 生成的 tsvector 列，延迟加载，普通查询不会取出。"""
+    return deferred(Column(TSVECTOR, Computed(search_vector_expression(search_columns), persisted=True)))
+
+
+def create_search_vector_index(table_name: str) -> Index:
+    return Index(search_vector_index_name(table_name), "search_vector", postgresql_using="gin")
+
+
 class DBaseModel(Base):
     __abstract__ = True
 
@@ -20,6 +49,13 @@ class DBaseModel(Base):
     create_at = Column(DateTime(timezone=True), default=get_current_time)
     update_at = Column(DateTime(timezone=True), default=get_current_time, onupdate=get_current_time)
 
+    # 检索默认返回的列，为空时返回除向量列和禁止字段外的全部列
+    __search_projection__: tuple = ()
+    # 关键词检索的列及权重（A-D），声明后需同时定义 search_vector 生成列和 GIN 索引
+    __search_columns__: dict = {}
+    # 是否由触发器维护 BM25 词项统计（见 app/db/bm25_stats.py），为 True 时关键词检索可按 bm25 排序
+    __bm25_stats__: bool = False
+
     @classmethod
     def get_unique_columns(cls):
         return [col.name for col in cls.__table__.columns if col.unique]
@@ -28,13 +64,34 @@ class DBaseModel(Base):
     def get_disallowed_columns(cls) -> Set[str]:
         return set()
 
+    @classmethod
+    def get_search_projection(cls, fields: List[str] | None = None) -> list:
+        """检索只取需要的列，向量列只有在 fields 中显式请求时才返回，主键总是返回。"""
+        disallowed_fields = cls.get_disallowed_columns()
+        columns = cls.__table__.columns
+        if fields:
+            invalid_fields = [field for field in fields if field not in columns or field in disallowed_fields
+                              or columns[field].computed is not None]
+            if invalid_fields:
+                raise HTTPException(status_code=400, detail=f"Invalid return fields: {', '.join(invalid_fields)}")
+            names = list(fields)
+        elif cls.__search_projection__:
+            names = list(cls.__search_projection__)
+        else:
+            names = [col.name for col in columns
+                     if not isinstance(col.type, (VECTOR, TSVECTOR)) and col.name not in disallowed_fields]
+        if "id" not in names:
+            names.insert(0, "id")
+        return [columns[name] for name in dict.fromkeys(names)]
+
     @classmethod
     def get_relationship(cls, exclude_relationships: list = None) -> list:
         return [rel.key for rel in class_mapper(cls).relationships]
 
     @classmethod
     def get_all_columns(cls):
-        return [col.name for col in cls.__table__.columns]
+        """不含 search_vector 这类数据库生成的列，它们不能写入，也不作为普通字段返回。"""
+        return [col.name for col in cls.__table__.columns if col.computed is None]
 
     @staticmethod
     async def check_foreign_key_exists(db: AsyncSession, table, foreign_key_id):
@@ -49,6 +106,12 @@ class Partition(DBaseModel):
     __tablename__ = 'partitions'
 
     partition_name = Column(String, unique=True, index=True, nullable=False)
+    __search_columns__ = {"partition_name": "A"}
+    search_vector = create_search_vector(__search_columns__)
+
+    __table_args__ = (
+        create_search_vector_index('partitions'),
+    )
 
     users = relationship("User", back_populates="partition", lazy="select")
     rag_caches = relationship("RAGCache", back_populates="partition", lazy="select")
@@ -73,6 +136,12 @@ class User(DBaseModel):
     role = Column(String(20), default='user', nullable=False)
     status = Column(Boolean, default=True, nullable=False)
     partition_id = Column(Integer, ForeignKey('partitions.id'), nullable=True)
+    __search_columns__ = {"name": "A", "account": "A", "email": "B"}
+    search_vector = create_search_vector(__search_columns__)
+
+    __table_args__ = (
+        create_search_vector_index('users'),
+    )
 
     partition = relationship("Partition", back_populates="users", lazy="select")
     rag_caches = relationship("RAGCache", back_populates="user", lazy="select")
@@ -97,6 +166,8 @@ class File(DBaseModel):
     reference_count = Column(Integer, default=1)
     is_convert = Column(Boolean, default=False)
     partition_id = Column(Integer, ForeignKey('partitions.id'), nullable=True)
+    __search_columns__ = {"file_name": "A"}
+    search_vector = create_search_vector(__search_columns__)
 
     partition = relationship("Partition", back_populates="files", lazy="select")
     documents = relationship("Document", back_populates="file", lazy="select")
@@ -104,6 +175,7 @@ class File(DBaseModel):
 
     __table_args__ = (
         UniqueConstraint('partition_id', 'file_hash', name='uq_partition_file_hash'),
+        create_search_vector_index('files'),
     )
 
     def __repr__(self):
@@ -131,6 +203,15 @@ class Document(DBaseModel):
     hash_key = Column(String, unique=True, index=True, nullable=False)
     partition_id = Column(Integer, ForeignKey('partitions.id'), nullable=True)
     file_id = Column(Integer, ForeignKey('files.id'), nullable=True)
+    # 全部 chunk 向量的质心，入库切分完成后计算，用于由粗到细检索时先选文档
+    vector = Column(VECTOR(ServeConfig.embedding_dim), nullable=True)
+    __search_columns__ = {"title": "A", "content": "B"}
+    search_vector = create_search_vector(__search_columns__)
+
+    __table_args__ = (
+        create_vector_index('documents'),
+        create_search_vector_index('documents'),
+    )
 
     partition = relationship("Partition", back_populates="documents", lazy="select")
     file = relationship("File", back_populates="documents", lazy="select")
@@ -144,22 +225,70 @@ class Chunk(DBaseModel):
     __tablename__ = 'chunks'
 
     page_content = Column(Text, nullable=False)
-    vector = Column(VECTOR, nullable=False)
+    vector = Column(VECTOR(ServeConfig.embedding_dim), nullable=False)
     category = Column(String, nullable=True)
     is_convert = Column(Boolean, default=False)
     doc_metadata = Column(JSONB, nullable=True)
     partition_id = Column(Integer, ForeignKey('partitions.id'), nullable=True)
     file_id = Column(Integer, ForeignKey('files.id'), nullable=True)
     document_id = Column(Integer, ForeignKey('documents.id'), nullable=True)
+    __search_columns__ = {"page_content": "A"}
+    search_vector = create_search_vector(__search_columns__)
 
     partition = relationship("Partition", back_populates="chunks", lazy="select")
     file = relationship("File", back_populates="chunks", lazy="select")
     document = relationship("Document", back_populates="chunks", lazy="select")
 
+    __table_args__ = (
+        create_vector_index('chunks'),
+        create_search_vector_index('chunks'),
+        # 按文档和段落号取邻接段落，表达式需与 context_window 中的查询一致；非整数的段落号为 NULL，不影响写入
+        Index('ix_chunks_document_paragraph_number', 'document_id',
+              text("(CASE WHEN (doc_metadata ->> 'paragraph_number') ~ '^-?[0-9]{1,9}$' "
+                   "THEN (doc_metadata ->> 'paragraph_number')::integer END)")),
+    )
+    __search_projection__ = ("id", "page_content", "doc_metadata", "document_id")
+    __bm25_stats__ = True
+
     def __repr__(self):
         return f"<Chunk(id={self.id}, page_content='{self.page_content}')>"
 
 
+class EmbeddingRecord(Base):
+    """所有节点共享的 embedding 存储，按 (模型名, 内容哈希) 查找，见 app/serves/model_serves/embedding_cache.py。"""
+    __tablename__ = 'embedding_store'
+
+    model_name = Column(String, primary_key=True)
+    content_hash = Column(String(64), primary_key=True)
+    vector = Column(VECTOR(ServeConfig.embedding_dim), nullable=False)
+    create_at = Column(DateTime(timezone=True), default=get_current_time)
+
+
+class ChunkTermStat(Base):
+    """BM25 的词项文档频率，由 chunks 上的触发器维护，df 为各 shard 之和。"""
+    __tablename__ = 'chunk_term_stats'
+
+    partition_id = Column(Integer, primary_key=True)
+    shard = Column(SmallInteger, primary_key=True, default=0)
+    lexeme = Column(Text, primary_key=True)
+    df = Column(Integer, nullable=False, default=0)
+
+
+class ChunkCorpusStat(Base):
+    """BM25 的分区级 chunk 数和总长度，由 chunks 上的触发器维护，取值为各 shard 之和。"""
+    __tablename__ = 'chunk_corpus_stats'
+
+    partition_id = Column(Integer, primary_key=True)
+    shard = Column(SmallInteger, primary_key=True, default=0)
+    doc_count = Column(BigInteger, nullable=False, default=0)
+    total_length = Column(BigInteger, nullable=False, default=0)
+
+
+event.listen(Chunk.__table__, "after_create", DDL(BM25_STATS_FUNCTION))
+for trigger_ddl in BM25_STATS_TRIGGERS:
+    event.listen(Chunk.__table__, "after_create", DDL(trigger_ddl))
+
+
 class Conversation(DBaseModel):
     __tablename__ = 'conversations'
 
@@ -184,6 +313,12 @@ class ResponseRecord(DBaseModel):
     partition_id = Column(Integer, ForeignKey('partitions.id'), nullable=True)
     conversation_id = Column(Integer, ForeignKey('conversations.id'), nullable=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    __search_columns__ = {"input": "A", "response": "B"}
+    search_vector = create_search_vector(__search_columns__)
+
+    __table_args__ = (
+        create_search_vector_index('response_records'),
+    )
 
     partition = relationship("Partition", back_populates="response_records", lazy="select")
     conversation = relationship("Conversation", back_populates="response_records", lazy="select")
@@ -202,6 +337,12 @@ class RAGCache(DBaseModel):
     is_valid = Column(Boolean, default=False)
     partition_id = Column(Integer, ForeignKey('partitions.id'), nullable=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    __search_columns__ = {"query": "A", "response": "B"}
+    search_vector = create_search_vector(__search_columns__)
+
+    __table_args__ = (
+        create_search_vector_index('rag_caches'),
+    )
 
     partition = relationship("Partition", back_populates="rag_caches", lazy="select")
     user = relationship("User", back_populates="rag_caches", lazy="select")
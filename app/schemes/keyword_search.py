@@ -10,4 +10,6 @@ class KeywordSearchModel(BaseModel):
     offset: int = 0
     limit: int = 10
     filters: List[Dict[str, Union[Dict[str, Any]]]] = None
+    # 检索结果返回的列，为空时使用模型的默认投影
+    return_fields: List[str] | None = None
 
@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional, List, Dict, Union, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, model_validator
+from typing_extensions import Literal
 
 from app.schemes.keyword_search import KeywordSearchModel
 
@@ -43,29 +44,94 @@ class ResponseChunk(BaseModel):
 
 
 class ChunkKeywordSearch(KeywordSearchModel):
+    """
+    ranking: sort_by_rank 时的排序方式，ts_rank 或 bm25（使用分区内的词项统计）
+    """
     search_columns: List[str] = ["page_content"]
+    partition_id: Optional[int] = None
+    ranking: Literal["ts_rank", "bm25"] | None = None
 
 
 class SearchChunkResponse(BaseModel):
     id: int
-    page_content: str
+    page_content: Optional[str] = None
+    vector: Optional[List[float]] = None
     category: Optional[str] = None
     doc_metadata: Optional[Dict[str, Any]] = None
     partition_id: Optional[int] = None
     file_id: Optional[int] = None
     document_id: Optional[int] = None
-    create_at: datetime
-    update_at: datetime
+    create_at: Optional[datetime] = None
+    update_at: Optional[datetime] = None
     rank_score: Optional[float] = None
     rank_position: Optional[int] = None
+    search_plan: Optional[str] = None
 
 
 class ChunkSearch(BaseModel):
+    """
+    quantization: 先在 halfvec / binary 量化索引上取候选再用全精度向量重排，为空时使用 VECTOR_STORAGE_MODE
+    oversampling: 量化检索时候选集相对 limit 的放大倍数，为空时使用 VECTOR_OVERSAMPLING
+    partition_id: 只在该分区内检索
+    mode: auto 按过滤条件的选择度自动选择；exact 精确扫描；ann 近似检索；iterative 近似检索 + 迭代扫描
+    ef_search / probes: 覆盖本次请求的 hnsw.ef_search / ivfflat.probes
+    return_fields: 返回的列，默认 id、page_content、doc_metadata、document_id，vector 只有显式指定时返回
+    diversify: 先取 fetch_k（默认 limit 的 4 倍）个候选，再用 MMR 选出 limit 个，mmr_lambda 越小结果越分散
+    coarse_documents: 由粗到细检索，先按文档向量取前 coarse_documents 个文档，再只在这些文档的 chunk 中检索
+    """
     page_content: str
     offset: int = 0
     limit: int = 20
     vector: List[float] | None = None
     filters: List[Dict[str, Union[Dict[str, Any]]]] = None
+    partition_id: Optional[int] = None
+    quantization: Literal["full", "halfvec", "binary"] | None = None
+    oversampling: int | None = None
+    mode: Literal["auto", "exact", "ann", "iterative"] | None = None
+    ef_search: int | None = None
+    probes: int | None = None
+    return_fields: List[str] | None = None
+    diversify: bool = False
+    mmr_lambda: float = 0.5
+    fetch_k: int | None = None
+    coarse_documents: int | None = None
+
+
+class ChunkBatchSearch(BaseModel):
+    """
+    批量向量检索，page_contents 中的每个查询各返回一组结果，其余参数对所有查询生效
+    vectors: 与 page_contents 一一对应的查询向量，为空时统一批量计算
+    quantization / oversampling / mode / ef_search / probes / coarse_documents: 含义同 ChunkSearch
+    """
+    page_contents: List[str]
+    vectors: List[List[float]] | None = None
+    offset: int = 0
+    limit: int = 20
+    filters: List[Dict[str, Union[Dict[str, Any]]]] = None
+    partition_id: Optional[int] = None
+    quantization: Literal["full", "halfvec", "binary"] | None = None
+    oversampling: int | None = None
+    mode: Literal["auto", "exact", "ann", "iterative"] | None = None
+    ef_search: int | None = None
+    probes: int | None = None
+    coarse_documents: int | None = None
+    return_fields: List[str] | None = None
+
+
+class ChunkBatchKeywordSearch(BaseModel):
+    """
+    批量关键词检索，keywords_list 中的每组关键词各返回一组结果
+    ranking: 同 ChunkKeywordSearch，bm25 时逐组执行
+    """
+    keywords_list: List[List[str]]
+    search_columns: List[str] = ["page_content"]
+    sort_by_rank: bool = True
+    offset: int = 0
+    limit: int = 10
+    filters: List[Dict[str, Union[Dict[str, Any]]]] = None
+    partition_id: Optional[int] = None
+    return_fields: List[str] | None = None
+    ranking: Literal["ts_rank", "bm25"] | None = None
 
 
 class HybridSearchModel(BaseModel):
@@ -84,17 +150,70 @@ class HybridSearchModel(BaseModel):
     keyword_weight: Optional[float] = 1.0
     paragraph_number_ranking: Optional[bool] = False
     filter_count: int | None = -1
+    partition_id: Optional[int] = None
+    quantization: Literal["full", "halfvec", "binary"] | None = None
+    oversampling: int | None = None
+    mode: Literal["auto", "exact", "ann", "iterative"] | None = None
+    ef_search: int | None = None
+    probes: int | None = None
+    return_fields: List[str] | None = None
+    diversify: bool = False
+    mmr_lambda: float = 0.5
+    fetch_k: int | None = None
+    ranking: Literal["ts_rank", "bm25"] | None = None
+    # sql: 两路检索和 RRF 融合在一条语句中完成，只对融合后的前 limit 行取内容；为空时使用 HYBRID_EXECUTION
+    execution: Literal["python", "sql"] | None = None
+    # 融合方式：rrf 只看名次；minmax / zscore 归一化得分后加权求和；dbsf 按得分分布截断后归一化
+    fusion_method: Literal["rrf", "minmax", "zscore", "dbsf"] | None = None
+    # 每一路检索的候选数，融合后再按 offset / limit 截取，为空时每一路取 offset + limit
+    candidate_k: int | None = None
+    # 重排时送入重排模型的候选数（为空时使用 RERANK_POOL_SIZE）和重排后返回的数量
+    rerank_pool_size: int | None = None
+    rerank_top_n: int | None = None
+    # 重排后端，为空时使用 RERANK_BACKEND
+    rerank_backend: Literal["remote", "local"] | None = None
+    # 大于 0 时把每个命中扩展为同一文档中前后 context_window 个段落，重叠的窗口合并
+    context_window: int = 0
+    # 向量检索一路由粗到细，先按文档向量取前 coarse_documents 个文档
+    coarse_documents: int | None = None
+
+
+class HybridBatchSearchModel(HybridSearchModel):
+    """
+    批量混合检索，page_contents 与 keywords_list 一一对应，其余参数对所有查询生效。
+    execution 为 sql 时逐条执行单条混合检索；不接受未声明的字段，避免参数被静默忽略。
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    page_content: str | None = None
+    keywords: List[str] | None = None
+    page_contents: List[str]
+    keywords_list: List[List[str]]
+    vectors: List[List[float]] | None = None
+
+    @model_validator(mode="after")
+    def check_batch_fields(self):
+        if self.page_content is not None or self.keywords is not None or self.vector is not None:
+            raise ValueError("批量混合检索使用 page_contents / keywords_list / vectors，"
+                             "不支持 page_content / keywords / vector")
+        if len(self.keywords_list) != len(self.page_contents):
+            raise ValueError("keywords_list 与 page_contents 的数量不一致")
+        if self.vectors is not None and len(self.vectors) != len(self.page_contents):
+            raise ValueError("vectors 与 page_contents 的数量不一致")
+        return self
 
 
 class SearchHybridResponse(BaseModel):
     id: int
-    page_content: str
+    page_content: Optional[str] = None
+    vector: Optional[List[float]] = None
     category: Optional[str] = None
     doc_metadata: Optional[Dict[str, Any]] = None
     partition_id: Optional[int] = None
     file_id: Optional[int] = None
     document_id: Optional[int] = None
-    create_at: datetime
-    update_at: datetime
+    create_at: Optional[datetime] = None
+    update_at: Optional[datetime] = None
     rank_score: Optional[float] = None
     rank_position: Optional[int] = None
+    search_plan: Optional[str] = None
@@ -0,0 +1,37 @@
+from typing import Optional, Literal
+
+from pydantic import BaseModel
+
+
+class VectorIndexCreate(BaseModel):
+    """
+    method: 索引类型，hnsw 或 ivfflat
+    index_name: 索引名，为空时按 ix_{表名}_{列名}_{method} 生成
+    m: hnsw 每层的最大连接数
+    ef_construction: hnsw 构建时的候选列表大小
+    lists: ivfflat 的聚类中心数量，建议取 行数/1000（百万行以上取 sqrt(行数)）
+    quantization: 只索引量化后的表达式（halfvec 半精度 / binary 二值化），为空时索引全精度向量
+    concurrently: 是否使用 CONCURRENTLY 构建，构建期间不锁写
+    maintenance_work_mem: 构建索引时使用的内存，例如 2GB
+    """
+    method: Literal["hnsw", "ivfflat"] = "hnsw"
+    index_name: Optional[str] = None
+    m: Optional[int] = 16
+    ef_construction: Optional[int] = 64
+    lists: Optional[int] = 100
+    quantization: Optional[Literal["halfvec", "binary"]] = None
+    concurrently: bool = True
+    maintenance_work_mem: Optional[str] = None
+
+
+class ResponseVectorIndex(BaseModel):
+    index_name: str
+    index_def: str
+    size_bytes: Optional[int] = None
+
+
+class ResponseLocalVectorIndex(BaseModel):
+    partition_id: int
+    count: int
+    version: Optional[str] = None
+    watermark: Optional[str] = None
@@ -17,6 +17,8 @@ class RAGServeModel(BaseModel):
     recursive_query: 是否使用递归查询
     paragraph_number_ranking: 是否使用段落数量排序
     filter_count: 过滤检索结果数量，-1表示不过滤
+    partition_id: 只在该分区内检索，为空时检索全部分区
+    diversify: 是否用 MMR 去掉高度重复的检索结果，减少送入 LLM 的上下文
     """
     query: str
     limit: int = 15
@@ -28,6 +30,8 @@ class RAGServeModel(BaseModel):
     recursive_query: bool = False
     paragraph_number_ranking: bool = False
     filter_count: int = -1
+    partition_id: int | None = None
+    diversify: bool = False
 
 
 class RAGStreamResponse(BaseModel):
@@ -1,13 +1,14 @@
 import os
 import re
 import logging
-from typing import List, Optional
+from typing import Callable, List, Optional
 
 import aiofiles
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.crud.image_operation import ImageOperation
 from app.serves.file_processing.md_split import MarkdownHeaderTextSplitter, MarkdownTextRefSplitter, Chunk
+from app.serves.model_serves.tokenizer import count_tokens
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -21,11 +22,13 @@ async def nested_split_markdown(file_path: str,
                                 remove_image_tag: bool = True,
                                 uri2remote: bool = False,
                                 image_operator: Optional[ImageOperation] = None,
-                                db: Optional[AsyncSession] = None
+                                db: Optional[AsyncSession] = None,
+                                length_function: Callable[[str], int] = len
                                 ) -> List[Chunk]:
     """首先按标题分割，然后按长度分割。
 
-    `header` 应该作为内容的一部分。
+    `header` 应该作为内容的一部分。chunk_size / chunk_overlap 按 length_function 计算，传入 count_tokens 时单位为 token。
+    每个 chunk 的 token 数写入 metadata['token_count']，拼装 prompt 时不必重新计数。
     """
     logger.info(f"Starting nested_split_markdown for file: {file_path}")
     # 读取文件
@@ -36,7 +39,8 @@ async def nested_split_markdown(file_path: str,
     chunks = head_splitter.create_chunks(text, metadata=metadata)
     text_chunks = []
 
-    text_ref_splitter = MarkdownTextRefSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    text_ref_splitter = MarkdownTextRefSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                                length_function=length_function)
     paragraph_counter = 1
 
     for chunk in chunks:
@@ -50,7 +54,7 @@ async def nested_split_markdown(file_path: str,
             header += ' '
             header += chunk.metadata['Header 3']
 
-        if len(chunk.content_or_path) > chunk_size:
+        if length_function(chunk.content_or_path) > chunk_size:
             sub_chunks = text_ref_splitter.create_chunks([chunk.content_or_path], [chunk.metadata])
 
             for sub_chunk in sub_chunks:
@@ -62,6 +66,7 @@ async def nested_split_markdown(file_path: str,
                     if remove_image_tag:
                         sub_chunk = remove_image_tags(sub_chunk)
                     sub_chunk.metadata['paragraph_number'] = paragraph_counter
+                    sub_chunk.metadata['token_count'] = count_tokens(sub_chunk.content_or_path)
                     paragraph_counter += 1
                     text_chunks.append(sub_chunk)
 
@@ -73,6 +78,7 @@ async def nested_split_markdown(file_path: str,
             if remove_image_tag:
                 chunk = remove_image_tags(chunk)
             chunk.metadata['paragraph_number'] = paragraph_counter
+            chunk.metadata['token_count'] = count_tokens(chunk.content_or_path)
             paragraph_counter += 1
             text_chunks.append(chunk)
 
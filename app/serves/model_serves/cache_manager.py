@@ -1,39 +1,59 @@
+import asyncio
 import json
 import logging
 from functools import wraps
 
 from app.core.create_cache_key import create_hash_key
+from app.serves.model_serves.embedding_cache import embedding_cache_key
+from app.serves.model_serves.single_flight import SingleFlight
 from app.serves.model_serves.types import LLMOutput, EmbeddingOutput
 
 logger = logging.getLogger(__name__)
 
 
+# 进行中的上游调用，相同的并发请求共享同一次调用
+llm_flights = SingleFlight()
+embedding_flights = SingleFlight()
+
+
 # only used in the llm chat function
 def llm_cached_call():
+    """
+    先查缓存；未命中时按 (模型名, 消息, 参数, response_format) 合并进行中的相同请求，
+    并发的相同 prompt 只请求一次上游，复用结果的调用方 total_tokens 记为 0，与缓存命中一致。
+    """
+
     def decorator(func):
         @wraps(func)
         async def wrapper(self, *args, **kwargs):
-            if not self.enable_cache:
-                return await func(self, *args, **kwargs)
-
             model_input = args[0] if args else kwargs.get('model_input')
 
             llm_input = model_input.model_dump()
             messages = llm_input.get("input_content")
             parameters = llm_input.get("set_param")
 
-            cache_key = create_hash_key(self.cache.partition_name, messages, parameters)
+            cache_key = None
+            if self.enable_cache:
+                cache_key = create_hash_key(self.cache.partition_name, messages, parameters)
+                cached_result = self.cache.get(cache_key)
+                if cached_result:
+                    logger.debug(f"Cache hit: {cache_key}")
+                    result = LLMOutput(output=json.dumps(cached_result), total_tokens=0)
+                    return result
+                logger.debug(f"Cache miss: {cache_key}")
 
-            cached_result = self.cache.get(cache_key)
-            if cached_result:
-                logger.debug(f"Cache hit: {cache_key}")
-                result = LLMOutput(output=json.dumps(cached_result), total_tokens=0)
+            async def call_and_cache():
+                result = await func(self, *args, **kwargs)
+                if cache_key is not None:
+                    self.cache.set(cache_key, result.output, expire_after_seconds=self.cache_expire_after_seconds)
                 return result
 
-            logger.debug(f"Cache miss: {cache_key}")
-            result = await func(self, *args, **kwargs)
-
-            self.cache.set(cache_key, result.output, expire_after_seconds=self.cache_expire_after_seconds)
+            flight_key = create_hash_key(model_input.name, messages,
+                                         {**(parameters or {}), "response_format": kwargs.get("response_format")})
+            result, shared = await llm_flights.do(flight_key, call_and_cache)
+            if shared:
+                logger.debug(f"Joined in-flight chat request: {flight_key}")
+                return result.model_copy(update={"total_tokens": 0})
             return result
 
         return wrapper
@@ -43,47 +63,103 @@ def llm_cached_call():
 
 # only used in the embedding function
 def embedding_cached_call():
+    """
+    self.cache 为 EmbeddingCache：整批输入一次批量查询缓存，只把未命中的内容送去 embedding，
+    结果再一次批量写回。键由 (模型名, 内容, 参数) 生成。
+    未命中的键如果已有其他请求正在 embedding，直接等待那次请求的结果，只为其余的键发起新的调用。
+    """
+
     def decorator(func):
         @wraps(func)
         async def wrapper(self, *args, **kwargs):
-            if not self.enable_cache:
-                return await func(self, *args, **kwargs)
-
             model_input = args[0] if args else kwargs.get('model_input')
-            embedding_input = model_input.model_dump()
-            input_content = embedding_input.get("input_content")
-            parameters = embedding_input.get("set_params")
-            new_input_contents = []
-            results = [None] * len(input_content)
-            cache_miss_indices = []
-            total_tokens = 0
-            for idx, content in enumerate(input_content):
-                # cache_key = create_hash_key(self.cache.partition_name, content, parameters)
-                cache_key = create_hash_key("test_embedding", content, parameters)
+            input_content = list(model_input.input_content)
+            cache_keys = [embedding_cache_key(model_input.name, content, model_input.set_params)
+                          for content in input_content]
+            if self.enable_cache:
+                cached_vectors = await self.cache.get_many(cache_keys)
+            else:
+                cached_vectors = [None] * len(cache_keys)
+            results = [vector.tolist() if vector is not None else None for vector in cached_vectors]
+
+            # 同一批中重复的内容只请求一次
+            miss_keys = list(dict.fromkeys(key for key, vector in zip(cache_keys, cached_vectors) if vector is None))
+            logger.debug(f"Embedding cache: {len(input_content) - len(miss_keys)} hits, {len(miss_keys)} misses")
+            if not miss_keys:
+                return EmbeddingOutput(output=results, total_tokens=0)
+
+            in_flight = {key: task for key in miss_keys if (task := embedding_flights.get(key)) is not None}
+            own_keys = [key for key in miss_keys if key not in in_flight]
+            own_task = None
+            if own_keys:
+                miss_positions = {key: idx for idx, key in reversed(list(enumerate(cache_keys)))}
+                # update the input content to only include the cache misses
+                model_input.input_content = [input_content[miss_positions[key]] for key in own_keys]
 
-                cached_result = self.cache.get(cache_key)
-                if cached_result:
-                    logger.debug(f"Cache hit: {cache_key}")
-                    results[idx] = cached_result
-                else:
-                    logger.debug(f"Cache miss: {cache_key}")
-                    new_input_contents.append(content)
-                    cache_miss_indices.append(idx)
+                async def call_and_cache():
+                    result = await func(self, *args, **kwargs)
+                    vectors = dict(zip(own_keys, result.output))
+                    if self.enable_cache:
+                        await self.cache.set_many(vectors)
+                    return vectors, result.total_tokens
 
-            if new_input_contents:
-                # update the input content to only include the cache misses
-                model_input.input_content = new_input_contents
-                result = await func(self, *args, **kwargs)
-                for idx, res in zip(cache_miss_indices, result.output):
-                    results[idx] = res
-                    # cache_key = create_hash_key(self.cache.partition_name, input_content[idx], parameters)
-                    cache_key = create_hash_key("test_embedding", input_content[idx], parameters)
+                own_task = embedding_flights.start(own_keys, call_and_cache())
 
-                    self.cache.set(cache_key, res)
-                total_tokens = result.total_tokens
+            tasks = list(dict.fromkeys(list(in_flight.values()) + ([own_task] if own_task else [])))
+            outputs = dict(zip(tasks, await asyncio.gather(*[asyncio.shield(task) for task in tasks])))
+            miss_vectors = {}
+            for vectors, _ in outputs.values():
+                miss_vectors.update(vectors)
+            results = [miss_vectors[key] if vector is None else vector for key, vector in zip(cache_keys, results)]
+            total_tokens = outputs[own_task][1] if own_task else 0
 
             return EmbeddingOutput(output=results, total_tokens=total_tokens)
 
         return wrapper
 
     return decorator
+
+
+# only used in the rerank score function
+def rerank_cached_call():
+    """
+    按 (重排模型, query, 文档键) 缓存单个候选的重排得分，文档键由调用方给出（如 chunk id 与 update_at），
+    chunk 更新后键随之变化，旧得分不再命中并按过期时间淘汰。只把未命中的候选送去重排，再与缓存得分合并排序。
+    self.cache 为 DiskCacheStore，整批候选一次批量查询、一次批量写回，都在线程池中执行。
+    """
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(self, query: str, documents: list, *args, document_keys: list | None = None,
+                          top_n: int | None = None, document_vectors: list | None = None, **kwargs):
+            if not self.enable_cache or document_keys is None:
+                return await func(self, query, documents, *args, top_n=top_n, document_vectors=document_vectors,
+                                  **kwargs)
+
+            cache_keys = [create_hash_key(self.model_name, [{"query": query, "document": key}], {})
+                          for key in document_keys]
+            cached_scores = await self.cache.get_many(cache_keys)
+            scores = {idx: cached_scores[cache_key] for idx, cache_key in enumerate(cache_keys)
+                      if cache_key in cached_scores}
+            cache_miss_indices = [idx for idx in range(len(cache_keys)) if idx not in scores]
+            logger.debug(f"Rerank cache: {len(scores)} hits, {len(cache_miss_indices)} misses")
+
+            if cache_miss_indices:
+                miss_documents = [documents[idx] for idx in cache_miss_indices]
+                miss_vectors = [document_vectors[idx] for idx in cache_miss_indices] if document_vectors else None
+                # 未命中的候选要全部打分才能缓存，top_n 在合并后再截取
+                miss_scores = await func(self, query, miss_documents, *args, top_n=None,
+                                         document_vectors=miss_vectors, **kwargs)
+                new_scores = {}
+                for miss_idx, score in miss_scores:
+                    idx = cache_miss_indices[miss_idx]
+                    scores[idx] = score
+                    new_scores[cache_keys[idx]] = score
+                await self.cache.set_many(new_scores)
+
+            sorted_scores = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            return sorted_scores[:top_n] if top_n is not None else sorted_scores
+
+        return wrapper
+
+    return decorator
@@ -43,6 +43,10 @@ class ClientManager:
         self.client_index = (self.client_index + 1) % len(self.api_configs)
         self.client = self.clients[self.client_index]
 
+    def is_rate_limited(self) -> bool:
+        """所有 API key 都处于限流中。"""
+        return all(limiter.is_limited() for limiter in self.limiters)
+
     async def get_client(self):
         limiter = self.limiters[self.client_index]
         if not await limiter.check_limit():
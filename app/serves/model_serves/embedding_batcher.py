@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from app.serves.model_serves.tokenizer import count_tokens
+from app.serves.model_serves.types import EmbeddingInput, EmbeddingOutput
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    动态微批：并发到达的单条 embedding 请求先排队，最多等待 max_wait 秒，或攒满 max_items 条 / max_tokens 个 token 后，
+    合并为一次 embeddings.create 调用，再把各自的向量交回给每个调用方。
+    按模型名分别排队；同一批中相同的内容只请求一次。接口调用失败时，同批的调用方都收到该异常。
+    """
+
+    def __init__(self, request_func: Callable[[EmbeddingInput], Awaitable[EmbeddingOutput]],
+                 max_wait: float = 0.005, max_items: int = 64, max_tokens: int = 32000):
+        self.request_func = request_func
+        self.max_wait = max_wait
+        self.max_items = max_items
+        self.max_tokens = max_tokens
+        self._pending: Dict[str, Dict[str, List[asyncio.Future]]] = {}
+        self._pending_tokens: Dict[str, int] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        # 持有发出中的批次任务的引用，避免被垃圾回收
+        self._tasks: set = set()
+
+    async def embed(self, name: str, content: str) -> Tuple[List[float], int]:
+        """返回该内容的向量和按 token 数分摊到它头上的用量。"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(name, {})
+        if content not in batch:
+            self._pending_tokens[name] = self._pending_tokens.get(name, 0) + count_tokens(content)
+        batch.setdefault(content, []).append(future)
+
+        if len(batch) >= self.max_items or self._pending_tokens[name] >= self.max_tokens:
+            self._flush(name)
+        elif name not in self._timers:
+            self._timers[name] = loop.call_later(self.max_wait, self._flush, name)
+        return await future
+
+    def _flush(self, name: str) -> None:
+        timer = self._timers.pop(name, None)
+        if timer is not None:
+            timer.cancel()
+        self._pending_tokens.pop(name, None)
+        batch = self._pending.pop(name, None)
+        if not batch:
+            return
+        task = asyncio.create_task(self._send(name, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, name: str, batch: Dict[str, List[asyncio.Future]]) -> None:
+        contents = list(batch)
+        logger.debug("Sending embedding micro-batch of %d inputs for model %s", len(contents), name)
+        try:
+            output = await self.request_func(EmbeddingInput(name=name, input_content=contents))
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        content_tokens = [count_tokens(content) for content in contents]
+        total_content_tokens = sum(content_tokens) or 1
+        for content, vector, content_token_count in zip(contents, output.output, content_tokens):
+            tokens = round(output.total_tokens * content_token_count / total_content_tokens)
+            for future in batch[content]:
+                if not future.done():
+                    future.set_result((vector, tokens))
@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+from diskcache import Cache
+from sqlalchemy import select, and_
+from sqlalchemy.dialects.postgresql import insert
+
+
+def content_hash(content: str, parameters: dict | None = None) -> str:
+    """
+    没有参数时为内容 UTF-8 编码的 sha256，与数据库中 encode(sha256(convert_to(page_content, 'UTF8')), 'hex') 一致，
+    已入库 chunk 的向量可以直接按这个哈希复用。
+    """
+    payload = content if not parameters else json.dumps([content, parameters], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def embedding_cache_key(model_name: str, content: str, parameters: dict | None = None) -> str:
+    """缓存键包含模型名，不同 embedding 模型的向量互不混用。"""
+    return f"{model_name}-{content_hash(content, parameters)}"
+
+
+def split_embedding_cache_key(key: str) -> Tuple[str, str]:
+    """拆回 (模型名, 内容哈希)，模型名中可以有 '-'，哈希中没有。"""
+    model_name, _, hash_value = key.rpartition("-")
+    return model_name, hash_value
+
+
+def encode_vector(vector) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def decode_vector(value: bytes) -> np.ndarray:
+    return np.frombuffer(value, dtype=np.float32)
+
+
+class LRUEmbeddingTier:
+    """进程内 LRU，按向量占用的字节数限制大小，超出时淘汰最久未使用的条目。"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._items: OrderedDict[str, np.ndarray] = OrderedDict()
+
+    def get(self, key: str) -> np.ndarray | None:
+        vector = self._items.get(key)
+        if vector is not None:
+            self._items.move_to_end(key)
+        return vector
+
+    def set(self, key: str, vector: np.ndarray) -> None:
+        if vector.nbytes > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.current_bytes -= old.nbytes
+        self._items[key] = vector
+        self.current_bytes += vector.nbytes
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.current_bytes -= evicted.nbytes
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class DiskCacheStore:
+    """diskcache 存储，批量读写放在一个事务里并交给线程池，不阻塞事件循环。值原样存取，重排得分缓存也使用它。"""
+
+    def __init__(self, cache: Cache, expire: int | None = None):
+        self.cache = cache
+        self.expire = expire
+
+    def _get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        found = {}
+        with self.cache.transact():
+            for key in keys:
+                value = self.cache.get(key)
+                if value is not None:
+                    found[key] = value
+        return found
+
+    def _set_many(self, items: Dict[str, bytes]) -> None:
+        with self.cache.transact():
+            for key, value in items.items():
+                self.cache.set(key, value, expire=self.expire)
+
+    async def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        return await asyncio.to_thread(self._get_many, keys)
+
+    async def set_many(self, items: Dict[str, bytes]) -> None:
+        await asyncio.to_thread(self._set_many, items)
+
+
+class PgEmbeddingStore:
+    """
+    PostgreSQL 中的 embedding_store 表，所有节点共享：批量查询一次 SELECT，批量写入一次 INSERT ... ON CONFLICT。
+    迁移时用已入库 chunk 的向量回填，重新导入相同内容不再请求 embedding 接口。
+    """
+
+    def __init__(self, session_factory, record_model):
+        self.session_factory = session_factory
+        self.record_model = record_model
+
+    async def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        hashes_by_model: Dict[str, List[str]] = {}
+        for key in keys:
+            model_name, hash_value = split_embedding_cache_key(key)
+            hashes_by_model.setdefault(model_name, []).append(hash_value)
+
+        found = {}
+        async with self.session_factory() as db:
+            for model_name, hashes in hashes_by_model.items():
+                query = (select(self.record_model.content_hash, self.record_model.vector)
+                         .where(and_(self.record_model.model_name == model_name,
+                                     self.record_model.content_hash.in_(hashes))))
+                for row in await db.execute(query):
+                    found[f"{model_name}-{row.content_hash}"] = encode_vector(row.vector)
+        return found
+
+    async def set_many(self, items: Dict[str, bytes]) -> None:
+        if not items:
+            return
+        values = []
+        for key, value in items.items():
+            model_name, hash_value = split_embedding_cache_key(key)
+            values.append({"model_name": model_name, "content_hash": hash_value, "vector": decode_vector(value)})
+        async with self.session_factory() as db:
+            await db.execute(insert(self.record_model).values(values).on_conflict_do_nothing())
+            await db.commit()
+
+
+class EmbeddingCache:
+    """
+    两级 embedding 缓存：前面是进程内 LRU，命中时不离开事件循环；未命中的键一次批量查询后端存储
+    （节点本地的 DiskCacheStore 或集群共享的 PgEmbeddingStore），
+    查到的向量回填 LRU。向量以 float32 二进制存储，不再 pickle Python 浮点数列表。
+    """
+
+    def __init__(self, store=None, memory_bytes: int = 256 * 1024 * 1024):
+        self.memory = LRUEmbeddingTier(memory_bytes)
+        self.store = store
+
+    async def get_many(self, keys: List[str]) -> List[np.ndarray | None]:
+        results = [self.memory.get(key) for key in keys]
+        miss_keys = list(dict.fromkeys(key for key, vector in zip(keys, results) if vector is None))
+        if miss_keys and self.store is not None:
+            found = await self.store.get_many(miss_keys)
+            vectors = {key: decode_vector(value) for key, value in found.items()}
+            for key, vector in vectors.items():
+                self.memory.set(key, vector)
+            results = [vectors.get(key) if vector is None else vector for key, vector in zip(keys, results)]
+        return results
+
+    async def set_many(self, items: Dict[str, list]) -> None:
+        encoded = {key: encode_vector(vector) for key, vector in items.items()}
+        for key, value in encoded.items():
+            self.memory.set(key, decode_vector(value))
+        if self.store is not None:
+            await self.store.set_many(encoded)
@@ -1,10 +1,17 @@
+import asyncio
 import logging
-from typing import TypeVar
+from typing import TypeVar, List, Callable
 
-from openai import AsyncClient
+from diskcache import Cache
+from openai import AsyncClient, RateLimitError, APIConnectionError, APITimeoutError
+from pg_cache import PgCache
 from pydantic import BaseModel
 
 from app.serves.model_serves.cache_manager import embedding_cached_call
+from app.serves.model_serves.client_manager import ClientManager
+from app.serves.model_serves.embedding_batcher import EmbeddingBatcher
+from app.serves.model_serves.embedding_cache import EmbeddingCache, embedding_cache_key
+from app.serves.model_serves.tokenizer import get_token_counter
 from app.serves.model_serves.rag_model import RAGModel
 from app.serves.model_serves.types import EmbeddingInput, EmbeddingOutput
 
@@ -17,8 +24,23 @@ TOutput = TypeVar('TOutput', bound=BaseModel)
 
 class EmbeddingModel(RAGModel):
 
+    def __init__(self, client_manager: ClientManager, cache: PgCache | Cache | EmbeddingCache = None,
+                 cache_expire_after_seconds: int | None = None, batch_wait: float = 0,
+                 batch_max_items: int = 64, batch_max_tokens: int = 32000):
+        """batch_wait 大于 0 时，并发的单条请求经 EmbeddingBatcher 合并后再调用接口。"""
+        super().__init__(client_manager, cache=cache, cache_expire_after_seconds=cache_expire_after_seconds)
+        self.batcher = EmbeddingBatcher(self.request_embeddings, max_wait=batch_wait, max_items=batch_max_items,
+                                        max_tokens=batch_max_tokens) if batch_wait > 0 else None
+
     @embedding_cached_call()
     async def embedding(self, *, model_input: EmbeddingInput, max_retries: int = 3) -> EmbeddingOutput:
+        # 缓存未命中的单条请求进入微批，多条的请求本身已是一批，直接调用
+        if self.batcher is not None and len(model_input.input_content) == 1:
+            vector, total_tokens = await self.batcher.embed(model_input.name, model_input.input_content[0])
+            return EmbeddingOutput(output=[vector], total_tokens=total_tokens)
+        return await self.request_embeddings(model_input, max_retries=max_retries)
+
+    async def request_embeddings(self, model_input: EmbeddingInput, max_retries: int = 3) -> EmbeddingOutput:
         logger.info("Embedding request for model: %s", model_input.name)
 
         async def embedding_func(client: AsyncClient, limiter, model_input):
@@ -34,4 +56,84 @@ class EmbeddingModel(RAGModel):
             output = [data.embedding for data in response.data]
             return EmbeddingOutput(output=output, total_tokens=total_tokens)
 
-        return await self._execute_with_retries(embedding_func, model_input, max_retries=max_retries)
\ No newline at end of file
+        return await self._execute_with_retries(embedding_func, model_input, max_retries=max_retries)
+
+    async def cached_embeddings(self, model_input: EmbeddingInput) -> List[List[float] | None]:
+        """只查缓存不请求接口，未命中的位置为 None。"""
+        if not self.enable_cache:
+            return [None] * len(model_input.input_content)
+        cache_keys = [embedding_cache_key(model_input.name, content, model_input.set_params)
+                      for content in model_input.input_content]
+        return [vector.tolist() if vector is not None else None for vector in await self.cache.get_many(cache_keys)]
+
+    async def embed_batches(self, batches: List[List[str]], name: str = EmbeddingInput.model_fields["name"].default,
+                            concurrency_per_key: int = 2,
+                            max_retries: int = 3,
+                            on_progress: Callable[[int, int], None] | None = None) -> List[EmbeddingOutput]:
+        """
+        批量入库用：每个 API key 起 concurrency_per_key 个 worker 从同一个队列取批次并发请求，
+        每个 key 按自己的 RPM / TPM 预留额度，吞吐随 key 的数量线性增长。
+        某个 key 被限流时，批次放回队列由其他 key 处理。结果按批次顺序返回，向量同时写入缓存。
+        """
+        results: List[EmbeddingOutput | None] = [None] * len(batches)
+        queue: asyncio.Queue = asyncio.Queue()
+        for index in range(len(batches)):
+            queue.put_nowait(index)
+        finished = 0
+
+        async def worker(client: AsyncClient, limiter):
+            nonlocal finished
+            while True:
+                index = await queue.get()
+                try:
+                    results[index] = await self._embed_on_key(client, limiter, name, batches[index], max_retries)
+                    if self.enable_cache:
+                        await self.cache.set_many({embedding_cache_key(name, content): vector
+                                                   for content, vector in zip(batches[index], results[index].output)})
+                    finished += 1
+                    logger.info("Embedded batch %d/%d", finished, len(batches))
+                    if on_progress is not None:
+                        on_progress(finished, len(batches))
+                except RateLimitError:
+                    limiter.block(50)
+                    queue.put_nowait(index)
+                finally:
+                    queue.task_done()
+
+        tasks = [asyncio.create_task(worker(client, limiter))
+                 for client, limiter in zip(self.client_manager.clients, self.client_manager.limiters)
+                 for _ in range(concurrency_per_key)]
+        all_done = asyncio.create_task(queue.join())
+        # worker 只会因异常结束，此时取消其余 worker 并抛出该异常
+        done, _ = await asyncio.wait([all_done, *tasks], return_when=asyncio.FIRST_COMPLETED)
+        for task in [all_done, *tasks]:
+            task.cancel()
+        for task in done:
+            if task is not all_done:
+                task.result()
+        return results
+
+    async def _embed_on_key(self, client: AsyncClient, limiter, name: str, contents: List[str],
+                            max_retries: int) -> EmbeddingOutput:
+        """在指定的 key 上发送一个批次，按本地 tokenizer 的计数预留额度；连接错误按指数退避重试。"""
+        estimated_tokens = sum(get_token_counter().count_batch(contents))
+        retry_count = 0
+        while True:
+            await limiter.acquire(estimated_tokens)
+            try:
+                response = await client.embeddings.create(model=name, input=contents)
+            except (APIConnectionError, APITimeoutError) as e:
+                limiter.settle(estimated_tokens, 0)
+                retry_count += 1
+                if retry_count > max_retries:
+                    raise
+                logger.warning("Error %s with API key %s, retrying...", e.__class__.__name__,
+                               self._obfuscate_api_key(limiter.api_key))
+                await asyncio.sleep(min(60, 2 ** retry_count))
+                continue
+            except RateLimitError:
+                limiter.settle(estimated_tokens, 0)
+                raise
+            total_tokens = response.usage.total_tokens
+            limiter.settle(estimated_tokens, total_tokens)
+            return EmbeddingOutput(output=[data.embedding for data in response.data], total_tokens=total_tokens)
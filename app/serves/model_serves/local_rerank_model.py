@@ -0,0 +1,69 @@
+import asyncio
+from collections import Counter
+from typing import List, Tuple
+
+import jieba
+import numpy as np
+
+
+def tokenize(text: str) -> List[str]:
+    """搜索引擎模式分词，去掉空白和标点。"""
+    return [token for token in jieba.lcut_for_search(text.lower()) if token.strip() and token.isalnum()]
+
+
+def lexical_scores(query: str, documents: List[str], k1: float = 1.2, b: float = 0.75) -> np.ndarray:
+    """以候选集合本身为语料的 BM25，query 的每个词项各算一次 idf。"""
+    query_terms = list(dict.fromkeys(tokenize(query)))
+    if not query_terms or not documents:
+        return np.zeros(len(documents))
+
+    document_counts = [Counter(tokenize(document)) for document in documents]
+    tf = np.array([[counts.get(term, 0) for term in query_terms] for counts in document_counts], dtype=np.float64)
+    lengths = np.array([sum(counts.values()) for counts in document_counts], dtype=np.float64)
+    avg_length = max(lengths.mean(), 1.0)
+
+    df = (tf > 0).sum(axis=0)
+    idf = np.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+    denominator = tf + k1 * (1 - b + b * lengths[:, None] / avg_length)
+    return (idf * tf * (k1 + 1) / denominator).sum(axis=1)
+
+
+def vector_scores(query_vector, document_vectors) -> np.ndarray:
+    query = np.asarray(query_vector, dtype=np.float32)
+    vectors = np.asarray(document_vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1)
+    norms[norms == 0] = 1.0
+    return vectors @ query / (norms * (np.linalg.norm(query) or 1.0))
+
+
+class LocalRerankModel:
+    """
+    进程内的 CPU 重排，不走远程接口，没有网络延迟和 token 费用。
+
+    得分为 jieba 词项 BM25（按候选集合内的最大值归一化）与 chunk 已存向量余弦相似度的加权和；
+    没有向量时只用词项得分。计算放到线程池中，不阻塞事件循环。
+    """
+
+    def __init__(self, vector_weight: float = 0.7):
+        self.vector_weight = vector_weight
+
+    def score(self, query: str, documents: List[str], query_vector=None, document_vectors=None) -> np.ndarray:
+        scores = lexical_scores(query, documents)
+        if scores.max(initial=0) > 0:
+            scores = scores / scores.max()
+        has_vectors = query_vector is not None and document_vectors is not None and \
+            all(vector is not None for vector in document_vectors)
+        if has_vectors and len(documents):
+            scores = self.vector_weight * vector_scores(query_vector, document_vectors) + \
+                (1 - self.vector_weight) * scores
+        return scores
+
+    async def rerank_scores(self, query: str, documents: list, max_chunks_per_doc: int = 832,
+                            overlap_tokens: int = 32, top_n: int | None = None, query_vector=None,
+                            document_vectors=None) -> List[Tuple[int, float]]:
+        """与 RerankModel.rerank_scores 相同，返回按得分降序的 (文档下标, 得分)。"""
+        if not documents:
+            return []
+        scores = await asyncio.to_thread(self.score, query, documents, query_vector, document_vectors)
+        order = np.argsort(-scores, kind="stable")[:top_n]
+        return [(int(index), float(scores[index])) for index in order]
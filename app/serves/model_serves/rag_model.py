@@ -8,6 +8,7 @@ from pg_cache import PgCache
 from pydantic import BaseModel
 
 from app.serves.model_serves.client_manager import ClientManager
+from app.serves.model_serves.embedding_cache import EmbeddingCache, DiskCacheStore
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -19,7 +20,7 @@ TOutput = TypeVar('TOutput', bound=BaseModel)
 class RAGModel:
 
     def __init__(self, client_manager: ClientManager,
-                 cache: PgCache | Cache = None,
+                 cache: PgCache | Cache | EmbeddingCache | DiskCacheStore = None,
                  cache_expire_after_seconds: int | None = None):
         self.client_manager = client_manager
         self.cache_expire_after_seconds = cache_expire_after_seconds
@@ -1,3 +1,4 @@
+import asyncio
 import time
 import logging
 from typing import Union
@@ -44,6 +45,44 @@ class RateLimiter:
 
         return True
 
+    def is_limited(self) -> bool:
+        """不修改计数地判断当前是否处于封禁或超限状态。"""
+        if self.is_blocked and time.time() < self.blocked_until:
+            return True
+        if self._get_int_time() - self.start_time >= 60:
+            return False
+        return (self.max_requests_per_minute is not None and
+                self.current_request_count >= self.max_requests_per_minute) or \
+            (self.max_total_tokens_per_minute is not None and
+             self.current_total_tokens >= self.max_total_tokens_per_minute)
+
+    async def acquire(self, tokens: int = 0):
+        """
+        发送前预留一次请求和预计的 token 数，超出 RPM / TPM 时等到封禁结束或下一个计数窗口。
+        并发请求各自预留额度，不会在收到响应更新计数之前一起越过限制。
+        """
+        while True:
+            if await self.check_limit() and self._fits(tokens):
+                self.current_request_count += 1
+                self.current_total_tokens += tokens
+                return
+            if self.is_blocked:
+                wait_time = self.blocked_until - time.time()
+            else:
+                wait_time = self.start_time + 60 - time.time()
+            await asyncio.sleep(max(wait_time, 0.1))
+
+    def _fits(self, tokens: int) -> bool:
+        if self.max_requests_per_minute is not None and self.current_request_count + 1 > self.max_requests_per_minute:
+            return False
+        # 窗口内还没有用量时总是放行，单次请求超过 TPM 也不会永远等待
+        return self.max_total_tokens_per_minute is None or self.current_total_tokens == 0 or \
+            self.current_total_tokens + tokens <= self.max_total_tokens_per_minute
+
+    def settle(self, reserved_tokens: int, actual_tokens: int):
+        """收到响应后用实际 token 数替换 acquire 时预留的估计值。"""
+        self.current_total_tokens = max(self.current_total_tokens + actual_tokens - reserved_tokens, 0)
+
     def update_limit_status(self, tokens: int = 0):
         self.current_request_count += 1
         self.current_total_tokens += tokens
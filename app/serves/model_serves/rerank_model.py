@@ -1,47 +1,168 @@
+import asyncio
+import logging
+from typing import List, Tuple
+
 import aiohttp
+from app.serves.model_serves.cache_manager import rerank_cached_call
 from app.serves.model_serves.rag_model import RAGModel
+from app.serves.model_serves.tokenizer import get_token_counter
+from config import ServeConfig
+
+logger = logging.getLogger(__name__)
 
 
 class RerankModel(RAGModel):
+    model_name = "BAAI/bge-reranker-v2-m3"
+    url = "https://api.siliconflow.cn/v1/rerank"
+
+    def _build_payload(self, query: str, documents: list, return_documents: bool = False,
+                       max_chunks_per_doc: int = 832, overlap_tokens: int = 32, top_n: int | None = None) -> dict:
+        payload = {
+            "model": self.model_name,
+            "query": query,
+            "documents": documents,
+            "return_documents": return_documents,
+            "max_chunks_per_doc": max_chunks_per_doc,
+            "overlap_tokens": overlap_tokens
+        }
+        if top_n is not None:
+            payload["top_n"] = top_n
+        return payload
+
+    async def _request_rerank(self, api_key: str, payload: dict, timeout: float | None = None) -> dict:
+        headers = {
+            "accept": "application/json",
+            "content-type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+            async with session.post(self.url, json=payload, headers=headers) as response:
+                response.raise_for_status()
+                return await response.json()
+
+    @staticmethod
+    def _input_tokens(response_json: dict) -> int:
+        return response_json.get("meta", {}).get("tokens", {}).get("input_tokens", 0)
+
+    async def _post_rerank(self, api_key: str, limiter, payload: dict) -> dict:
+        response_json = await self._request_rerank(api_key, payload)
+        limiter.update_limit_status(tokens=self._input_tokens(response_json))
+        return response_json
 
     async def rerank_documents(self, query: str, documents: list, return_documents: bool = False,
-                               max_chunks_per_doc: int = 832, overlap_tokens: int = 32) -> dict:
-        url = "https://api.siliconflow.cn/v1/rerank"
+                               max_chunks_per_doc: int = 832, overlap_tokens: int = 32,
+                               top_n: int | None = None) -> dict:
+        payload = self._build_payload(query, documents, return_documents, max_chunks_per_doc, overlap_tokens, top_n)
 
         async def rerank_func(client, limiter):
-            api_key = client.api_key
-            payload = {
-                "model": "BAAI/bge-reranker-v2-m3",
-                "query": query,
-                "documents": documents,
-                "return_documents": return_documents,
-                "max_chunks_per_doc": max_chunks_per_doc,
-                "overlap_tokens": overlap_tokens
-            }
-            headers = {
-                "accept": "application/json",
-                "content-type": "application/json",
-                "Authorization": f"Bearer {api_key}"
-            }
-
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload, headers=headers) as response:
-                    response_json = await response.json()
-                    meta = response_json.get("meta", {})
-                    tokens = meta.get("tokens", {})
-                    total_tokens = tokens.get("input_tokens", 0)
-                    limiter.update_limit_status(tokens=total_tokens)
-
-                    return response_json
+            return await self._post_rerank(client.api_key, limiter, payload)
 
         return await self._execute_with_retries(rerank_func)
 
-    async def get_sorted_documents(self, query: str, documents: list, return_documents: bool = False,
-                                   max_chunks_per_doc: int = 832, overlap_tokens: int = 32) -> list:
-        res = await self.rerank_documents(query, documents, return_documents, max_chunks_per_doc, overlap_tokens)
+    def _shard_key_order(self, shard_number: int) -> List[int]:
+        """按分片序号轮流从未限流的 key 开始，其余 key 排在后面作为重试的备选。"""
+        limiters = self.client_manager.limiters
+        available = [idx for idx, limiter in enumerate(limiters) if not limiter.is_limited()]
+        limited = [idx for idx in range(len(limiters)) if idx not in available]
+        start = shard_number % len(available) if available else 0
+        return available[start:] + available[:start] + limited
 
-        results = res['results']
-        sorted_documents = sorted(documents, key=lambda doc: next(
-            item['relevance_score'] for item in results if documents.index(doc) == item['index']), reverse=True)
+    async def rerank_shard(self, shard_number: int, query: str, documents: list, max_chunks_per_doc: int = 832,
+                           overlap_tokens: int = 32, deadline: float | None = None) -> List[Tuple[int, float]]:
+        """
+        返回分片内的 (下标, 得分)。发送前用 RateLimiter.acquire 按本地 tokenizer 的估计预留额度，收到响应后按实际用量结算；
+        遇到 429 或超时换下一个 key 重试，直到所有 key 都试过或到达 deadline（事件循环时间）。
+        """
+        client_manager = self.client_manager
+        payload = self._build_payload(query, documents, False, max_chunks_per_doc, overlap_tokens)
+        counter = get_token_counter()
+        # 接口按 (query, document) 对计费，每个文档都带一份 query
+        estimated_tokens = sum(counter.count_batch(documents)) + counter.count(query) * len(documents)
+        loop = asyncio.get_running_loop()
 
-        return sorted_documents
+        last_error: BaseException | None = None
+        for key_index in self._shard_key_order(shard_number):
+            remaining = deadline - loop.time() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                break
+            limiter = client_manager.limiters[key_index]
+            try:
+                await asyncio.wait_for(limiter.acquire(estimated_tokens), remaining)
+            except asyncio.TimeoutError as e:
+                last_error = e
+                continue
+
+            try:
+                async with client_manager.semaphore:
+                    remaining = deadline - loop.time() if deadline is not None else None
+                    res = await self._request_rerank(limiter.api_key, payload, timeout=remaining)
+            except aiohttp.ClientResponseError as e:
+                limiter.settle(estimated_tokens, 0)
+                if e.status != 429:
+                    raise
+                limiter.block(50)
+                last_error = e
+            except asyncio.TimeoutError as e:
+                limiter.settle(estimated_tokens, 0)
+                last_error = e
+            else:
+                limiter.settle(estimated_tokens, self._input_tokens(res))
+                return [(item['index'], item['relevance_score']) for item in res['results']]
+            logger.warning(f"Rerank shard {shard_number} failed with API key "
+                           f"{self._obfuscate_api_key(limiter.api_key)}: {last_error!r}, trying next key")
+        raise last_error or asyncio.TimeoutError()
+
+    def is_rate_limited(self) -> bool:
+        return self.client_manager.is_rate_limited()
+
+    @rerank_cached_call()
+    async def rerank_scores(self, query: str, documents: list, max_chunks_per_doc: int = 832,
+                            overlap_tokens: int = 32, top_n: int | None = None, query_vector=None,
+                            document_vectors=None, latency_budget: float | None = None) -> List[Tuple[int, float]]:
+        """
+        返回按相关度降序的 (文档下标, 得分)，下标对应传入的 documents，重复文本也能区分。
+        query_vector / document_vectors 供本地重排使用，远程接口忽略；
+        传入 document_keys 且开启缓存时，按候选缓存得分，只对未命中的候选请求接口。
+
+        候选按 RERANK_SHARD_SIZE 分片，分散到各个 API key 并发请求，得分是逐对的相关度，可以直接合并排序；
+        分片遇到限流或超时时在预算内换 key 重试。
+        超过 latency_budget 秒仍未返回的分片被取消，其中的文档不出现在结果中，由调用方按原有顺序补在后面；
+        所有分片都失败时抛出第一个异常。
+        """
+        if not documents:
+            return []
+        shard_size = ServeConfig.rerank_shard_size
+        latency_budget = latency_budget if latency_budget is not None else ServeConfig.rerank_latency_budget
+        deadline = asyncio.get_running_loop().time() + latency_budget if latency_budget else None
+        starts = list(range(0, len(documents), shard_size))
+        tasks = [asyncio.create_task(self.rerank_shard(shard_number, query, documents[start:start + shard_size],
+                                                       max_chunks_per_doc, overlap_tokens, deadline=deadline))
+                 for shard_number, start in enumerate(starts)]
+        done, pending = await asyncio.wait(tasks, timeout=latency_budget or None)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Rerank latency budget exceeded, {len(pending)}/{len(tasks)} shards unfinished")
+
+        scores = []
+        errors = []
+        for start, task in zip(starts, tasks):
+            if task not in done:
+                continue
+            if task.exception() is not None:
+                errors.append(task.exception())
+                continue
+            scores.extend((start + index, score) for index, score in task.result())
+        if errors and len(errors) == len(tasks):
+            raise errors[0]
+        for error in errors:
+            logger.warning(f"Rerank shard failed: {error!r}")
+
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores[:top_n] if top_n is not None else scores
+
+    async def get_sorted_documents(self, query: str, documents: list, return_documents: bool = False,
+                                   max_chunks_per_doc: int = 832, overlap_tokens: int = 32) -> list:
+        scores = await self.rerank_scores(query, documents, max_chunks_per_doc, overlap_tokens)
+        return [documents[index] for index, _ in scores]
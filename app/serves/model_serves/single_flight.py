@@ -0,0 +1,41 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, Tuple
+
+
+class SingleFlight:
+    """
+    合并同一时刻的相同上游调用：第一个调用方发起请求，键相同的后来者等待同一个结果，不再重复请求。
+    请求在独立的任务中执行，发起者被取消时不影响仍在等待的其他调用方；请求结束后键即释放，不缓存结果。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+
+    def get(self, key: str) -> asyncio.Task | None:
+        return self._calls.get(key)
+
+    def start(self, keys: Iterable[str], coroutine: Awaitable) -> asyncio.Task:
+        """发起一次请求并把它登记到多个键上，适用于一次上游调用同时产出多个键的结果（如批量 embedding）。"""
+        keys = list(keys)
+        task = asyncio.ensure_future(coroutine)
+        for key in keys:
+            self._calls[key] = task
+
+        def release(finished: asyncio.Task):
+            for key in keys:
+                if self._calls.get(key) is finished:
+                    del self._calls[key]
+            # 没有调用方等待时也取走异常，避免 "exception was never retrieved"
+            if not finished.cancelled():
+                finished.exception()
+
+        task.add_done_callback(release)
+        return task
+
+    async def do(self, key: str, func: Callable[[], Awaitable]) -> Tuple[Any, bool]:
+        """返回 (结果, 是否复用了其他调用方发起的请求)。"""
+        task = self.get(key)
+        shared = task is not None
+        if not shared:
+            task = self.start([key], func())
+        return await asyncio.shield(task), shared
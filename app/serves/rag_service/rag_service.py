@@ -6,9 +6,9 @@ from llm_parse_json import parse_json
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.crud.filter_utils.filters import FilterHandler
-from app.crud.search_utils import hybrid_search
+from app.crud.search_utils import hybrid_search, batch_hybrid_search
 from app.db.db_models import Chunk
-from app.schemes.models.chunk_models import HybridSearchModel
+from app.schemes.models.chunk_models import HybridSearchModel, HybridBatchSearchModel
 from app.schemes.models.rag_serve_models import RAGServeModel, RAGResponse
 from app.serves.model_serves.chat_model import ChatModel
 from app.serves.model_serves.embedding_model import EmbeddingModel
@@ -87,12 +87,15 @@ class RAGService:
         responses = []
         retrieval_documents = []
 
-        async def process_query(query):
-            sub_documents = await self.get_hybrid_documents(self.db, query,
-                                                            offset, limit, use_vector_search,
-                                                            use_keyword_search, vector_weight,
-                                                            keyword_weight, paragraph_number_ranking,
-                                                            filter_count)
+        # 所有子问题的检索合并为一次批量检索，只需一次 embedding 请求和两条 SQL
+        documents_list = await self.get_batch_hybrid_documents(self.db, json_queries,
+                                                               offset, limit, use_vector_search,
+                                                               use_keyword_search, vector_weight,
+                                                               keyword_weight, paragraph_number_ranking,
+                                                               filter_count, partition_id=model.partition_id,
+                                                               diversify=model.diversify)
+
+        async def process_query(sub_documents):
             logging.debug(f"Sub-documents length: {len(sub_documents)}")
             retrieval_documents.extend(sub_documents)
             if sub_documents:
@@ -101,10 +104,12 @@ class RAGService:
             elif recursive_query:
                 return await self.handle_recursive_query(user_question, offset, limit,
                                                          vector_weight, keyword_weight,
-                                                         max_depth, current_depth=1)
+                                                         max_depth, current_depth=1,
+                                                         partition_id=model.partition_id,
+                                                         diversify=model.diversify)
             return None
 
-        tasks = [process_query(query) for query in json_queries]
+        tasks = [process_query(sub_documents) for sub_documents in documents_list]
         results = await asyncio.gather(*tasks)
 
         for result in results:
@@ -151,12 +156,15 @@ class RAGService:
         responses = []
         retrieval_documents = []
 
-        async def process_query(query):
-            sub_documents = await self.get_hybrid_documents(self.db, query,
-                                                            offset, limit, use_vector_search,
-                                                            use_keyword_search, vector_weight,
-                                                            keyword_weight, paragraph_number_ranking,
-                                                            filter_count)
+        # 所有子问题的检索合并为一次批量检索，只需一次 embedding 请求和两条 SQL
+        documents_list = await self.get_batch_hybrid_documents(self.db, json_queries,
+                                                               offset, limit, use_vector_search,
+                                                               use_keyword_search, vector_weight,
+                                                               keyword_weight, paragraph_number_ranking,
+                                                               filter_count, partition_id=model.partition_id,
+                                                               diversify=model.diversify)
+
+        async def process_query(sub_documents):
             logging.debug(f"Sub-documents length: {len(sub_documents)}")
             retrieval_documents.extend(sub_documents)
             if sub_documents:
@@ -165,10 +173,12 @@ class RAGService:
             elif recursive_query:
                 return await self.handle_recursive_query(user_question, offset, limit,
                                                          vector_weight, keyword_weight,
-                                                         max_depth, current_depth=1)
+                                                         max_depth, current_depth=1,
+                                                         partition_id=model.partition_id,
+                                                         diversify=model.diversify)
             return None
 
-        tasks = [process_query(query) for query in json_queries]
+        tasks = [process_query(sub_documents) for sub_documents in documents_list]
         results = await asyncio.gather(*tasks)
 
         for result in results:
@@ -194,7 +204,7 @@ class RAGService:
 
     async def handle_recursive_query(self, user_question, offset, limit,
                                      vector_weight, keyword_weight,
-                                     max_depth, current_depth=0):
+                                     max_depth, current_depth=0, partition_id=None, diversify=False):
         step_back_queries = []
         logging.info(f"Handling recursive query at depth {current_depth} for question: {user_question}")
         if current_depth >= max_depth:
@@ -207,8 +217,10 @@ class RAGService:
             sub_documents = await self.get_hybrid_documents(self.db,
                                                             step_back_query,
                                                             offset, limit,
-                                                            vector_weight,
-                                                            keyword_weight)
+                                                            vector_weight=vector_weight,
+                                                            keyword_weight=keyword_weight,
+                                                            partition_id=partition_id,
+                                                            diversify=diversify)
             step_back_queries.append(step_back_query)
 
             # sub_documents = await self.judge_documents_relevance(user_question=user_question,
@@ -245,7 +257,9 @@ class RAGService:
                                    vector_weight=1.0,
                                    keyword_weight=1.0,
                                    paragraph_number_ranking=False,
-                                   filter_count=-1) -> list:
+                                   filter_count=-1,
+                                   partition_id=None,
+                                   diversify=False) -> list:
         logging.info(f"Performing hybrid search for query: {query}")
         keywords = await query2keywords(query, keyword_count=2)
         logging.debug(f"Keywords: {keywords}")
@@ -256,7 +270,9 @@ class RAGService:
                                   vector_weight=vector_weight,
                                   keyword_weight=keyword_weight,
                                   paragraph_number_ranking=paragraph_number_ranking,
-                                  filter_count=filter_count)
+                                  filter_count=filter_count,
+                                  partition_id=partition_id,
+                                  diversify=diversify)
         if model.vector is None and model.page_content:
             model_input = EmbeddingInput(input_content=[model.page_content])
             embedding_output = await self.embedding_model.embedding(model_input=model_input)
@@ -265,6 +281,37 @@ class RAGService:
         logging.debug(f"Hybrid search results: {hybrid_search_results}")
         return [result.page_content for result in hybrid_search_results]
 
+    async def get_batch_hybrid_documents(self, db, queries: list[str],
+                                         offset=0, limit=20,
+                                         use_vector_search=True,
+                                         use_keyword_search=True,
+                                         vector_weight=1.0,
+                                         keyword_weight=1.0,
+                                         paragraph_number_ranking=False,
+                                         filter_count=-1,
+                                         partition_id=None,
+                                         diversify=False) -> list[list]:
+        logging.info(f"Performing batch hybrid search for {len(queries)} queries")
+        if not queries:
+            return []
+        keywords_list = await asyncio.gather(*[query2keywords(query, keyword_count=2) for query in queries])
+        logging.debug(f"Keywords: {keywords_list}")
+        model = HybridBatchSearchModel(page_contents=queries, keywords_list=keywords_list,
+                                       offset=offset, limit=limit,
+                                       use_vector_search=use_vector_search,
+                                       use_keyword_search=use_keyword_search,
+                                       vector_weight=vector_weight,
+                                       keyword_weight=keyword_weight,
+                                       paragraph_number_ranking=paragraph_number_ranking,
+                                       filter_count=filter_count,
+                                       partition_id=partition_id,
+                                       diversify=diversify)
+        model_input = EmbeddingInput(input_content=queries)
+        embedding_output = await self.embedding_model.embedding(model_input=model_input)
+        model.vectors = embedding_output.output
+        hybrid_search_results = await batch_hybrid_search(db, model, FilterHandler(db_model=Chunk))
+        return [[result.page_content for result in results] for results in hybrid_search_results]
+
     async def judge_document_relevance(self, user_question, document):
         logging.info(f"Judging relevance of document for question: {user_question}")
         judge_relevance_prompt = PromptFactory.retrieval_text_relevance(user_question=user_question, document=document)
@@ -99,7 +99,9 @@ class RAGStreamService:
                                                     vector_weight=vector_weight,
                                                     keyword_weight=keyword_weight,
                                                     paragraph_number_ranking=paragraph_number_ranking,
-                                                    filter_count=filter_count
+                                                    filter_count=filter_count,
+                                                    partition_id=model.partition_id,
+                                                    diversify=model.diversify
                                                     )
         yield f"data: {RAGStreamResponse(data_type='document', result=documents).model_dump_json()}\n\n"
         async for res in self.generate_stream_response_from_documents(user_question,
@@ -119,7 +121,9 @@ class RAGStreamService:
                                    vector_weight=1.0,
                                    keyword_weight=1.0,
                                    paragraph_number_ranking=False,
-                                   filter_count=-1) -> list:
+                                   filter_count=-1,
+                                   partition_id=None,
+                                   diversify=False) -> list:
         logging.info(f"Performing hybrid search for query: {query}")
         keywords = await query2keywords(query, keyword_count=2)
         logging.debug(f"Keywords: {keywords}")
@@ -130,7 +134,9 @@ class RAGStreamService:
                                   vector_weight=vector_weight,
                                   keyword_weight=keyword_weight,
                                   paragraph_number_ranking=paragraph_number_ranking,
-                                  filter_count=filter_count)
+                                  filter_count=filter_count,
+                                  partition_id=partition_id,
+                                  diversify=diversify)
         if model.vector is None and model.page_content:
             model_input = EmbeddingInput(input_content=[model.page_content])
             embedding_output = await self.embedding_model.embedding(model_input=model_input)
@@ -129,7 +129,9 @@ class RAGStreamService:
                                    vector_weight=1.0,
                                    keyword_weight=1.0,
                                    paragraph_number_ranking=False,
-                                   filter_count=-1) -> list:
+                                   filter_count=-1,
+                                   partition_id=None,
+                                   diversify=False) -> list:
         logging.info(f"Performing hybrid search for query: {query}")
         keywords = await query2keywords(query, keyword_count=-1)
         logging.debug(f"Keywords: {keywords}")
@@ -140,7 +142,9 @@ class RAGStreamService:
                                   vector_weight=vector_weight,
                                   keyword_weight=keyword_weight,
                                   paragraph_number_ranking=paragraph_number_ranking,
-                                  filter_count=filter_count)
+                                  filter_count=filter_count,
+                                  partition_id=partition_id,
+                                  diversify=diversify)
         if model.vector is None and model.page_content:
             model_input = EmbeddingInput(input_content=[model.page_content])
             embedding_output = await self.embedding_model.embedding(model_input=model_input)
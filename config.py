@@ -66,12 +66,74 @@ class ServeConfig:
     NO_ASYNC_DB_URL: str = f"postgresql+psycopg://{db_admin}:{db_admin_password}@{db_host}:{db_port}/{db_name}"
     ADMIN_NO_ASYNC_DB_URL: str = f"postgresql+psycopg://{db_admin}:{db_admin_password}@{db_host}:{db_port}/{default_db_name}"
     ADMIN_NO_ASYNC_NEW_DB_URL: str = f"postgresql+psycopg://{db_admin}:{db_admin_password}@{db_host}:{db_port}/{db_name}"
+    # 异步连接池大小，默认与 SQLAlchemy 相同。并发的混合检索中关键词分支另占一个连接，
+    # 共享 embedding 存储（PgEmbeddingStore）查询时再占一个，单个请求最多同时占用 3 个连接
+    db_pool_size = int(os.getenv("DB_POOL_SIZE", 5))
+    db_max_overflow = int(os.getenv("DB_MAX_OVERFLOW", 10))
 
     ###
     # rag 配置
     chunk_size = 2000
     chunk_overlap = 50
     ###
+    # 向量索引配置：表定义和迁移中固定为全精度 HNSW，下面的索引类型和参数用于分区局部索引，
+    # 以及通过 /xiaoke_admin/vector_index 创建的其他全表索引
+    embedding_dim = int(os.getenv("EMBEDDING_DIM", 1024))
+    vector_index_method = os.getenv("VECTOR_INDEX_METHOD", "hnsw")
+    hnsw_m = int(os.getenv("HNSW_M", 16))
+    hnsw_ef_construction = int(os.getenv("HNSW_EF_CONSTRUCTION", 64))
+    ivfflat_lists = int(os.getenv("IVFFLAT_LISTS", 100))
+    # full: 全精度索引；halfvec / binary: 量化索引 + 全精度重排
+    vector_storage_mode = os.getenv("VECTOR_STORAGE_MODE", "full")
+    vector_oversampling = int(os.getenv("VECTOR_OVERSAMPLING", 4))
+    # 检索参数：hnsw.ef_search / ivfflat.probes 的默认值，需与数据库中的设置一致
+    hnsw_ef_search = int(os.getenv("HNSW_EF_SEARCH", 40))
+    ivfflat_probes = int(os.getenv("IVFFLAT_PROBES", 1))
+    # 带过滤条件时，估计行数不超过该值直接精确扫描；选择度低于阈值时使用迭代扫描（pgvector >= 0.8，off 关闭）
+    vector_exact_scan_rows = int(os.getenv("VECTOR_EXACT_SCAN_ROWS", 5000))
+    vector_iterative_selectivity = float(os.getenv("VECTOR_ITERATIVE_SELECTIVITY", 0.1))
+    vector_iterative_scan = os.getenv("VECTOR_ITERATIVE_SCAN", "relaxed_order")
+    # 进程内向量索引：只为热点分区开启，逗号分隔的分区 id
+    local_vector_index_dir = os.getenv("LOCAL_VECTOR_INDEX_DIR", "./vector_index")
+    local_vector_index_partitions = [int(partition_id) for partition_id in
+                                     os.getenv("LOCAL_VECTOR_INDEX_PARTITIONS", "").split(",") if partition_id]
+    # 0 表示精确检索，大于 0 时按该聚类数构建 IVF
+    local_vector_index_nlist = int(os.getenv("LOCAL_VECTOR_INDEX_NLIST", 0))
+    local_vector_index_nprobe = int(os.getenv("LOCAL_VECTOR_INDEX_NPROBE", 8))
+    # 关键词检索 ranking 为 bm25 时的参数
+    bm25_k1 = float(os.getenv("BM25_K1", 1.2))
+    bm25_b = float(os.getenv("BM25_B", 0.75))
+    # 混合检索默认的执行方式：python 两次查询后在应用内融合；sql 一条语句内完成检索和 RRF 融合
+    hybrid_execution = os.getenv("HYBRID_EXECUTION", "python")
+    # 同时为关键词分支借出的连接数上限，默认为连接池总量的一半；名额用完时两路检索在同一个连接上依次执行
+    hybrid_branch_connections = int(os.getenv("HYBRID_BRANCH_CONNECTIONS", max((db_pool_size + db_max_overflow) // 2, 1)))
+    # 重排前按融合名次截取的候选数
+    rerank_pool_size = int(os.getenv("RERANK_POOL_SIZE", 50))
+    # 重排后端：remote 调用重排接口，限流或出错时退回本地；local 只用本地 CPU 重排
+    rerank_backend = os.getenv("RERANK_BACKEND", "remote")
+    # 重排得分缓存的过期时间（秒）
+    rerank_cache_ttl = int(os.getenv("RERANK_CACHE_TTL", 7 * 24 * 3600))
+    # 重排候选的分片大小和等待时间（秒），超时的分片按融合顺序排在重排结果之后，0 表示不限时
+    rerank_shard_size = int(os.getenv("RERANK_SHARD_SIZE", 32))
+    rerank_latency_budget = float(os.getenv("RERANK_LATENCY_BUDGET", 3.0))
+    # embedding 缓存的存储层：postgres 为所有节点共享的 embedding_store 表；disk 为节点本地的 diskcache 目录
+    embedding_cache_backend = os.getenv("EMBEDDING_CACHE_BACKEND", "postgres")
+    # embedding 缓存进程内 LRU 层的大小上限（字节），1024 维 float32 向量每条约 4KB
+    embedding_cache_memory_bytes = int(os.getenv("EMBEDDING_CACHE_MEMORY_BYTES", 256 * 1024 * 1024))
+    # 并发的单条 embedding 请求最多等待的毫秒数，期间到达的请求合并为一次接口调用，0 表示不合并；
+    # 一批最多的条数和 token 数，达到任一上限立即发出
+    embedding_batch_wait_ms = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", 5))
+    embedding_batch_max_items = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", 64))
+    embedding_batch_max_tokens = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", 32000))
+    # 本地 tokenizer.json（如 bge-m3 的词表），用于按 token 计算切分长度和 embedding 批次大小；为空时按规则估算
+    tokenizer_path = os.getenv("TOKENIZER_PATH", "")
+    # 切分时 chunk_size / chunk_overlap 的单位：tokens 或 chars，未配置 TOKENIZER_PATH 时默认 chars
+    chunk_length_unit = os.getenv("CHUNK_LENGTH_UNIT", "tokens" if tokenizer_path else "chars")
+    # 批量入库时每个 embedding API key 上同时发送的批次数
+    embedding_concurrency_per_key = int(os.getenv("EMBEDDING_CONCURRENCY_PER_KEY", 2))
+    # 本地重排中向量相似度的权重，其余为词项得分
+    local_rerank_vector_weight = float(os.getenv("LOCAL_RERANK_VECTOR_WEIGHT", 0.7))
+    ###
     # search 配置
     search_engine = os.getenv("SEARCH_ENGINE")
     text_search_url = os.getenv("TEXT_SEARCH_URL")
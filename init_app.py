@@ -1,12 +1,15 @@
 import logging
 
 from app.core.init_func import init_rag, \
-    init_db
+    init_db, check_vector_indexes
+from app.serves.model_serves.tokenizer import check_chunk_length_unit
 
 
 def init_app(reset_db: bool = False):
     """整合了数据库初始化，RAG模型初始化，MinIO客户端初始化的函数"""
+    check_chunk_length_unit()
     init_db(reset_db)
+    check_vector_indexes()
     init_rag()
     logging.info("Application initialized successfully.")
 
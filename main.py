@@ -21,6 +21,7 @@ from app.apis import (partition_router,
                       response_record_router,
                       chunk_router,
                       image_router,
+                      vector_index_router,
                       rag_router)
 
 app = FastAPI()
@@ -44,6 +45,7 @@ app.include_router(conversation_router)
 app.include_router(response_record_router)
 app.include_router(chunk_router)
 app.include_router(image_router)
+app.include_router(vector_index_router)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -1,12 +1,15 @@
 from app.serves.model_serves.chat_model import ChatModel
 from app.serves.model_serves.embedding_model import EmbeddingModel
+from app.serves.model_serves.local_rerank_model import LocalRerankModel
 from app.serves.model_serves.rag_model import RAGModel
 from app.serves.model_serves.rerank_model import RerankModel
+from config import ServeConfig
 
 embedding_model: EmbeddingModel | None = None
 chat_model: ChatModel | None = None
 util_chat_model: ChatModel | None = None
 rerank_model: RerankModel | None = None
+local_rerank_model: LocalRerankModel | None = None
 
 
 def get_embedding_model():
@@ -52,3 +55,10 @@ def get_rerank_model():
 def set_rerank_model(rerank: RerankModel):
     global rerank_model
     rerank_model = rerank
+
+
+def get_local_rerank_model():
+    global local_rerank_model
+    if local_rerank_model is None:
+        local_rerank_model = LocalRerankModel(vector_weight=ServeConfig.local_rerank_vector_weight)
+    return local_rerank_model
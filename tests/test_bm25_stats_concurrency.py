@@ -0,0 +1,131 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import delete, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import model_constant
+from app.crud.chunk_operation import ChunkOperation
+from app.crud.filter_utils.filters import FilterHandler
+from app.db.bm25_stats import BM25_STATS_SHARDS
+from app.db.db_models import Chunk, Partition
+from app.schemes.models.chunk_models import ChunkCreate
+from app.serves.model_serves.types import EmbeddingOutput
+from config import ServeConfig
+
+# 需要已迁移的数据库（chunks 上装有 BM25 统计触发器），连不上时跳过
+
+WORDS = ["苹果", "香蕉", "樱桃", "葡萄", "西瓜", "芒果", "橙子", "柠檬"]
+
+
+class FakeEmbedding:
+    """所有内容都在缓存中命中，入库不请求 embedding 接口。"""
+
+    async def cached_embeddings(self, model_input):
+        return [[0.1] * ServeConfig.embedding_dim for _ in model_input.input_content]
+
+    async def embed_batches(self, chunks, concurrency_per_key=1):
+        return [EmbeddingOutput(output=[], total_tokens=0) for _ in chunks]
+
+
+async def connect():
+    engine = create_async_engine(ServeConfig.DATABASE_URL)
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1 FROM chunk_term_stats LIMIT 1"))
+    except Exception as e:
+        await engine.dispose()
+        pytest.skip(f"database with BM25 stats is not available: {e}")
+    return engine
+
+
+async def stats_mismatches(db: AsyncSession, partition_id: int):
+    """触发器维护的统计（各 shard 之和）与按 chunks 重新计算的结果之差。"""
+    term_diff = await db.execute(text("""
+        SELECT lexeme FROM (
+            SELECT lexeme, sum(df) AS df FROM chunk_term_stats WHERE partition_id = :p GROUP BY lexeme
+        ) s FULL JOIN (
+            SELECT lexeme, count(*) AS df
+            FROM chunks, unnest(tsvector_to_array(search_vector)) AS lexeme
+            WHERE partition_id = :p GROUP BY lexeme
+        ) c USING (lexeme)
+        WHERE coalesce(s.df, 0) <> coalesce(c.df, 0)
+    """), {"p": partition_id})
+    corpus = (await db.execute(text("""
+        SELECT (SELECT coalesce(sum(doc_count), 0) FROM chunk_corpus_stats WHERE partition_id = :p),
+               (SELECT coalesce(sum(total_length), 0) FROM chunk_corpus_stats WHERE partition_id = :p),
+               (SELECT count(*) FROM chunks WHERE partition_id = :p),
+               (SELECT coalesce(sum(length(search_vector)), 0) FROM chunks WHERE partition_id = :p)
+    """), {"p": partition_id})).one()
+    return term_diff.scalars().all(), (corpus[0], corpus[1]) != (corpus[2], corpus[3])
+
+
+def test_concurrent_ingestion_into_one_partition():
+    async def main():
+        engine = await connect()
+        session_factory = async_sessionmaker(engine, class_=AsyncSession)
+        previous_model = model_constant.get_embedding_model()
+        model_constant.set_embedding_model(FakeEmbedding())
+        operation = ChunkOperation(filter_handler=FilterHandler(db_model=Chunk))
+        try:
+            async with session_factory() as db:
+                partition = Partition(partition_name=f"bm25-concurrency-{uuid.uuid4().hex}")
+                db.add(partition)
+                await db.commit()
+                partition_id = partition.id
+
+            # 两批内容的词项大量重叠，且出现顺序相反
+            def batch(words, tag):
+                return [ChunkCreate(page_content=f"{' '.join(words[i:] + words[:i])} {tag}{i}",
+                                    partition_id=partition_id) for i in range(200)]
+
+            async def ingest(models):
+                async with session_factory() as db:
+                    await operation.filter_and_create_items(db=db, models=models)
+
+            await asyncio.wait_for(asyncio.gather(ingest(batch(WORDS, "a")), ingest(batch(WORDS[::-1], "b"))),
+                                   timeout=60)
+
+            async with session_factory() as db:
+                term_mismatches, corpus_mismatch = await stats_mismatches(db, partition_id)
+                assert term_mismatches == []
+                assert not corpus_mismatch
+
+                await db.execute(delete(Chunk).where(Chunk.partition_id == partition_id))
+                await db.commit()
+                term_mismatches, corpus_mismatch = await stats_mismatches(db, partition_id)
+                assert term_mismatches == []
+                assert not corpus_mismatch
+                await db.execute(delete(Partition).where(Partition.id == partition_id))
+                await db.commit()
+        finally:
+            model_constant.set_embedding_model(previous_model)
+            await engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_open_ingestion_does_not_block_another_shard():
+    async def main():
+        engine = await connect()
+        try:
+            async with engine.connect() as first, engine.connect() as second:
+                first_tx = await first.begin()
+                second_tx = await second.begin()
+                first_xid = (await first.execute(text("SELECT txid_current()"))).scalar()
+                second_xid = (await second.execute(text("SELECT txid_current()"))).scalar()
+                if first_xid % BM25_STATS_SHARDS == second_xid % BM25_STATS_SHARDS:
+                    pytest.skip("both transactions landed in the same stats shard")
+
+                vector = [0.1] * ServeConfig.embedding_dim
+                await first.execute(insert(Chunk).values(page_content="苹果 香蕉 樱桃", vector=vector))
+                # 第一个事务尚未提交，第二个事务写同一分区、相同的词项时不需要等待
+                await asyncio.wait_for(
+                    second.execute(insert(Chunk).values(page_content="樱桃 香蕉 苹果", vector=vector)), timeout=5)
+                await second_tx.rollback()
+                await first_tx.rollback()
+        finally:
+            await engine.dispose()
+
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.crud.search_utils import context_window
+from app.crud.search_utils.context_window import merge_context_windows
+from app.db.db_models import Chunk
+
+
+def hit(_id, document_id, paragraph_number):
+    doc_metadata = {} if paragraph_number is None else {"paragraph_number": paragraph_number}
+    return SimpleNamespace(id=_id, document_id=document_id, doc_metadata=doc_metadata)
+
+
+def windows(entries):
+    return [(position, row.id, window) for position, row, window in entries]
+
+
+def test_overlapping_windows_are_merged():
+    entries = merge_context_windows([hit(1, 10, 5), hit(2, 10, 7)], context_window=1)
+    assert windows(entries) == [(0, 1, (10, 4, 8))]
+
+
+def test_touching_windows_are_merged():
+    # [4, 6] 和 [7, 9] 之间没有缺口
+    entries = merge_context_windows([hit(1, 10, 5), hit(2, 10, 8)], context_window=1)
+    assert windows(entries) == [(0, 1, (10, 4, 9))]
+
+
+def test_windows_with_gap_stay_separate():
+    entries = merge_context_windows([hit(1, 10, 5), hit(2, 10, 9)], context_window=1)
+    assert windows(entries) == [(0, 1, (10, 4, 6)), (1, 2, (10, 8, 10))]
+
+
+def test_different_documents_are_not_merged():
+    entries = merge_context_windows([hit(1, 10, 5), hit(2, 20, 5)], context_window=2)
+    assert windows(entries) == [(0, 1, (10, 3, 7)), (1, 2, (20, 3, 7))]
+
+
+def test_merged_window_takes_earliest_hit_position():
+    entries = merge_context_windows([hit(1, 10, 7), hit(2, 20, 1), hit(3, 10, 5)], context_window=1)
+    assert windows(entries) == [(0, 1, (10, 4, 8)), (1, 2, (20, 0, 2))]
+
+
+def test_hits_without_paragraph_number_are_kept():
+    entries = merge_context_windows([hit(1, 10, None), hit(2, None, 3), hit(3, 10, 3)], context_window=1)
+    assert windows(entries) == [(0, 1, None), (1, 2, None), (2, 3, (10, 2, 4))]
+
+
+def test_zero_window_merges_only_adjacent_paragraphs():
+    entries = merge_context_windows([hit(1, 10, 3), hit(2, 10, 4), hit(3, 10, 6)], context_window=0)
+    assert windows(entries) == [(0, 1, (10, 3, 4)), (2, 3, (10, 6, 6))]
+
+
+def test_non_integer_paragraph_numbers_are_kept_without_window():
+    entries = merge_context_windows([hit(1, 10, "3a"), hit(2, 10, 1.5), hit(3, 10, "4"), hit(4, 10, True)],
+                                    context_window=1)
+    assert windows(entries) == [(0, 1, None), (1, 2, None), (2, 3, (10, 3, 5)), (3, 4, None)]
+
+
+def test_hit_is_kept_when_its_window_returns_no_rows(monkeypatch):
+    async def no_rows(db, query):
+        return []
+
+    monkeypatch.setattr(context_window, "execute_query", no_rows)
+    results = [SimpleNamespace(id=1, document_id=10, doc_metadata={"paragraph_number": 5}, rank_score=0.9),
+               SimpleNamespace(id=2, document_id=None, doc_metadata={}, rank_score=0.5)]
+    (expanded,) = asyncio.run(context_window.expand_context_windows(None, Chunk, [results], context_window=1))
+    assert [row.id for row in expanded] == [1, 2]
+    assert [row.rank_position for row in expanded] == [1, 2]
+    assert expanded[0].rank_score == 0.9
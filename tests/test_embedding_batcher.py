@@ -0,0 +1,57 @@
+import asyncio
+
+from app.serves.model_serves.embedding_batcher import EmbeddingBatcher
+from app.serves.model_serves.types import EmbeddingOutput
+
+
+class FakeEmbeddingApi:
+    def __init__(self, error: Exception | None = None):
+        self.calls = []
+        self.error = error
+
+    async def __call__(self, embedding_input):
+        self.calls.append(list(embedding_input.input_content))
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        output = [[float(len(content)), float(i)] for i, content in enumerate(embedding_input.input_content)]
+        return EmbeddingOutput(output=output, total_tokens=len(output))
+
+
+def test_concurrent_requests_share_one_upstream_call():
+    api = FakeEmbeddingApi()
+    batcher = EmbeddingBatcher(api, max_wait=0.01)
+
+    async def main():
+        return await asyncio.gather(*(batcher.embed("bge", text) for text in ["a", "bb", "a", "ccc"]))
+
+    results = asyncio.run(main())
+    # 同一批中重复的内容只请求一次
+    assert api.calls == [["a", "bb", "ccc"]]
+    assert [vector for vector, _ in results] == [[1.0, 0.0], [2.0, 1.0], [1.0, 0.0], [3.0, 2.0]]
+
+
+def test_batches_are_split_by_model_and_max_items():
+    api = FakeEmbeddingApi()
+    batcher = EmbeddingBatcher(api, max_wait=0.01, max_items=2)
+
+    async def main():
+        return await asyncio.gather(batcher.embed("m1", "x"), batcher.embed("m2", "y"),
+                                    batcher.embed("m1", "zz"), batcher.embed("m1", "www"))
+
+    results = asyncio.run(main())
+    assert sorted(api.calls) == [["www"], ["x", "zz"], ["y"]]
+    assert [vector[0] for vector, _ in results] == [1.0, 1.0, 2.0, 3.0]
+
+
+def test_error_reaches_every_waiter():
+    api = FakeEmbeddingApi(error=RuntimeError("upstream down"))
+    batcher = EmbeddingBatcher(api, max_wait=0.01)
+
+    async def main():
+        return await asyncio.gather(*(batcher.embed("bge", text) for text in ["a", "b", "a"]),
+                                    return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert len(api.calls) == 1
+    assert all(isinstance(result, RuntimeError) and str(result) == "upstream down" for result in results)
@@ -0,0 +1,66 @@
+import asyncio
+import hashlib
+
+import numpy as np
+from diskcache import Cache
+
+from app.serves.model_serves.embedding_cache import (DiskCacheStore, EmbeddingCache, LRUEmbeddingTier,
+                                                     content_hash, embedding_cache_key, split_embedding_cache_key)
+
+
+def test_content_hash_matches_database_sha256():
+    assert content_hash("你好 world") == hashlib.sha256("你好 world".encode()).hexdigest()
+
+
+def test_key_changes_with_model_name_and_parameters():
+    key = embedding_cache_key("BAAI/bge-m3", "text")
+    assert key != embedding_cache_key("text-embedding-3-small", "text")
+    assert key != embedding_cache_key("BAAI/bge-m3", "text", {"dimensions": 512})
+    assert split_embedding_cache_key(key) == ("BAAI/bge-m3", content_hash("text"))
+    assert split_embedding_cache_key(embedding_cache_key("bge-m3", "text"))[0] == "bge-m3"
+
+
+def test_miss_then_hit(tmp_path):
+    key = embedding_cache_key("bge", "text")
+
+    async def main():
+        with Cache(str(tmp_path)) as disk:
+            cache = EmbeddingCache(DiskCacheStore(disk))
+            miss = await cache.get_many([key])
+            await cache.set_many({key: [0.1, 0.2, 0.3]})
+            hit = await cache.get_many([key, key])
+            # 新实例的 LRU 为空，从磁盘存储命中
+            from_store = await EmbeddingCache(DiskCacheStore(disk)).get_many([key])
+            return miss, hit, from_store
+
+    miss, hit, from_store = asyncio.run(main())
+    assert miss == [None]
+    assert len(hit) == 2
+    assert from_store[0].dtype == np.float32
+    np.testing.assert_allclose(from_store[0], [0.1, 0.2, 0.3], rtol=1e-6)
+
+
+def test_cache_without_store_uses_memory_only():
+    async def main():
+        cache = EmbeddingCache()
+        await cache.set_many({"m-a": [1.0]})
+        return await cache.get_many(["m-a", "m-b"])
+
+    hit, miss = asyncio.run(main())
+    assert hit.tolist() == [1.0]
+    assert miss is None
+
+
+def test_lru_evicts_least_recently_used_by_bytes():
+    tier = LRUEmbeddingTier(max_bytes=8)
+    tier.set("a", np.zeros(1, dtype=np.float32))
+    tier.set("b", np.zeros(1, dtype=np.float32))
+    tier.get("a")
+    tier.set("c", np.zeros(1, dtype=np.float32))
+    assert tier.get("b") is None
+    assert tier.get("a") is not None and tier.get("c") is not None
+    assert tier.current_bytes == 8
+    # 超过上限的单个向量不进入缓存
+    tier.set("big", np.zeros(4, dtype=np.float32))
+    assert tier.get("big") is None
+    assert len(tier) == 2
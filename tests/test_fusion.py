@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from app.crud.search_utils.fusion import fuse_ranked_lists, normalize_scores
+
+
+def fuse(branches, weights=(1.0, 1.0), method="rrf", k=60):
+    ids = [np.asarray([_id for _id, _ in branch], dtype=np.int64) for branch in branches]
+    scores = [np.asarray([score for _, score in branch], dtype=np.float64) for branch in branches]
+    fused_ids, fused_scores = fuse_ranked_lists(ids, scores, weights, method=method, k=k)
+    return fused_ids.tolist(), fused_scores.tolist()
+
+
+def test_rrf_uses_ranks_and_sums_both_branches():
+    fused_ids, fused_scores = fuse([[(1, 0.9), (2, 0.8), (3, 0.7)], [(3, 5.0), (4, 1.0)]], k=60)
+    assert fused_ids[0] == 3
+    assert fused_scores[0] == pytest.approx(0.5 / 63 + 0.5 / 61)
+    assert set(fused_ids) == {1, 2, 3, 4}
+    # 只在一路中出现时只有该路的贡献，名次越靠前得分越高
+    assert fused_scores[fused_ids.index(1)] == pytest.approx(0.5 / 61)
+    assert fused_scores[fused_ids.index(1)] > fused_scores[fused_ids.index(2)]
+
+
+def test_rrf_ignores_raw_scores():
+    by_rank = fuse([[(1, 0.1), (2, 100.0)], []])
+    assert by_rank[0] == [1, 2]
+
+
+def test_minmax_scales_each_branch_to_unit_range():
+    fused_ids, fused_scores = fuse([[(1, 10.0), (2, 5.0), (3, 0.0)], [(3, 2.0), (1, 1.0)]], method="minmax")
+    assert fused_ids == [1, 3, 2]
+    assert fused_scores == pytest.approx([0.5, 0.5, 0.25])
+
+
+def test_zscore_standardizes_scores():
+    normalized = normalize_scores(np.array([1.0, 2.0, 3.0]), "zscore")
+    assert normalized.mean() == pytest.approx(0.0)
+    assert normalized.std() == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("method, expected", [("minmax", 1.0), ("zscore", 0.0), ("dbsf", 1.0)])
+def test_single_result(method, expected):
+    assert normalize_scores(np.array([0.42]), method).tolist() == [expected]
+    fused_ids, fused_scores = fuse([[(7, 0.42)], []], method=method)
+    assert fused_ids == [7]
+    assert fused_scores == pytest.approx([0.5 * expected])
+
+
+@pytest.mark.parametrize("method, expected", [("minmax", 1.0), ("zscore", 0.0), ("dbsf", 1.0)])
+def test_identical_scores(method, expected):
+    assert normalize_scores(np.array([0.3, 0.3, 0.3]), method).tolist() == [expected] * 3
+    # 得分相同时保持原有名次
+    fused_ids, _ = fuse([[(5, 0.3), (6, 0.3), (7, 0.3)], []], method=method)
+    assert fused_ids == [5, 6, 7]
+
+
+@pytest.mark.parametrize("method", ["rrf", "minmax", "zscore", "dbsf"])
+def test_one_empty_list_keeps_other_branch_order(method):
+    fused_ids, _ = fuse([[], [(3, 0.9), (1, 0.5), (2, 0.1)]], method=method)
+    assert fused_ids == [3, 1, 2]
+
+
+def test_both_lists_empty():
+    fused_ids, fused_scores = fuse([[], []])
+    assert fused_ids == []
+    assert fused_scores == []
+
+
+def test_weights_are_normalized():
+    _, fused_scores = fuse([[(1, 1.0)], [(2, 1.0)]], weights=(3.0, 1.0), method="minmax")
+    assert fused_scores == pytest.approx([0.75, 0.25])
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        normalize_scores(np.array([1.0, 2.0]), "softmax")
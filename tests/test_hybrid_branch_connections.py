@@ -0,0 +1,49 @@
+import asyncio
+import importlib
+from types import SimpleNamespace
+
+from app.schemes.models.chunk_models import HybridSearchModel
+
+# app.crud.search_utils 导出了同名函数，按模块路径取模块本身
+hybrid_search_module = importlib.import_module("app.crud.search_utils.hybrid_search")
+
+
+class FakeSession:
+    bind = None
+
+
+def run_hybrid(monkeypatch, semaphore: asyncio.Semaphore):
+    sessions = {}
+
+    async def fake_vector_search(db, model, filter_handler):
+        sessions["vector"] = db
+        return [SimpleNamespace(id=1, rank_score=0.9, rank_position=1)]
+
+    async def fake_search(db, model, filter_handler):
+        sessions["keyword"] = db
+        return [SimpleNamespace(id=2, rank_score=0.5, rank_position=1)]
+
+    monkeypatch.setattr(hybrid_search_module, "vector_search", fake_vector_search)
+    monkeypatch.setattr(hybrid_search_module, "search", fake_search)
+    monkeypatch.setattr(hybrid_search_module, "branch_connections", semaphore)
+    db = FakeSession()
+    model = HybridSearchModel(page_content="q", keywords=["q"], vector=[0.1], execution="python")
+    results = asyncio.run(hybrid_search_module.hybrid_search(db, model, filter_handler=None))
+    return db, sessions, results
+
+
+def test_spare_connection_runs_keyword_branch_on_its_own_session(monkeypatch):
+    semaphore = asyncio.Semaphore(1)
+    db, sessions, results = run_hybrid(monkeypatch, semaphore)
+    assert sessions["vector"] is db
+    assert sessions["keyword"] is not db
+    assert {row.id for row in results} == {1, 2}
+    # 名额用完后归还
+    assert not semaphore.locked()
+
+
+def test_no_spare_connection_runs_branches_sequentially(monkeypatch):
+    db, sessions, results = run_hybrid(monkeypatch, asyncio.Semaphore(0))
+    assert sessions["vector"] is db
+    assert sessions["keyword"] is db
+    assert {row.id for row in results} == {1, 2}
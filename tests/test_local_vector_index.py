@@ -0,0 +1,72 @@
+import asyncio
+import json
+import os
+
+import numpy as np
+
+from app.crud.search_utils.local_vector_index import LocalVectorIndex
+
+
+def write_version(index: LocalVectorIndex, ids, watermark="2026-01-01T00:00:00"):
+    os.makedirs(index.root_dir, exist_ok=True)
+    vectors = np.eye(len(ids), 4, dtype=np.float32)
+    index._write(np.asarray(ids, dtype=np.int64), vectors, watermark)
+
+
+def versions(index: LocalVectorIndex):
+    return sorted(name for name in os.listdir(index.root_dir) if name.startswith("v"))
+
+
+def test_write_keeps_previous_version(tmp_path):
+    writer = LocalVectorIndex(str(tmp_path), partition_id=1)
+    write_version(writer, [1, 2])
+    first = versions(writer)
+    write_version(writer, [1, 2, 3])
+    second = versions(writer)
+    write_version(writer, [4])
+    third = versions(writer)
+    assert len(first) == 1
+    assert len(second) == 2 and first[0] in second
+    # 只保留当前版本和上一个版本
+    assert len(third) == 2 and first[0] not in third
+
+
+def test_reader_follows_new_versions(tmp_path):
+    writer = LocalVectorIndex(str(tmp_path), partition_id=1)
+    reader = LocalVectorIndex(str(tmp_path), partition_id=1)
+    write_version(writer, [1, 2])
+    assert asyncio.run(reader.ready())
+    assert reader.ids.tolist() == [1, 2]
+
+    write_version(writer, [7, 8, 9])
+    # 确保 mtime 变化可被察觉
+    os.utime(writer.meta_path, ns=(0, os.stat(writer.meta_path).st_mtime_ns + 1))
+    assert asyncio.run(reader.ready())
+    snapshot = reader.snapshot
+    assert snapshot.ids.tolist() == [7, 8, 9]
+    assert len(snapshot.vectors) == 3
+    ids, _ = reader.search([0.0, 1.0, 0.0, 0.0], limit=1)
+    assert ids.tolist() == [8]
+
+
+def test_missing_version_keeps_current_snapshot(tmp_path):
+    reader = LocalVectorIndex(str(tmp_path), partition_id=1)
+    write_version(reader, [1, 2])
+    assert asyncio.run(reader.ready())
+    loaded = reader.snapshot
+
+    # meta.json 指向的版本目录已被其他 worker 删除
+    with open(reader.meta_path, "w", encoding="utf-8") as f:
+        json.dump({"version": "v0", "watermark": None, "nlist": 0, "count": 0}, f)
+    os.utime(reader.meta_path, ns=(0, os.stat(reader.meta_path).st_mtime_ns + 1))
+    assert asyncio.run(reader.ready())
+    assert reader.snapshot is loaded
+
+
+def test_stale_marker_makes_index_not_ready(tmp_path):
+    index = LocalVectorIndex(str(tmp_path), partition_id=1)
+    write_version(index, [1])
+    index.mark_stale()
+    assert not asyncio.run(index.ready())
+    index._clear_stale(index._stale_token())
+    assert asyncio.run(index.ready())
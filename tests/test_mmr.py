@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.crud.search_utils.mmr import maximal_marginal_relevance, mmr_rerank
+
+QUERY = [1.0, 0.2]
+# a 与查询最相关，b 几乎是 a 的重复，c 与 a 正交但仍有一点相关性
+A = [1.0, 0.0]
+B = [0.99, -0.14]
+C = [0.0, 1.0]
+
+
+def test_lambda_one_is_pure_relevance_order():
+    candidates = [C, B, A]
+    similarities = np.asarray(candidates) @ np.asarray(QUERY) / np.linalg.norm(candidates, axis=1)
+    expected = np.argsort(-similarities).tolist()
+    assert maximal_marginal_relevance(QUERY, candidates, lambda_mult=1.0, k=3) == expected
+
+
+def test_lambda_zero_prefers_diversity_after_first_pick():
+    selected = maximal_marginal_relevance(QUERY, [A, B, C], lambda_mult=0.0, k=2)
+    # 第一个总是最相关的，之后只看与已选结果的差异
+    assert selected == [0, 2]
+
+
+def test_duplicate_embeddings_are_not_picked_back_to_back():
+    selected = maximal_marginal_relevance(QUERY, [A, A, C], lambda_mult=0.5, k=3)
+    assert selected[0] in (0, 1)
+    assert selected[1] == 2
+    assert sorted(selected) == [0, 1, 2]
+
+
+def test_k_larger_than_candidates_and_empty_input():
+    assert sorted(maximal_marginal_relevance(QUERY, [A, C], k=10)) == [0, 1]
+    assert maximal_marginal_relevance(QUERY, [], k=3) == []
+    assert maximal_marginal_relevance(QUERY, [A, C], k=0) == []
+
+
+def test_mmr_rerank_rewrites_positions_and_drops_vectors():
+    rows = [SimpleNamespace(id=1, vector=A, rank_position=1),
+            SimpleNamespace(id=2, vector=B, rank_position=2),
+            SimpleNamespace(id=3, vector=C, rank_position=3),
+            SimpleNamespace(id=4, vector=None, rank_position=4)]
+    results = mmr_rerank(rows, QUERY, limit=2, lambda_mult=0.0, offset=10)
+    assert [row.id for row in results] == [1, 3]
+    assert [row.rank_position for row in results] == [11, 12]
+    assert not any(hasattr(row, "vector") for row in results)
+
+    kept = mmr_rerank(rows, QUERY, limit=1, keep_vector=True)
+    assert kept[0].vector == A
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from app.serves.model_serves.single_flight import SingleFlight
+
+
+def test_identical_in_flight_calls_share_one_result():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        results = await asyncio.gather(flight.do("k", fetch), flight.do("k", fetch))
+        return results, flight.get("k")
+
+    (first, second), pending = asyncio.run(main())
+    assert len(calls) == 1
+    assert first == ("value", False)
+    assert second == ("value", True)
+    # 请求结束后键即释放
+    assert pending is None
+
+
+def test_different_keys_are_not_merged():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return len(calls)
+
+    async def main():
+        return await asyncio.gather(flight.do("a", fetch), flight.do("b", fetch))
+
+    asyncio.run(main())
+    assert len(calls) == 2
+
+
+def test_failed_call_is_not_cached():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0)
+        if len(calls) == 1:
+            raise RuntimeError("upstream down")
+        return "value"
+
+    async def main():
+        results = await asyncio.gather(flight.do("k", fetch), flight.do("k", fetch), return_exceptions=True)
+        return results, await flight.do("k", fetch)
+
+    (first, second), retry = asyncio.run(main())
+    assert isinstance(first, RuntimeError)
+    assert isinstance(second, RuntimeError)
+    assert retry == ("value", False)
+    assert len(calls) == 2
+
+
+def test_cancelled_caller_does_not_cancel_shared_call():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        owner = asyncio.ensure_future(flight.do("k", fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.do("k", fetch))
+        await asyncio.sleep(0)
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        return await waiter
+
+    assert asyncio.run(main()) == ("value", True)
@@ -0,0 +1,30 @@
+import pytest
+
+from app.crud.index_utils.vector_index import has_vector_index, vector_index_element
+
+HNSW_FULL = ("CREATE INDEX ix_chunks_vector_hnsw ON public.chunks USING hnsw (vector vector_cosine_ops) "
+             "WITH (m='16', ef_construction='64')")
+HNSW_HALFVEC = ("CREATE INDEX ix_chunks_vector_hnsw_halfvec ON public.chunks "
+                "USING hnsw (((vector)::halfvec(1024)) halfvec_cosine_ops) WITH (m='16', ef_construction='64')")
+HNSW_BINARY_PARTITION = ("CREATE INDEX ix_chunks_vector_hnsw_binary_p3 ON public.chunks "
+                         "USING hnsw (((binary_quantize(vector))::bit(1024)) bit_hamming_ops) WHERE (partition_id = 3)")
+
+
+def test_full_precision_index_is_found():
+    assert has_vector_index([HNSW_FULL], "hnsw")
+    assert not has_vector_index([HNSW_FULL], "ivfflat")
+
+
+def test_quantized_index_is_matched_by_operator_class():
+    assert has_vector_index([HNSW_FULL, HNSW_HALFVEC], "hnsw", "halfvec")
+    assert not has_vector_index([HNSW_HALFVEC], "hnsw")
+    assert not has_vector_index([HNSW_FULL], "hnsw", "halfvec")
+
+
+def test_partition_local_index_does_not_count():
+    assert not has_vector_index([HNSW_FULL, HNSW_BINARY_PARTITION], "hnsw", "binary")
+
+
+def test_unknown_quantization():
+    with pytest.raises(ValueError):
+        vector_index_element("vector", "int8", 1024)
@@ -0,0 +1,44 @@
+import asyncio
+
+from app.crud.search_utils.vector_search_planner import VectorSearchPlan, apply_vector_search_plan
+from config import ServeConfig
+
+
+class RecordingSession:
+    def __init__(self):
+        self.settings = []
+
+    async def execute(self, statement, params):
+        names = sorted(key for key in params if key.startswith("name_"))
+        self.settings.append({params[name]: params[name.replace("name", "value")] for name in names})
+
+
+def applied(*plans):
+    db = RecordingSession()
+
+    async def main():
+        for plan in plans:
+            await apply_vector_search_plan(db, plan)
+
+    asyncio.run(main())
+    return db.settings
+
+
+def test_later_search_resets_raised_parameters(monkeypatch):
+    monkeypatch.setattr(ServeConfig, "vector_iterative_scan", "relaxed_order")
+    raised = VectorSearchPlan(mode="iterative", ef_search=800, probes=50, iterative_scan="relaxed_order")
+    default = VectorSearchPlan(mode="ann", ef_search=ServeConfig.hnsw_ef_search, probes=ServeConfig.ivfflat_probes)
+    first, second = applied(raised, default)
+    assert first == {"hnsw.ef_search": "800", "ivfflat.probes": "50",
+                     "hnsw.iterative_scan": "relaxed_order", "ivfflat.iterative_scan": "relaxed_order"}
+    # 与默认值相同的参数和关闭的迭代扫描也要下发
+    assert second == {"hnsw.ef_search": str(ServeConfig.hnsw_ef_search),
+                      "ivfflat.probes": str(ServeConfig.ivfflat_probes),
+                      "hnsw.iterative_scan": "off", "ivfflat.iterative_scan": "off"}
+
+
+def test_exact_plan_resets_to_defaults(monkeypatch):
+    monkeypatch.setattr(ServeConfig, "vector_iterative_scan", "off")
+    (settings,) = applied(VectorSearchPlan(mode="exact"))
+    assert settings == {"hnsw.ef_search": str(ServeConfig.hnsw_ef_search),
+                        "ivfflat.probes": str(ServeConfig.ivfflat_probes)}